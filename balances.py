@@ -0,0 +1,145 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, List, Optional, Tuple
+from config import Config
+from cache import BalanceCache
+from metrics import RPC_ERRORS, RPC_SECONDS
+
+class BalanceEngine:
+    def __init__(self, wallets: Dict, max_workers: Optional[int] = None,
+                 per_network: Optional[int] = None, timeout: Optional[float] = None,
+                 cache: Optional[BalanceCache] = None):
+        self.wallets = wallets
+        self.cache = cache or BalanceCache()
+        self.per_network = per_network or Config.BALANCE_CONCURRENCY
+        self.timeout = timeout or Config.BALANCE_TIMEOUT
+        # Blocking SDK calls (web3, tronpy, bitcoinlib) run here, never on the event loop
+        self.executor = ThreadPoolExecutor(
+            max_workers=max_workers or Config.RPC_WORKERS,
+            thread_name_prefix='rpc'
+        )
+        self._semaphores: Dict[str, asyncio.Semaphore] = {}
+
+    def _semaphore(self, currency: str) -> asyncio.Semaphore:
+        semaphore = self._semaphores.get(currency)
+        if semaphore is None:
+            semaphore = asyncio.Semaphore(self.per_network)
+            self._semaphores[currency] = semaphore
+        return semaphore
+
+    async def run_blocking(self, func, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, func, *args)
+
+    async def call(self, currency: str, method: str, *args):
+        # Await async backends directly; push sync ones onto the executor
+        wallet_manager = self.wallets.get(currency)
+        if not wallet_manager:
+            raise KeyError(f"No wallet service for {currency}")
+
+        func = getattr(wallet_manager, method)
+        try:
+            with RPC_SECONDS.time(network=currency, method=method):
+                if asyncio.iscoroutinefunction(func):
+                    return await func(*args)
+                return await self.run_blocking(func, *args)
+        except Exception:
+            RPC_ERRORS.inc(network=currency, method=method)
+            raise
+
+    async def _fetch_balance(self, currency: str, address: str) -> float:
+        async with self._semaphore(currency):
+            return await asyncio.wait_for(
+                self.call(currency, 'get_balance', address),
+                self.timeout
+            )
+
+    async def get_balance(self, currency: str, address: str) -> float:
+        return await self.cache.get_or_fetch(
+            currency, address,
+            lambda: self._fetch_balance(currency, address)
+        )
+
+    async def _fetch_balances(self, currency: str, addresses: List[str]) -> Dict[str, float]:
+        async with self._semaphore(currency):
+            return await asyncio.wait_for(
+                self.call(currency, 'get_balances', addresses),
+                self.timeout
+            )
+
+    async def get_network_balances(self, currency: str, addresses: List[str]) -> Dict[str, float]:
+        # Backends exposing get_balances() answer many addresses in one batched request
+        if hasattr(self.wallets.get(currency), 'get_balances'):
+            return await self.cache.get_or_fetch_many(
+                currency, addresses,
+                lambda missing: self._fetch_balances(currency, missing)
+            )
+        return {address: await self.get_balance(currency, address) for address in addresses}
+
+    async def fetch_network_balances(self, currency: str, addresses: List[str],
+                                     block: Optional[int] = None, confirmed: bool = False) -> Dict[str, float]:
+        # Straight from the chain, neither reading nor filling the cache: for scans over
+        # every wallet, which would evict the entries users are hitting. Addresses whose
+        # lookup failed are left out; a failed batch raises. `block` pins the balances to
+        # that block, on backends exposing get_balances_at(); `confirmed` leaves out
+        # unconfirmed funds, on backends exposing get_confirmed_balances()
+        if block is not None:
+            async with self._semaphore(currency):
+                return await asyncio.wait_for(
+                    self.call(currency, 'get_balances_at', addresses, block),
+                    self.timeout
+                )
+        if confirmed:
+            async with self._semaphore(currency):
+                return await asyncio.wait_for(
+                    self.call(currency, 'get_confirmed_balances', addresses),
+                    self.timeout
+                )
+        if hasattr(self.wallets.get(currency), 'get_balances'):
+            return await self._fetch_balances(currency, addresses)
+        results = await asyncio.gather(
+            *(self._fetch_balance(currency, address) for address in addresses),
+            return_exceptions=True
+        )
+        return {
+            address: balance for address, balance in zip(addresses, results)
+            if not isinstance(balance, Exception)
+        }
+
+    async def get_balances(self, wallets: Iterable[Tuple[str, str]],
+                           deadline: Optional[float] = None) -> Dict[Tuple[str, str], Optional[float]]:
+        # Fetch every (currency, address) concurrently; anything that fails or is still
+        # pending when the deadline passes is reported as None so callers get partial results
+        keys = list(dict.fromkeys(wallets))
+        if not keys:
+            return {}
+        if deadline is None:
+            deadline = Config.BALANCE_DEADLINE
+
+        by_network: Dict[str, List[str]] = {}
+        for currency, address in keys:
+            by_network.setdefault(currency, []).append(address)
+
+        # One task per batch-capable network, one task per address everywhere else
+        tasks = {}
+        for currency, addresses in by_network.items():
+            if hasattr(self.wallets.get(currency), 'get_balances'):
+                groups = [addresses]
+            else:
+                groups = [[address] for address in addresses]
+            for group in groups:
+                tasks[asyncio.ensure_future(self.get_network_balances(currency, group))] = currency
+
+        done, pending = await asyncio.wait(tasks, timeout=deadline)
+        for task in pending:
+            task.cancel()
+
+        results = {key: None for key in keys}
+        for task in done:
+            if not task.cancelled() and task.exception() is None:
+                for address, balance in task.result().items():
+                    results[(tasks[task], address)] = balance
+        return results
+
+    def close(self):
+        self.executor.shutdown(wait=False)
@@ -0,0 +1,294 @@
+import asyncio
+import hashlib
+import json
+import random
+from collections import Counter
+from typing import Any, Dict, List, Optional, Tuple
+from eth_abi import decode, encode
+
+# Local stand-ins for chain nodes: deterministic balances derived from the address,
+# a head that advances with time, and configurable latency, error and 429 injection.
+# Plain asyncio HTTP/1.1 with keep-alive, so the bot's pooled clients reuse connections;
+# MockElectrumServer speaks the Electrum protocol over plain TCP instead
+
+AGGREGATE3 = '82ad56cb'
+GET_ETH_BALANCE = '4d2301cc'
+BALANCE_OF = '70a08231'
+DECIMALS = '313ce567'
+SYMBOL = '95d89b41'
+NAME = '06fdde03'
+
+def seeded_amount(address: str, scale: int) -> int:
+    # Same address, same balance, on every run
+    digest = hashlib.sha256(address.lower().encode()).digest()
+    return int.from_bytes(digest[:8], 'big') % scale
+
+class MockNode:
+    def __init__(self, latency: float = 0.02, jitter: float = 0.01, error_rate: float = 0.0,
+                 throttle_rate: float = 0.0, seed: int = 1, block_time: float = 1.0):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate  # share of requests answered with HTTP 500
+        self.throttle_rate = throttle_rate  # share answered with 429 + Retry-After
+        self.random = random.Random(seed)
+        self.block_time = block_time
+        self.requests: Counter = Counter()  # method / path -> count
+        self.port: Optional[int] = None
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._started = 0.0
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.port}"
+
+    def head(self) -> int:
+        return 1000000 + int((asyncio.get_running_loop().time() - self._started) / self.block_time)
+
+    async def respond(self, path: str, body: bytes) -> Tuple[int, Any]:
+        raise NotImplementedError
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                request = await reader.readline()
+                if not request:
+                    return
+                _, path, _ = request.decode('latin-1').split(' ', 2)
+                length = 0
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    name, _, value = line.decode('latin-1').partition(':')
+                    if name.strip().lower() == 'content-length':
+                        length = int(value.strip())
+                body = await reader.readexactly(length) if length else b''
+
+                await asyncio.sleep(max(0.0, self.latency + self.random.uniform(-self.jitter, self.jitter)))
+                headers = ''
+                roll = self.random.random()
+                if roll < self.throttle_rate:
+                    status, payload, headers = 429, {'error': 'rate limited'}, 'Retry-After: 1\r\n'
+                elif roll < self.throttle_rate + self.error_rate:
+                    status, payload = 500, {'error': 'injected failure'}
+                else:
+                    status, payload = await self.respond(path, body)
+                data = json.dumps(payload).encode()
+                writer.write(
+                    f"HTTP/1.1 {status} {'OK' if status == 200 else 'Error'}\r\n"
+                    f"Content-Type: application/json\r\n{headers}"
+                    f"Content-Length: {len(data)}\r\n\r\n".encode() + data
+                )
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def start(self):
+        self._started = asyncio.get_running_loop().time()
+        self._server = await asyncio.start_server(self._handle, '127.0.0.1', 0)
+        self.port = self._server.sockets[0].getsockname()[1]
+
+    async def close(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+
+class MockEVMNode(MockNode):
+    # JSON-RPC (single and batched) for the calls the EVM backends make, including
+    # Multicall3.aggregate3 over getEthBalance and ERC-20 balanceOf/decimals/symbol/name
+    chain_id = 1
+
+    def call_contract(self, target: str, data: bytes) -> Tuple[bool, bytes]:
+        selector, args = data[:4].hex(), data[4:]
+        if selector == GET_ETH_BALANCE:
+            return True, encode(['uint256'], [seeded_amount(decode(['address'], args)[0], 10 ** 20)])
+        if selector == BALANCE_OF:
+            return True, encode(['uint256'], [seeded_amount(target + decode(['address'], args)[0], 10 ** 12)])
+        if selector == DECIMALS:
+            return True, encode(['uint256'], [6])
+        if selector in (SYMBOL, NAME):
+            return True, encode(['string'], ['MOCK'])
+        return False, b''
+
+    def eth_call(self, call: Dict[str, Any]) -> str:
+        data = bytes.fromhex(call.get('data', call.get('input', '0x'))[2:])
+        if data[:4].hex() == AGGREGATE3:
+            (calls,) = decode(['(address,bool,bytes)[]'], data[4:])
+            results = [self.call_contract(target, call_data) for target, _, call_data in calls]
+            return '0x' + encode(['(bool,bytes)[]'], [results]).hex()
+        success, returned = self.call_contract(call['to'], data)
+        return '0x' + returned.hex() if success else '0x'
+
+    def result(self, method: str, params: List[Any]) -> Any:
+        if method == 'eth_chainId':
+            return hex(self.chain_id)
+        if method == 'net_version':
+            return str(self.chain_id)
+        if method == 'eth_blockNumber':
+            return hex(self.head())
+        if method == 'eth_getBalance':
+            return hex(seeded_amount(params[0], 10 ** 20))
+        if method == 'eth_call':
+            return self.eth_call(params[0])
+        if method == 'eth_getTransactionCount':
+            return hex(seeded_amount(params[0], 100))
+        if method == 'eth_gasPrice':
+            return hex(20 * 10 ** 9)
+        if method == 'eth_feeHistory':
+            return {'oldestBlock': hex(self.head()), 'baseFeePerGas': [hex(10 ** 10), hex(10 ** 10)],
+                    'reward': [[hex(10 ** 9)]], 'gasUsedRatio': [0.5]}
+        if method == 'eth_estimateGas':
+            return hex(60000)
+        if method == 'eth_getCode':
+            return '0x'
+        if method == 'eth_sendRawTransaction':
+            return '0x' + hashlib.sha256(params[0].encode()).hexdigest()
+        if method == 'eth_getTransactionByHash':
+            return {'hash': params[0], 'from': '0x' + '11' * 20, 'to': '0x' + '22' * 20,
+                    'value': hex(10 ** 17), 'blockNumber': hex(self.head() - 5)}
+        if method == 'eth_getTransactionReceipt':
+            return {'transactionHash': params[0], 'status': '0x1', 'blockNumber': hex(self.head() - 5)}
+        if method == 'eth_getBlockByNumber':
+            number = int(params[0], 16) if params[0].startswith('0x') else self.head()
+            return {'number': hex(number), 'hash': '0x' + '00' * 32, 'transactions': []}
+        raise KeyError(method)
+
+    def answer(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        self.requests[request.get('method')] += 1
+        try:
+            return {'jsonrpc': '2.0', 'id': request.get('id'), 'result': self.result(request['method'], request.get('params', []))}
+        except KeyError:
+            return {'jsonrpc': '2.0', 'id': request.get('id'), 'error': {'code': -32601, 'message': 'method not found'}}
+
+    async def respond(self, path: str, body: bytes) -> Tuple[int, Any]:
+        request = json.loads(body)
+        if isinstance(request, list):
+            self.requests['batch'] += 1
+            return 200, [self.answer(item) for item in request]
+        return 200, self.answer(request)
+
+class MockTronNode(MockNode):
+    # The TronGrid HTTP API paths tronpy uses for accounts, blocks, transaction info and
+    # constant (view) contract calls
+    async def respond(self, path: str, body: bytes) -> Tuple[int, Any]:
+        path = path.split('?', 1)[0].strip('/')
+        self.requests[path] += 1
+        params = json.loads(body) if body else {}
+        if path == 'wallet/getaccount':
+            return 200, {'address': params.get('address'), 'balance': seeded_amount(params.get('address', ''), 10 ** 12)}
+        if path == 'wallet/getnowblock':
+            return 200, {'blockID': '00' * 32, 'block_header': {'raw_data': {'number': self.head()}}}
+        if path == 'wallet/getblockbynum':
+            return 200, {'blockID': '00' * 32, 'block_header': {'raw_data': {'number': params.get('num')}}, 'transactions': []}
+        if path == 'wallet/gettransactioninfobyid':
+            return 200, {'id': params.get('value'), 'blockNumber': self.head() - 5, 'receipt': {'result': 'SUCCESS'}}
+        if path == 'wallet/triggerconstantcontract':
+            function = params.get('function_selector', '')
+            if function.startswith('balanceOf'):
+                value = encode(['uint256'], [seeded_amount(params['contract_address'] + params['owner_address'], 10 ** 12)])
+            elif function == 'decimals()':
+                value = encode(['uint256'], [6])
+            else:
+                value = encode(['string'], ['MOCK'])
+            return 200, {'result': {'result': True}, 'constant_result': [value.hex()]}
+        return 404, {'Error': f'unknown path {path}'}
+
+class MockElectrumServer(MockNode):
+    # Electrum protocol (newline-delimited JSON-RPC, batches as arrays) for the BTC/LTC
+    # backends: deterministic UTXOs per script hash, fee estimates, broadcasts and
+    # headers. Injected errors answer every request of a message with an RPC error, and
+    # notify() pushes a status change to the sessions subscribed to a script hash
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.spent: set = set()  # outpoints of broadcast transactions' inputs
+        self._sessions: List[Tuple[asyncio.StreamWriter, set]] = []
+
+    @property
+    def url(self) -> str:
+        return f"tcp://127.0.0.1:{self.port}"
+
+    def utxos(self, script_hash: str) -> List[Dict[str, Any]]:
+        # One to three outputs of up to 0.01 coin, the first confirmed
+        count = seeded_amount(script_hash, 3) + 1
+        utxos = [
+            {'tx_hash': hashlib.sha256(f"{script_hash}:{n}".encode()).hexdigest(), 'tx_pos': n,
+             'value': seeded_amount(f"{script_hash}:{n}", 10 ** 6) + 10000, 'height': self.head() - n}
+            for n in range(count)
+        ]
+        return [utxo for utxo in utxos if (utxo['tx_hash'], utxo['tx_pos']) not in self.spent]
+
+    def result(self, method: str, params: List[Any], subscriptions: set) -> Any:
+        if method == 'server.version':
+            return ['MockElectrum 1.0', params[1] if len(params) > 1 else '1.4']
+        if method == 'blockchain.scripthash.subscribe':
+            subscriptions.add(params[0])
+            return hashlib.sha256(json.dumps(self.utxos(params[0])).encode()).hexdigest()
+        if method == 'blockchain.scripthash.listunspent':
+            return self.utxos(params[0])
+        if method == 'blockchain.scripthash.get_balance':
+            return {'confirmed': sum(utxo['value'] for utxo in self.utxos(params[0])), 'unconfirmed': 0}
+        if method == 'blockchain.headers.subscribe':
+            return {'height': self.head(), 'hex': '00' * 80}
+        if method == 'blockchain.estimatefee':
+            return 0.0001
+        if method == 'blockchain.relayfee':
+            return 0.00001
+        if method == 'blockchain.transaction.broadcast':
+            raw = bytes.fromhex(params[0])
+            # Inputs start after the 4-byte version and a one-byte input count
+            for n in range(raw[4]):
+                outpoint = raw[5 + n * 148:5 + n * 148 + 36]  # P2PKH inputs are 148 bytes
+                self.spent.add((outpoint[:32][::-1].hex(), int.from_bytes(outpoint[32:], 'little')))
+            return hashlib.sha256(hashlib.sha256(raw).digest()).digest()[::-1].hex()
+        raise KeyError(method)
+
+    def answer(self, request: Dict[str, Any], subscriptions: set, failed: bool) -> Dict[str, Any]:
+        self.requests[request.get('method')] += 1
+        if failed:
+            return {'jsonrpc': '2.0', 'id': request.get('id'), 'error': {'code': -32603, 'message': 'injected failure'}}
+        try:
+            return {'jsonrpc': '2.0', 'id': request.get('id'),
+                    'result': self.result(request['method'], request.get('params', []), subscriptions)}
+        except KeyError:
+            return {'jsonrpc': '2.0', 'id': request.get('id'), 'error': {'code': -32601, 'message': 'method not found'}}
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        session = (writer, set())
+        self._sessions.append(session)
+        tasks: set = set()
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    return
+                # Pipelined messages are answered concurrently, as ElectrumX and Fulcrum do
+                tasks.add(asyncio.ensure_future(self._reply(json.loads(line), session)))
+                tasks.difference_update([task for task in tasks if task.done()])
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            for task in tasks:
+                task.cancel()
+            self._sessions.remove(session)
+            writer.close()
+
+    async def _reply(self, request: Any, session: Tuple[asyncio.StreamWriter, set]):
+        writer, subscriptions = session
+        await asyncio.sleep(max(0.0, self.latency + self.random.uniform(-self.jitter, self.jitter)))
+        failed = self.random.random() < self.error_rate
+        if isinstance(request, list):
+            self.requests['batch'] += 1
+            response = [self.answer(item, subscriptions, failed) for item in request]
+        else:
+            response = self.answer(request, subscriptions, failed)
+        if not writer.is_closing():
+            writer.write(json.dumps(response).encode() + b'\n')
+
+    def notify(self, script_hash: str, status: Optional[str] = None):
+        message = json.dumps({'jsonrpc': '2.0', 'method': 'blockchain.scripthash.subscribe',
+                              'params': [script_hash, status or hashlib.sha256(str(self.random.random()).encode()).hexdigest()]})
+        for writer, subscriptions in self._sessions:
+            if script_hash in subscriptions:
+                writer.write(message.encode() + b'\n')
@@ -0,0 +1,343 @@
+import argparse
+import asyncio
+import base64
+import hashlib
+import json
+import math
+import os
+import shutil
+import sys
+import tempfile
+import time
+from typing import Any, Callable, Dict, List, Optional
+from .mock_rpc import MockElectrumServer, MockEVMNode, MockTronNode
+from .stubs import FakeTelegramClient, FakeTelegramDriver, StubService, install_stub_service
+
+# Offline benchmark and load harness for the bot's hot paths (not a test suite).
+#
+#   python -m benchmarks.run                         every scenario, compared with the baselines
+#   python -m benchmarks.run balance_10 balance_100  selected scenarios
+#   python -m benchmarks.run --save                  store the results as the new baselines
+#   python -m benchmarks.run --latency 0.2 --error-rate 0.05 --throttle-rate 0.01
+#   python -m benchmarks.run create_bulk send_bulk --no-vault    without the key vault, for its overhead
+#
+# Chain RPC is answered by local mock nodes (an Electrum server for BTC/LTC), bitcoinlib's
+# Service is stubbed for the block scans still going through it and Telegram events come
+# from a fake driver calling the real handlers, so the numbers depend only on this code
+# and the host. Exits 1 when a scenario regresses past --tolerance against
+# baselines.json, which is only compared when recorded with the same settings; re-record
+# it with --save after intended performance changes or on a different machine
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BASELINES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baselines.json')
+NETWORKS = ['ETH', 'BSC', 'MATIC', 'TRX', 'BTC', 'LTC']
+
+def percentile(values: List[float], q: float) -> float:
+    # Nearest rank
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(q * len(ordered)) - 1)]
+
+def fake_address(currency: str, user_id: int, index: int) -> str:
+    digest = hashlib.sha256(f"{currency}:{user_id}:{index}".encode()).digest()
+    if currency in ('ETH', 'BSC', 'MATIC'):
+        return '0x' + digest[:20].hex()
+    if currency == 'TRX':
+        from tronpy.keys import to_base58check_address
+        return to_base58check_address(b'\x41' + digest[:20])
+    from bitcoinlib.encoding import pubkeyhash_to_addr_base58
+    return pubkeyhash_to_addr_base58(digest[:20], prefix=b'\x30' if currency == 'LTC' else b'\x00')
+
+class Harness:
+    def __init__(self, args: argparse.Namespace):
+        self.args = args
+        self.evm = MockEVMNode(args.latency, args.jitter, args.error_rate, args.throttle_rate, seed=args.seed)
+        self.tron = MockTronNode(args.latency, args.jitter, args.error_rate, args.throttle_rate,
+                                 seed=args.seed, block_time=3.0)
+        self.electrum = MockElectrumServer(args.btc_latency, args.jitter, args.error_rate,
+                                           seed=args.seed, block_time=600.0)
+        self.workdir = tempfile.mkdtemp(prefix='walletbot-bench-')
+        self.bot = None
+        self.driver: Optional[FakeTelegramDriver] = None
+        self.seeded: Dict[int, List[tuple]] = {}
+        self.cwd = os.getcwd()
+
+    async def start(self):
+        await self.evm.start()
+        await self.tron.start()
+        await self.electrum.start()
+        # Config is read at import time, so the environment is set before the bot is imported
+        os.environ.update({
+            'API_ID': '1', 'API_HASH': 'bench', 'BOT_TOKEN': 'bench',
+            'DATABASE_URL': f"sqlite:///{os.path.join(self.workdir, 'wallets.db')}",
+            'ETH_RPC': self.evm.url + '/eth',
+            'BSC_RPC': self.evm.url + '/bsc',
+            'POLYGON_RPC': self.evm.url + '/matic',
+            'TRON_RPC': self.tron.url,
+            'BTC_ELECTRUM': self.electrum.url,
+            'LTC_ELECTRUM': self.electrum.url,
+            'ENABLED_NETWORKS': ','.join(self.args.networks),
+            'RATE_LIMITS': '', 'RATE_LIMIT_REDIS_URL': '', 'BOT_ROLE': 'all',
+            'WATCHER_NETWORKS': '', 'KEY_POOL_SIZE': '0', 'HD_WALLETS': 'true', 'METRICS_PORT': '0',
+            'SEND_ENABLED': 'true',
+            # A fixed master key, so runs with the vault pay the same sealing costs as production
+            'VAULT_MASTER_KEY': base64.urlsafe_b64encode(hashlib.sha256(b'bench').digest()).decode() if self.args.vault else ''
+        })
+        sys.path.insert(0, ROOT)
+        os.chdir(self.workdir)  # the bot's session and key files land in the scratch directory
+        import bot as bot_module
+        bot_module.TelegramClient = FakeTelegramClient
+        StubService.configure(self.args.btc_latency, self.args.jitter, self.args.error_rate, self.args.seed)
+        if 'BTC' in self.args.networks or 'LTC' in self.args.networks:
+            install_stub_service()
+        self.bot = bot_module.WalletBot()
+        await self.bot.service.start(background=False)
+        self.bot.sender.start()
+        self.driver = FakeTelegramDriver(self.bot.client)
+
+    async def close(self):
+        if self.bot is not None:
+            await self.bot.sender.stop()
+            await self.bot.service.close()
+        await self.evm.close()
+        await self.tron.close()
+        await self.electrum.close()
+        os.chdir(self.cwd)
+        shutil.rmtree(self.workdir, ignore_errors=True)
+
+    async def seed(self, user_id: int, count: int) -> List[tuple]:
+        # Wallets written straight to the database; balances come from the mock nodes
+        from wallets.registry import BACKENDS
+        wallets = []
+        for index in range(count):
+            currency = self.args.networks[index % len(self.args.networks)]
+            wallets.append({
+                'user_id': user_id,
+                'network': BACKENDS[currency][0],
+                'currency': currency,
+                'address': fake_address(currency, user_id, index),
+                'private_key': 'bench',
+                'public_key': ''
+            })
+        await self.bot.db.add_user(user_id, f"bench{user_id}")
+        await self.bot.db.add_wallets(wallets)
+        self.seeded[user_id] = [(w['currency'], w['address']) for w in wallets]
+        return self.seeded[user_id]
+
+    def cold(self, user_id: int):
+        # Forget cached native and token balances so every run goes to the (mock) chain
+        cache = self.bot.balance_engine.cache
+        for currency, address in self.seeded.get(user_id, []):
+            cache.invalidate(currency, address)
+            cache.invalidate(f"{currency}:TOKENS", address)
+
+    def rpc_requests(self) -> int:
+        nodes = (self.evm, self.tron, self.electrum)
+        return sum(sum(node.requests.values()) for node in nodes) + StubService.calls
+
+def failed(event) -> bool:
+    return any('❌' in text or 'Error' in text for _, text in event.responses)
+
+async def measure(harness: Harness, operations: List[Callable[[], Any]], concurrency: int) -> Dict[str, Any]:
+    # Runs the operations `concurrency` at a time; each returns the handled FakeEvent
+    from wallets.registry import rss_mb
+    latencies: List[float] = []
+    errors = 0
+    requests_before = harness.rpc_requests()
+    queue = list(reversed(operations))
+
+    async def run():
+        nonlocal errors
+        while queue:
+            operation = queue.pop()
+            started = time.perf_counter()
+            try:
+                event = await operation()
+            except Exception as e:
+                print(f"  operation failed: {e}")
+                errors += 1
+                continue
+            latencies.append(time.perf_counter() - started)
+            errors += failed(event)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(run() for _ in range(concurrency)))
+    wall = time.perf_counter() - started
+    return {
+        'operations': len(operations),
+        'errors': errors,
+        'p50_ms': percentile(latencies, 0.50) * 1000,
+        'p99_ms': percentile(latencies, 0.99) * 1000,
+        'mean_ms': sum(latencies) / len(latencies) * 1000 if latencies else 0.0,
+        'throughput': len(operations) / wall if wall else 0.0,
+        'rpc_requests': harness.rpc_requests() - requests_before,
+        'rss_mb': rss_mb()
+    }
+
+def next_page(event, kind: str) -> Optional[bytes]:
+    # Callback data of the event's "Older" button, None on the last page
+    for row in event.buttons or []:
+        for button in row:
+            if button.data.startswith(f"{kind}_next_".encode()):
+                return button.data
+    return None
+
+def balance_scenario(wallet_count: int):
+    async def scenario(harness: Harness) -> Dict[str, Any]:
+        user_id = 10000 + wallet_count
+        await harness.seed(user_id, wallet_count)
+
+        async def balance():
+            # Every wallet's balance: /balance, then "Older" until the last page; the pages'
+            # replies are collected on the first event so failed() sees all of them
+            harness.cold(user_id)
+            event = await harness.driver.message(user_id, '/balance')
+            data = next_page(event, 'balance')
+            while data is not None:
+                page = await harness.driver.press(user_id, data)
+                event.responses.extend(page.responses)
+                data = next_page(page, 'balance')
+            return event
+        await balance()  # warm-up: backend loading, connections, token metadata
+        return await measure(harness, [balance] * harness.args.iterations, concurrency=1)
+    return scenario
+
+async def create_bulk(harness: Harness) -> Dict[str, Any]:
+    # Many wallet creations at once (HD derivation, seed and index writes), spread over
+    # 20 users pressing the create button concurrently
+    networks = [currency.lower() for currency in harness.args.networks]
+    operations = [
+        (lambda i=i: harness.driver.press(20000 + i % 20, f"create_{networks[i % len(networks)]}".encode()))
+        for i in range(harness.args.creates)
+    ]
+    await operations[0]()
+    return await measure(harness, operations, concurrency=20)
+
+async def send_bulk(harness: Harness) -> Dict[str, Any]:
+    # /send from 20 users' freshly created EVM wallets at once: key lookup, unsealing,
+    # signing and broadcast. Compare with --no-vault for the key vault's share
+    currency = next(c for c in harness.args.networks if c in ('ETH', 'BSC', 'MATIC'))
+    users = [40000 + i for i in range(20)]
+    for user_id in users:
+        await harness.driver.press(user_id, f"create_{currency.lower()}".encode())
+    to_address = fake_address(currency, 0, 0)
+    operations = [
+        (lambda i=i: harness.driver.message(users[i % len(users)], f"/send {currency} {to_address} 0.001"))
+        for i in range(harness.args.sends)
+    ]
+    await operations[0]()
+    return await measure(harness, operations, concurrency=len(users))
+
+async def concurrent_users(harness: Harness) -> Dict[str, Any]:
+    # --users users with 10 wallets each asking for /balance at the same time, cold cache
+    users = [30000 + i for i in range(harness.args.users)]
+    for user_id in users:
+        await harness.seed(user_id, 10)
+
+    def balance(user_id: int):
+        async def run():
+            harness.cold(user_id)
+            return await harness.driver.message(user_id, '/balance')
+        return run
+    operations = [balance(user_id) for _ in range(harness.args.rounds) for user_id in users]
+    return await measure(harness, operations, concurrency=len(users))
+
+SCENARIOS = {
+    'balance_1': balance_scenario(1),
+    'balance_10': balance_scenario(10),
+    'balance_100': balance_scenario(100),
+    'create_bulk': create_bulk,
+    'send_bulk': send_bulk,
+    'concurrent_users': concurrent_users
+}
+
+def settings(args: argparse.Namespace) -> Dict[str, Any]:
+    # Results are only comparable with baselines taken under the same mock conditions
+    return {key: getattr(args, key) for key in (
+        'latency', 'jitter', 'btc_latency', 'error_rate', 'throttle_rate', 'iterations',
+        'creates', 'sends', 'users', 'rounds', 'networks', 'vault'
+    )}
+
+def compare(name: str, result: Dict[str, Any], baseline: Optional[Dict[str, Any]], tolerance: float) -> List[str]:
+    if baseline is None:
+        return []
+    problems = []
+    for metric in ('p50_ms', 'p99_ms'):
+        if result[metric] > baseline[metric] * (1 + tolerance):
+            problems.append(f"{metric} {baseline[metric]:.1f} -> {result[metric]:.1f}")
+    if result['throughput'] < baseline['throughput'] * (1 - tolerance):
+        problems.append(f"throughput {baseline['throughput']:.1f} -> {result['throughput']:.1f}")
+    if result['rpc_requests'] > baseline['rpc_requests'] * (1 + tolerance):
+        problems.append(f"rpc_requests {baseline['rpc_requests']} -> {result['rpc_requests']}")
+    return problems
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Offline benchmarks with mocked chains and Telegram")
+    parser.add_argument('scenarios', nargs='*', help=f"any of {', '.join(SCENARIOS)} (default: all)")
+    parser.add_argument('--latency', type=float, default=0.05, help="mock RPC latency, seconds")
+    parser.add_argument('--jitter', type=float, default=0.01)
+    parser.add_argument('--btc-latency', type=float, default=0.1, help="mock Electrum server and stub bitcoinlib Service latency")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="share of RPC requests failing with 500")
+    parser.add_argument('--throttle-rate', type=float, default=0.0, help="share of RPC requests answered 429")
+    parser.add_argument('--iterations', type=int, default=20)
+    parser.add_argument('--creates', type=int, default=200)
+    parser.add_argument('--sends', type=int, default=200)
+    parser.add_argument('--users', type=int, default=50)
+    parser.add_argument('--rounds', type=int, default=3)
+    parser.add_argument('--networks', type=lambda value: [n.strip().upper() for n in value.split(',')],
+                        default=NETWORKS)
+    parser.add_argument('--no-vault', dest='vault', action='store_false',
+                        help="store keys unencrypted, to measure the key vault's overhead")
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--tolerance', type=float, default=0.25, help="allowed regression vs baseline")
+    parser.add_argument('--save', action='store_true', help="store the results as the new baselines")
+    parser.add_argument('--output', help="also write the results to this JSON file")
+    args = parser.parse_args(argv)
+    unknown = [name for name in args.scenarios if name not in SCENARIOS]
+    if unknown:
+        parser.error(f"unknown scenario: {', '.join(unknown)}")
+    return args
+
+async def run(args: argparse.Namespace) -> int:
+    names = args.scenarios or list(SCENARIOS)
+    baselines = {}
+    if os.path.exists(BASELINES):
+        with open(BASELINES) as f:
+            baselines = json.load(f)
+    comparable = baselines.get('settings') == settings(args)
+    if baselines and not comparable:
+        print("⚠️ Baselines were recorded with different settings; not comparing")
+
+    harness = Harness(args)
+    results: Dict[str, Dict[str, Any]] = {}
+    regressions = 0
+    try:
+        await harness.start()
+        print(f"{'scenario':<18}{'ops':>6}{'err':>5}{'p50 ms':>9}{'p99 ms':>9}{'ops/s':>9}{'rpc':>7}{'RSS MB':>8}")
+        for name in names:
+            result = await SCENARIOS[name](harness)
+            results[name] = result
+            print(f"{name:<18}{result['operations']:>6}{result['errors']:>5}{result['p50_ms']:>9.1f}"
+                  f"{result['p99_ms']:>9.1f}{result['throughput']:>9.1f}{result['rpc_requests']:>7}"
+                  f"{result['rss_mb']:>8.0f}")
+            problems = compare(name, result, baselines.get('results', {}).get(name), args.tolerance) if comparable else []
+            if problems:
+                regressions += 1
+                print(f"  ❌ regression: {', '.join(problems)}")
+    finally:
+        await harness.close()
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'settings': settings(args), 'results': results}, f, indent=2)
+    if args.save:
+        saved = baselines.get('results', {}) if comparable else {}
+        saved.update(results)
+        with open(BASELINES, 'w') as f:
+            json.dump({'settings': settings(args), 'results': saved}, f, indent=2, sort_keys=True)
+        print(f"Baselines saved to {BASELINES}")
+    return 1 if regressions and not args.save else 0
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(run(parse_args())))
@@ -0,0 +1,164 @@
+import random
+import re
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from .mock_rpc import seeded_amount
+
+class StubService:
+    # Drop-in for bitcoinlib.services.services.Service: the BTC/LTC backends call it from
+    # executor threads, so latency is a blocking sleep and failures are exceptions
+    latency = 0.05
+    jitter = 0.02
+    error_rate = 0.0
+    calls = 0
+    _lock = threading.Lock()
+    _random = random.Random(1)
+
+    def __init__(self, network: str = 'bitcoin', **kwargs):
+        self.network = network
+
+    @classmethod
+    def configure(cls, latency: float, jitter: float, error_rate: float, seed: int = 1):
+        cls.latency, cls.jitter, cls.error_rate = latency, jitter, error_rate
+        cls._random = random.Random(seed)
+
+    def _wait(self):
+        with self._lock:
+            StubService.calls += 1
+            delay = max(0.0, self.latency + self._random.uniform(-self.jitter, self.jitter))
+            failed = self._random.random() < self.error_rate
+        time.sleep(delay)
+        if failed:
+            raise ConnectionError("injected service failure")
+
+    def getbalance(self, address: str) -> int:
+        self._wait()
+        return seeded_amount(address, 10 ** 9)  # satoshis
+
+    def blockcount(self) -> int:
+        self._wait()
+        return 800000
+
+    def gettransaction(self, tx_hash: str) -> Dict[str, Any]:
+        self._wait()
+        return {'txid': tx_hash, 'block_height': 799990, 'confirmations': 11, 'status': 'confirmed'}
+
+    def getblock(self, number: int, parse_transactions: bool = True, page: int = 1, limit: int = 100) -> Dict[str, Any]:
+        self._wait()
+        return {'height': number, 'transactions': [], 'total_txs': 0}
+
+def install_stub_service():
+    # Swap the Service the bitcoin backend constructs; nothing else touches bitcoinlib's network code
+    import wallets.bitcoin
+    wallets.bitcoin.Service = StubService
+
+class FakeSender:
+    def __init__(self, user_id: int):
+        self.id = user_id
+        self.username = f"bench{user_id}"
+
+class FakeMessage:
+    def __init__(self, event: 'FakeEvent', text: str):
+        self.event = event
+        self.text = text
+
+    async def edit(self, text: str, **kwargs):
+        self.event.record(text, kwargs.get('buttons'))
+
+class FakeEvent:
+    # The attributes and methods the bot's handlers use on NewMessage and CallbackQuery events
+    def __init__(self, user_id: int, text: str = '', data: bytes = b'', match: Optional[re.Match] = None):
+        self.sender_id = user_id
+        self.sender = FakeSender(user_id)
+        self.raw_text = text
+        self.data = data
+        self.pattern_match = match
+        self.responses: List[Tuple[float, str]] = []
+        self.buttons = None  # the inline buttons of the last reply or edit
+
+    def record(self, text: str, buttons=None):
+        self.responses.append((time.perf_counter(), text))
+        self.buttons = buttons
+
+    async def reply(self, text: str, **kwargs) -> FakeMessage:
+        self.record(text, kwargs.get('buttons'))
+        return FakeMessage(self, text)
+
+    async def respond(self, text: str, **kwargs) -> FakeMessage:
+        return await self.reply(text, **kwargs)
+
+    async def edit(self, text: str, **kwargs):
+        self.record(text, kwargs.get('buttons'))
+
+    async def answer(self, text: str = '', **kwargs):
+        self.record(text)
+
+    async def delete(self):
+        pass
+
+class FakeTelegramClient:
+    # Replaces TelegramClient when WalletBot is constructed: collects the handlers the bot
+    # registers and lets the driver feed them events without any network I/O
+    def __init__(self, *args, **kwargs):
+        self.handlers: List[Tuple[Any, Callable]] = []
+        self.sent: List[Tuple[int, str]] = []
+
+    def on(self, builder):
+        def decorator(handler):
+            self.handlers.append((builder, handler))
+            return handler
+        return decorator
+
+    async def send_message(self, user_id: int, text: str, **kwargs):
+        self.sent.append((user_id, text))
+
+    async def start(self, *args, **kwargs):
+        return self
+
+    async def get_me(self):
+        return FakeSender(0)
+
+    async def disconnect(self):
+        pass
+
+class FakeTelegramDriver:
+    # Dispatches commands and button presses to the registered handlers the way Telethon
+    # would: message text against NewMessage patterns, callback data against CallbackQuery ones
+    def __init__(self, client: FakeTelegramClient):
+        self.routes: List[Tuple[str, re.Pattern, Callable]] = []
+        for builder, handler in client.handlers:
+            kind = 'callback' if type(builder).__name__ == 'CallbackQuery' else 'message'
+            self.routes.append((kind, self._pattern(builder), handler))
+
+    @staticmethod
+    def _pattern(builder) -> Optional[re.Pattern]:
+        # Telethon keeps either the pattern itself or its compiled, bound .match
+        for attr in ('pattern', 'match', 'data'):
+            value = getattr(builder, attr, None)
+            if isinstance(value, (str, bytes)):
+                return re.compile(value)
+            if isinstance(getattr(value, '__self__', None), re.Pattern):
+                return value.__self__
+        return None
+
+    def _route(self, kind: str, value) -> Tuple[Callable, Optional[re.Match]]:
+        for route_kind, compiled, handler in self.routes:
+            if route_kind != kind:
+                continue
+            match = compiled.match(value) if compiled is not None else None
+            if match:
+                return handler, match
+        raise LookupError(f"No handler for {value!r}")
+
+    async def message(self, user_id: int, text: str) -> FakeEvent:
+        handler, match = self._route('message', text)
+        event = FakeEvent(user_id, text=text, match=match)
+        await handler(event)
+        return event
+
+    async def press(self, user_id: int, data: bytes) -> FakeEvent:
+        handler, match = self._route('callback', data)
+        event = FakeEvent(user_id, data=data, match=match)
+        await handler(event)
+        return event
@@ -1,51 +1,151 @@
+import time
+IMPORT_STARTED = time.perf_counter()
+
 from telethon import TelegramClient, events, Button
 from config import Config
-from database import Database
+from service import WalletService, NETWORK_CODES
+from reports import COLUMNS as REPORT_KINDS
+from jobqueue import open_job_queue
+from sender import SendQueue
+from tracker import TransactionTracker
+from ratelimit import RateLimiter, current_caller
+from metrics import HANDLER_ERRORS, HANDLER_SECONDS, RATE_LIMITED, MetricsServer, SamplingProfiler
 import asyncio
+import functools
 import sys
 import os
+import uuid
 
 # Add current directory to path
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
-# Import wallet classes with error handling
-try:
-    from wallets.ethereum import EthereumWallet, BSCWallet, PolygonWallet
-    from wallets.bitcoin import BitcoinWallet, LitecoinWallet
-    from wallets.tron import TronWallet
-    WALLETS_LOADED = True
-except ImportError as e:
-    print(f"Warning: Could not load some wallet modules: {e}")
-    WALLETS_LOADED = False
+# Wallet backends (web3, tronpy, bitcoinlib) are imported on first use, not here
+from wallets.registry import rss_mb
+
+IMPORT_TIME = time.perf_counter() - IMPORT_STARTED
 
 class WalletBot:
     def __init__(self):
         self.client = TelegramClient('wallet_bot', Config.API_ID, Config.API_HASH)
-        self.db = Database()
         
-        # Initialize wallet managers
-        self.wallets = {}
-        if WALLETS_LOADED:
-            try:
-                self.wallets = {
-                    'ETH': EthereumWallet(Config.ETH_RPC),
-                    'BSC': BSCWallet(Config.BSC_RPC),
-                    'MATIC': PolygonWallet(Config.POLYGON_RPC),
-                    'BTC': BitcoinWallet(),
-                    'LTC': LitecoinWallet(),
-                    'TRX': TronWallet(Config.TRON_RPC)
-                }
-            except Exception as e:
-                print(f"Error initializing wallets: {e}")
+        # Wallet operations, shared by the handlers here and by worker processes
+        self.service = WalletService()
+        self.db = self.service.db
+        self.wallets = self.service.wallets
+        self.balance_engine = self.service.balance_engine
+        self.provisioner = self.service.provisioner
+        self.watcher = self.service.watcher
+        self.ledger = self.service.ledger
+        self.tokens = self.service.tokens
         
+        # BOT_ROLE=frontend: balance/create/tx jobs run in worker processes (worker.py);
+        # the watcher, ledger, tracker and send queue stay singletons in this process
+        self.jobs = None
+        if Config.BOT_ROLE == 'frontend':
+            self.jobs = open_job_queue(
+                Config.JOB_QUEUE_URL,
+                ttl=Config.JOB_TIMEOUT,
+                poll_interval=Config.JOB_POLL_INTERVAL,
+                visibility_timeout=Config.JOB_VISIBILITY_TIMEOUT
+            )
+        
+        self.tracker = TransactionTracker(self.db, self.balance_engine)
+        self.tracker.listeners.append(self.notify_transaction)
+        self.service.feeds.head_listeners.append(self.tracker.on_head)
+        self.sender = SendQueue(
+            self.db,
+            self.balance_engine,
+            self.tokens,
+            self.tracker,
+            workers=Config.SEND_WORKERS,
+            max_pending=Config.SEND_QUEUE_SIZE,
+            vault=self.service.vault
+        )
+        self.limiter = RateLimiter(Config.RATE_LIMITS)
+        self.metrics = MetricsServer(
+            Config.METRICS_HOST,
+            Config.METRICS_PORT,
+            profiler=SamplingProfiler(Config.PROFILE_INTERVAL)
+        )
         self.setup_handlers()
     
+    def limited(self, command: str):
+        # Per-user token buckets in front of a handler; chain calls made while handling
+        # the event are attributed to the user for the RPC fair scheduler. Every handler
+        # run is timed, rejected ones included
+        def decorator(handler):
+            @functools.wraps(handler)
+            async def wrapper(event):
+                with HANDLER_SECONDS.time(handler=handler.__name__):
+                    current_caller.set(f"user:{event.sender_id}")
+                    retry_after = await self.limiter.check(event.sender_id, command)
+                    if retry_after > 0:
+                        RATE_LIMITED.inc(command=command)
+                        text = f"⏳ Too many requests, try again in {retry_after:.0f}s."
+                        if isinstance(event, events.CallbackQuery.Event):
+                            await event.answer(text, alert=True)
+                        else:
+                            await event.reply(text)
+                        return
+                    try:
+                        return await handler(event)
+                    except Exception:
+                        HANDLER_ERRORS.inc(handler=handler.__name__)
+                        raise
+            return wrapper
+        return decorator
+    
+    async def run_job(self, kind: str, payload: dict, on_update=None) -> dict:
+        # Worker replies arrive whole, so on_update progress only streams in-process
+        if self.jobs is not None:
+            return await self.jobs.call(kind, payload, Config.JOB_TIMEOUT)
+        return await self.service.handle(kind, payload, on_update)
+    
+    @staticmethod
+    def page_buttons(result: dict):
+        if not result.get('buttons'):
+            return None
+        return [[Button.inline(label, data.encode()) for label, data in result['buttons']]]
+    
+    async def show_balance(self, event, payload: dict, message=None):
+        # One page of balances in one message - a reply, or the message whose page button
+        # was pressed - edited as each network answers, at most once per BALANCE_EDIT_INTERVAL
+        shown = {'text': None, 'at': 0.0}
+        
+        async def show(result: dict, final: bool = False):
+            nonlocal message
+            now = time.monotonic()
+            if result['text'] == shown['text'] or (not final and now - shown['at'] < Config.BALANCE_EDIT_INTERVAL):
+                return
+            shown.update(text=result['text'], at=now)
+            if message is None:
+                message = await event.reply(result['text'], buttons=self.page_buttons(result))
+            else:
+                await message.edit(result['text'], buttons=self.page_buttons(result))
+        
+        try:
+            result = await self.run_job('balance', payload, on_update=show)
+        except Exception as e:
+            await show({'text': f"❌ Could not fetch balances: {str(e) or 'timed out'}"}, final=True)
+            return
+        await show(result, final=True)
+    
+    async def notify_transaction(self, user_id: int, currency: str, tx: dict):
+        if tx['status'] == 'confirmed':
+            text = f"✅ Your {currency} transaction is confirmed ({tx['confirmations']} confirmations)"
+        elif tx['status'] == 'failed':
+            text = f"❌ Your {currency} transaction failed on-chain"
+        else:
+            text = f"⚠️ Your {currency} transaction was not mined and has been dropped"
+        await self.client.send_message(user_id, f"{text}\n**Transaction:** `{tx['tx_hash']}`")
+    
     def setup_handlers(self):
         @self.client.on(events.NewMessage(pattern='/start'))
+        @self.limited('start')
         async def start_handler(event):
             user_id = event.sender_id
             username = event.sender.username if event.sender.username else "unknown"
-            self.db.add_user(user_id, username)
+            await self.db.add_user(user_id, username)
             
             await event.reply(
                 "💰 **Crypto Wallet Bot**\n\n"
@@ -54,160 +154,201 @@ class WalletBot:
                 "/wallets - View your wallets\n"
                 "/balance - Check wallet balance\n"
                 "/send - Send cryptocurrency\n"
+                "/tx - Look up a transaction\n"
                 "/help - Show help message"
             )
         
         @self.client.on(events.NewMessage(pattern='/create'))
+        @self.limited('menu')
         async def create_handler(event):
             if not self.wallets:
                 await event.reply("❌ Wallet services are currently unavailable. Please try again later.")
                 return
             
+            # Only the networks this deployment has enabled
+            choices = [
+                ('BTC', Button.inline("🟡 Bitcoin (BTC)", b"create_btc")),
+                ('LTC', Button.inline("🔶 Litecoin (LTC)", b"create_ltc")),
+                ('ETH', Button.inline("🔷 Ethereum (ETH)", b"create_eth")),
+                ('BSC', Button.inline("🟡 BSC (BEP20)", b"create_bsc")),
+                ('MATIC', Button.inline("🟣 Polygon (MATIC)", b"create_matic")),
+                ('TRX', Button.inline("🔴 Tron (TRC20)", b"create_trx"))
+            ]
+            enabled = [button for currency, button in choices if currency in self.wallets]
             await event.reply(
                 "Select network to create wallet:",
-                buttons=[
-                    [Button.inline("🟡 Bitcoin (BTC)", b"create_btc"),
-                     Button.inline("🔶 Litecoin (LTC)", b"create_ltc")],
-                    [Button.inline("🔷 Ethereum (ETH)", b"create_eth"),
-                     Button.inline("🟡 BSC (BEP20)", b"create_bsc")],
-                    [Button.inline("🟣 Polygon (MATIC)", b"create_matic"),
-                     Button.inline("🔴 Tron (TRC20)", b"create_trx")],
+                buttons=[enabled[i:i + 2] for i in range(0, len(enabled), 2)] + [
                     [Button.inline("❌ Cancel", b"cancel")]
                 ]
             )
         
         @self.client.on(events.CallbackQuery(pattern=b'create_(.*)'))
+        @self.limited('create')
         async def create_specific_wallet(event):
             network_code = event.pattern_match.group(1).decode()
             user_id = event.sender_id
             username = event.sender.username if event.sender.username else "unknown"
             
-            network_map = {
-                'btc': ('BTC', 'Bitcoin'),
-                'ltc': ('LTC', 'Litecoin'),
-                'eth': ('ETH', 'Ethereum'),
-                'bsc': ('BSC', 'Binance Smart Chain'),
-                'matic': ('MATIC', 'Polygon'),
-                'trx': ('TRX', 'Tron')
-            }
-            
-            if network_code not in network_map:
+            if network_code not in NETWORK_CODES:
                 await event.edit("❌ Invalid network selection!")
                 return
             
-            currency, network_name = network_map[network_code]
+            _, network_name = NETWORK_CODES[network_code]
             
             # Show creating message
             await event.edit(f"⏳ Creating {network_name} wallet...")
             
             try:
-                wallet_manager = self.wallets.get(currency)
-                if not wallet_manager:
-                    await event.edit(f"❌ {network_name} wallet service not available!")
-                    return
-                
-                # Create wallet
-                wallet_data = wallet_manager.create_wallet()
-                
-                # Save to database
-                self.db.add_wallet(
-                    user_id=user_id,
-                    network=network_name,
-                    currency=currency,
-                    address=wallet_data['address'],
-                    private_key=wallet_data['private_key'],
-                    public_key=wallet_data.get('public_key', ''),
-                    mnemonic=wallet_data.get('mnemonic')
-                )
-                
-                # Send wallet info
-                message = f"""
-**✅ {network_name} Wallet Created!**
-
-**Address:** `{wallet_data['address']}`
-**Network:** {network_name} ({currency})
-
-**⚠️ IMPORTANT SECURITY WARNING ⚠️**
-- Keep your private key secret!
-- Never share it with anyone
-- Store it securely offline
-- This bot is for testing only
-
-**Private Key:** `{wallet_data['private_key'][:20]}...` (truncated for security)
-
-Use /wallets to see all your wallets.
-"""
-                await event.edit(message)
+                result = await self.run_job('create', {
+                    'user_id': user_id,
+                    'username': username,
+                    'network_code': network_code,
+                    # The same for every run of this job, so a retried create makes one wallet
+                    'request_id': uuid.uuid4().hex
+                })
+                if result.get('address'):
+                    self.watcher.watch_address(result['currency'], result['network'], result['address'], user_id)
+                await event.edit(result['text'])
                 
             except Exception as e:
-                await event.edit(f"❌ Error creating wallet: {str(e)}")
+                await event.edit(f"❌ Error creating wallet: {str(e) or 'timed out'}")
         
         @self.client.on(events.NewMessage(pattern='/wallets'))
+        @self.limited('wallets')
         async def wallets_handler(event):
-            user_id = event.sender_id
-            wallets = self.db.get_user_wallets(user_id)
-            
-            if not wallets:
-                await event.reply("You don't have any wallets yet. Use /create to make one!")
-                return
-            
-            message = "**📋 Your Wallets:**\n\n"
-            for wallet in wallets:
-                wallet_id, network, currency, address, created_at = wallet
-                message += f"**{network} ({currency})**\n"
-                message += f"Address: `{address}`\n"
-                message += f"Created: {created_at}\n"
-                message += "─" * 30 + "\n"
-            
-            await event.reply(message)
+            result = await self.service.wallets_page(event.sender_id)
+            await event.reply(result['text'], buttons=self.page_buttons(result))
+        
+        @self.client.on(events.CallbackQuery(pattern=rb'wallets_(next|prev)_(\d+)'))
+        @self.limited('wallets')
+        async def wallets_page_handler(event):
+            direction, cursor = event.pattern_match.group(1), int(event.pattern_match.group(2))
+            result = await self.service.wallets_page(event.sender_id, cursor, backward=direction == b'prev')
+            await event.edit(result['text'], buttons=self.page_buttons(result))
         
         @self.client.on(events.NewMessage(pattern='/balance'))
+        @self.limited('balance')
         async def balance_handler(event):
-            user_id = event.sender_id
-            wallets = self.db.get_user_wallets(user_id)
+            await self.show_balance(event, {'user_id': event.sender_id})
+        
+        @self.client.on(events.CallbackQuery(pattern=rb'balance_(next|prev)_(\d+)'))
+        @self.limited('balance')
+        async def balance_page_handler(event):
+            direction, cursor = event.pattern_match.group(1), int(event.pattern_match.group(2))
+            await self.show_balance(event, {
+                'user_id': event.sender_id,
+                'cursor': cursor,
+                'backward': direction == b'prev'
+            }, message=event)
+        
+        @self.client.on(events.NewMessage(pattern='/tx'))
+        @self.limited('tx')
+        async def tx_handler(event):
+            args = event.raw_text.split()[1:]
+            if len(args) != 2:
+                await event.reply("Usage: /tx <network> <transaction hash>\nExample: /tx ETH 0x...")
+                return
             
-            if not wallets:
-                await event.reply("You don't have any wallets yet!")
+            try:
+                result = await self.run_job('tx', {'currency': args[0].upper(), 'tx_hash': args[1]})
+            except Exception as e:
+                await event.reply(f"❌ Could not look up transaction: {str(e) or 'timed out'}")
                 return
             
-            message = "**💰 Wallet Balances:**\n\n"
-            total_processed = 0
+            await event.reply(result['text'])
+        
+        @self.client.on(events.NewMessage(pattern='/send'))
+        @self.limited('send')
+        async def send_handler(event):
+            if not Config.SEND_ENABLED:
+                await event.reply(
+                    "⚠️ **Send Functionality** ⚠️\n\n"
+                    "For security reasons, direct sending is disabled in this version.\n"
+                    "To send funds:\n"
+                    "1. Export your private key using /export\n"
+                    "2. Use a secure wallet app\n\n"
+                    "Example secure wallets:\n"
+                    "- MetaMask (for ETH/BSC/Polygon)\n"
+                    "- Trust Wallet\n"
+                    "- Ledger/Trezor (hardware)\n"
+                    "- Electrum (for BTC/LTC)"
+                )
+                return
             
-            for wallet in wallets:
-                wallet_id, network, currency, address, _ = wallet
-                wallet_manager = self.wallets.get(currency)
-                if wallet_manager:
-                    try:
-                        balance = wallet_manager.get_balance(address)
-                        message += f"**{network} ({currency})**\n"
-                        message += f"Address: `{address[:10]}...{address[-8:]}`\n"
-                        message += f"Balance: {balance:.6f} {currency}\n"
-                        message += "─" * 30 + "\n"
-                        total_processed += 1
-                    except Exception as e:
-                        message += f"**{network} ({currency})** - Error: Could not fetch balance\n"
+            args = event.raw_text.split()[1:]
+            if len(args) not in (3, 4):
+                await event.reply(
+                    "Usage: /send <network> <address> <amount> [token]\n"
+                    "Example: /send ETH 0x... 0.05\n"
+                    "Example: /send BSC 0x... 25 USDT"
+                )
+                return
+            currency, to_address, amount = args[0].upper(), args[1], args[2]
+            token = args[3].upper() if len(args) == 4 else None
+            try:
+                amount = float(amount)
+                if amount <= 0:
+                    raise ValueError
+            except ValueError:
+                await event.reply("❌ Invalid amount!")
+                return
             
-            if total_processed == 0:
-                message += "❌ Could not fetch any balances. Please try again later."
+            wallets = await self.db.get_user_wallets(event.sender_id)
+            wallet = next((w for w in wallets if w[2] == currency), None)
+            if wallet is None:
+                await event.reply(f"❌ You don't have a {currency} wallet. Use /create first.")
+                return
             
-            await event.reply(message)
+            _, network, _, from_address, _ = wallet
+            asset = token or currency
+            message = await event.reply(f"⏳ Sending {amount} {asset} to `{to_address}`...")
+            try:
+                tx_hash = await self.sender.send(
+                    event.sender_id, currency, from_address, to_address, amount, token, network
+                )
+                await message.edit(
+                    f"✅ Sent {amount} {asset}\n**Transaction:** `{tx_hash}`\n"
+                    f"You'll be notified after {Config.MIN_CONFIRMATIONS} confirmations."
+                )
+            except Exception as e:
+                await message.edit(f"❌ Send failed: {str(e)}")
         
-        @self.client.on(events.NewMessage(pattern='/send'))
-        async def send_handler(event):
-            await event.reply(
-                "⚠️ **Send Functionality** ⚠️\n\n"
-                "For security reasons, direct sending is disabled in this version.\n"
-                "To send funds:\n"
-                "1. Export your private key using /export\n"
-                "2. Use a secure wallet app\n\n"
-                "Example secure wallets:\n"
-                "- MetaMask (for ETH/BSC/Polygon)\n"
-                "- Trust Wallet\n"
-                "- Ledger/Trezor (hardware)\n"
-                "- Electrum (for BTC/LTC)"
-            )
+        @self.client.on(events.NewMessage(pattern='/report'))
+        @self.limited('report')
+        async def report_handler(event):
+            # Admins only; the report is built in the background and sent as a file
+            if event.sender_id not in Config.ADMIN_IDS:
+                return
+            args = event.raw_text.split()[1:]
+            if len(args) != 1 or args[0].lower() not in REPORT_KINDS:
+                await event.reply(f"Usage: /report <{'|'.join(REPORT_KINDS)}>")
+                return
+            kind = args[0].lower()
+            if self.service.reports.running(kind):
+                await event.reply(f"⏳ A {kind} report is already running.")
+                return
+            
+            message = await event.reply(f"⏳ Building the {kind} report...")
+            shown = {'at': time.monotonic()}
+            
+            async def progress(wallets: int):
+                now = time.monotonic()
+                if now - shown['at'] < Config.REPORT_PROGRESS_INTERVAL:
+                    return
+                shown['at'] = now
+                await message.edit(f"⏳ Building the {kind} report... {wallets} wallets read")
+            
+            async def done(result: dict):
+                if result['path'] is None:
+                    await message.edit(result['text'])
+                    return
+                await self.client.send_file(event.chat_id, result['path'], caption=result['text'][:1024])
+                await message.delete()
+            
+            self.service.reports.start(kind, done, progress)
         
         @self.client.on(events.NewMessage(pattern='/help'))
+        @self.limited('help')
         async def help_handler(event):
             await event.reply(
                 "🤖 **Wallet Bot Help**\n\n"
@@ -216,6 +357,7 @@ Use /wallets to see all your wallets.
                 "/create - Create new wallet\n"
                 "/wallets - List your wallets\n"
                 "/balance - Check balances\n"
+                "/tx - Look up a transaction\n"
                 "/help - This message\n\n"
                 "**Supported Networks:**\n"
                 "• Bitcoin (BTC)\n"
@@ -234,8 +376,18 @@ Use /wallets to see all your wallets.
     
     async def start(self):
         try:
+            await self.metrics.start()
+            await self.service.start(jobs=self.jobs is None)
+            if self.jobs is not None:
+                await self.jobs.start()
+            await self.tracker.start()
+            self.sender.start()
             await self.client.start(bot_token=Config.BOT_TOKEN)
             print("✅ Bot started successfully!")
+            print(
+                f"⏱️ Startup: imports {IMPORT_TIME:.2f}s, ready after {time.perf_counter() - IMPORT_STARTED:.2f}s, "
+                f"RSS {rss_mb():.0f} MB, networks: {', '.join(self.wallets)}"
+            )
             
             # Get bot info
             me = await self.client.get_me()
@@ -245,6 +397,13 @@ Use /wallets to see all your wallets.
             await self.client.run_until_disconnected()
         except Exception as e:
             print(f"❌ Error starting bot: {e}")
+        finally:
+            await self.sender.stop()
+            await self.tracker.stop()
+            if self.jobs is not None:
+                await self.jobs.close()
+            await self.service.close()
+            await self.metrics.close()
 
 if __name__ == "__main__":
     print("🚀 Starting Wallet Bot...")
@@ -0,0 +1,150 @@
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+from config import Config
+
+class BalanceCache:
+    def __init__(self, max_entries: Optional[int] = None, default_ttl: Optional[float] = None,
+                 ttls: Optional[Dict[str, float]] = None):
+        self.max_entries = max_entries or Config.BALANCE_CACHE_SIZE
+        self.default_ttl = Config.BALANCE_CACHE_TTL if default_ttl is None else default_ttl
+        self.ttls = Config.BALANCE_CACHE_TTLS if ttls is None else ttls
+        # (network, address) -> (expires_at, value), least recently used first
+        self._entries: "OrderedDict[Tuple[str, str], Tuple[float, Any]]" = OrderedDict()
+        self._inflight: Dict[Tuple[str, str], asyncio.Future] = {}
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+
+    def ttl_for(self, network: str) -> float:
+        return self.ttls.get(network, self.default_ttl)
+
+    def get(self, network: str, address: str) -> Optional[Any]:
+        key = (network, address)
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def set(self, network: str, address: str, value: Any):
+        key = (network, address)
+        self._entries[key] = (time.monotonic() + self.ttl_for(network), value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate(self, network: str, address: str):
+        self._entries.pop((network, address), None)
+
+    async def get_or_fetch(self, network: str, address: str,
+                           fetch: Callable[[], Awaitable[Any]]) -> Any:
+        value = self.get(network, address)
+        if value is not None:
+            self.hits += 1
+            return value
+
+        # Single-flight: concurrent misses for the same key share one RPC call
+        key = (network, address)
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            self.coalesced += 1
+            await asyncio.wait([inflight])
+            if not inflight.cancelled():
+                return inflight.result()
+            # The owning request was cancelled; fetch on our own behalf
+            return await self.get_or_fetch(network, address, fetch)
+
+        self.misses += 1
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            value = await fetch()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Mark retrieved so an error nobody else waited on isn't logged
+            future.exception()
+            raise
+        else:
+            self.set(network, address, value)
+            future.set_result(value)
+            return value
+        finally:
+            self._inflight.pop(key, None)
+
+    async def get_or_fetch_many(self, network: str, addresses: List[str],
+                                fetch_many: Callable[[List[str]], Awaitable[Dict[str, Any]]]) -> Dict[str, Any]:
+        # Batched variant: one fetch_many call for every address that is neither cached
+        # nor already in flight. Addresses missing from the fetch result are left out.
+        results = {}
+        waiting = {}
+        missing = []
+        for address in dict.fromkeys(addresses):
+            value = self.get(network, address)
+            if value is not None:
+                self.hits += 1
+                results[address] = value
+            elif (network, address) in self._inflight:
+                self.coalesced += 1
+                waiting[address] = self._inflight[(network, address)]
+            else:
+                self.misses += 1
+                missing.append(address)
+
+        loop = asyncio.get_running_loop()
+        futures = {address: loop.create_future() for address in missing}
+        for address, future in futures.items():
+            self._inflight[(network, address)] = future
+        try:
+            fetched = await fetch_many(missing) if missing else {}
+        except asyncio.CancelledError:
+            for future in futures.values():
+                future.cancel()
+            raise
+        except Exception as e:
+            fetched = {}
+            for future in futures.values():
+                future.set_exception(e)
+                future.exception()
+        finally:
+            for address in missing:
+                self._inflight.pop((network, address), None)
+
+        for address, future in futures.items():
+            if future.done():
+                continue
+            if address in fetched:
+                self.set(network, address, fetched[address])
+                future.set_result(fetched[address])
+                results[address] = fetched[address]
+            else:
+                future.set_exception(KeyError(address))
+                future.exception()
+
+        if waiting:
+            await asyncio.wait(waiting.values())
+        for address, future in waiting.items():
+            if not future.cancelled() and future.exception() is None:
+                results[address] = future.result()
+        return results
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses + self.coalesced
+        return {
+            'entries': len(self._entries),
+            'hits': self.hits,
+            'misses': self.misses,
+            'coalesced': self.coalesced,
+            'evictions': self.evictions,
+            'hit_rate': (self.hits + self.coalesced) / lookups if lookups else 0.0
+        }
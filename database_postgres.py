@@ -0,0 +1,374 @@
+import asyncpg
+from database import Storage
+from metrics import DB_QUERY_SECONDS, instrument
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+# Mirrors database.MIGRATIONS step for step; schema_version records how many have run
+MIGRATIONS = [
+    # 1: initial schema
+    """
+    CREATE TABLE IF NOT EXISTS users (
+        user_id BIGINT PRIMARY KEY,
+        username TEXT,
+        created_at TIMESTAMPTZ DEFAULT now()
+    );
+
+    CREATE TABLE IF NOT EXISTS wallets (
+        id BIGSERIAL PRIMARY KEY,
+        user_id BIGINT REFERENCES users (user_id),
+        network TEXT,
+        currency TEXT,
+        address TEXT UNIQUE,
+        private_key TEXT,
+        public_key TEXT,
+        mnemonic TEXT,
+        created_at TIMESTAMPTZ DEFAULT now()
+    );
+
+    CREATE TABLE IF NOT EXISTS transactions (
+        id BIGSERIAL PRIMARY KEY,
+        user_id BIGINT REFERENCES users (user_id),
+        tx_hash TEXT UNIQUE,
+        from_address TEXT,
+        to_address TEXT,
+        amount NUMERIC,
+        currency TEXT,
+        network TEXT,
+        status TEXT,
+        created_at TIMESTAMPTZ DEFAULT now()
+    );
+    """,
+    # 2: indexes for get_user_wallets and get_wallet_private_key
+    """
+    CREATE INDEX IF NOT EXISTS idx_wallets_user_created ON wallets (user_id, created_at);
+    CREATE INDEX IF NOT EXISTS idx_wallets_user_address ON wallets (user_id, address);
+    """,
+    # 3: one HD seed per user plus the next unused address index per network
+    """
+    CREATE TABLE IF NOT EXISTS user_seeds (
+        user_id BIGINT PRIMARY KEY REFERENCES users (user_id),
+        mnemonic TEXT NOT NULL,
+        created_at TIMESTAMPTZ DEFAULT now()
+    );
+
+    CREATE TABLE IF NOT EXISTS hd_indexes (
+        user_id BIGINT,
+        currency TEXT,
+        next_index INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (user_id, currency)
+    );
+
+    ALTER TABLE wallets ADD COLUMN IF NOT EXISTS derivation_index INTEGER;
+    """,
+    # 4: deposit indexing - one row per (tx, receiving address), confirmation tracking
+    # and a per-chain block checkpoint
+    """
+    ALTER TABLE transactions ADD COLUMN IF NOT EXISTS block_number BIGINT;
+    ALTER TABLE transactions ADD COLUMN IF NOT EXISTS confirmations INTEGER DEFAULT 0;
+    ALTER TABLE transactions DROP CONSTRAINT IF EXISTS transactions_tx_hash_key;
+    ALTER TABLE transactions ADD CONSTRAINT transactions_tx_hash_to_address_key UNIQUE (tx_hash, to_address);
+    CREATE INDEX IF NOT EXISTS idx_transactions_status ON transactions (currency, status);
+
+    CREATE TABLE IF NOT EXISTS chain_checkpoints (
+        currency TEXT PRIMARY KEY,
+        last_block BIGINT NOT NULL,
+        updated_at TIMESTAMPTZ DEFAULT now()
+    );
+    """,
+    # 5: locally materialized balance ledger; balance is exact as of as_of_block
+    """
+    CREATE TABLE IF NOT EXISTS balances (
+        currency TEXT,
+        address TEXT,
+        balance NUMERIC NOT NULL DEFAULT 0,
+        as_of_block BIGINT NOT NULL,
+        reconciled_at TIMESTAMPTZ DEFAULT now(),
+        PRIMARY KEY (currency, address)
+    );
+    CREATE INDEX IF NOT EXISTS idx_balances_reconciled ON balances (currency, reconciled_at);
+    """,
+    # 6: token contract metadata
+    """
+    CREATE TABLE IF NOT EXISTS token_metadata (
+        currency TEXT,
+        contract TEXT,
+        symbol TEXT,
+        name TEXT,
+        decimals INTEGER NOT NULL,
+        PRIMARY KEY (currency, contract)
+    );
+    """,
+    # 7: outgoing transfers tracked until confirmed
+    """
+    ALTER TABLE transactions ADD COLUMN IF NOT EXISTS direction TEXT NOT NULL DEFAULT 'in';
+    """,
+    # 8: keyset pagination of a user's wallets, newest first, on (created_at, id)
+    """
+    DROP INDEX IF EXISTS idx_wallets_user_created;
+    CREATE INDEX IF NOT EXISTS idx_wallets_user_page ON wallets (user_id, created_at, id);
+    """,
+    # 9: the create job a wallet was made by, so a job run twice makes it only once
+    """
+    ALTER TABLE wallets ADD COLUMN IF NOT EXISTS request_id TEXT;
+    CREATE UNIQUE INDEX IF NOT EXISTS idx_wallets_request ON wallets (request_id);
+    """
+]
+
+class PostgresDatabase(Storage):
+    def __init__(self, dsn: str, pool_size: int = 4):
+        self.dsn = dsn
+        self.pool_size = pool_size
+        self.pool: Optional[asyncpg.Pool] = None
+    
+    async def connect(self):
+        # asyncpg prepares and caches every parameterized statement per connection,
+        # so the hot queries below are parsed and planned once per pooled connection
+        self.pool = await asyncpg.create_pool(
+            self.dsn,
+            min_size=1,
+            max_size=self.pool_size,
+            statement_cache_size=256
+        )
+        await self.migrate()
+    
+    async def migrate(self):
+        async with self.pool.acquire() as conn:
+            async with conn.transaction():
+                # Serialize concurrent starts of several bot processes
+                await conn.execute("SELECT pg_advisory_xact_lock(4242)")
+                await conn.execute("CREATE TABLE IF NOT EXISTS schema_version (version INTEGER NOT NULL)")
+                version = await conn.fetchval("SELECT max(version) FROM schema_version") or 0
+                for number, script in enumerate(MIGRATIONS[version:], start=version + 1):
+                    await conn.execute(script)
+                    await conn.execute("INSERT INTO schema_version (version) VALUES ($1)", number)
+    
+    async def add_user(self, user_id: int, username: Optional[str] = None):
+        await self.pool.execute(
+            "INSERT INTO users (user_id, username) VALUES ($1, $2) ON CONFLICT DO NOTHING",
+            user_id, username
+        )
+    
+    async def add_wallet(self, user_id: int, network: str, currency: str, address: str,
+                         private_key: str, public_key: str, mnemonic: Optional[str] = None,
+                         derivation_index: Optional[int] = None, request_id: Optional[str] = None):
+        return await self.pool.fetchval("""
+            INSERT INTO wallets (user_id, network, currency, address, private_key, public_key,
+                                 mnemonic, derivation_index, request_id)
+            VALUES ($1, $2, $3, $4, $5, $6, $7, $8, $9)
+            RETURNING id
+        """, user_id, network, currency, address, private_key, public_key, mnemonic, derivation_index, request_id)
+    
+    async def add_wallets(self, wallets: Iterable[Dict[str, Any]]) -> int:
+        rows = [
+            (w['user_id'], w['network'], w['currency'], w['address'],
+             w['private_key'], w.get('public_key', ''), w.get('mnemonic'), w.get('derivation_index'))
+            for w in wallets
+        ]
+        async with self.pool.acquire() as conn:
+            async with conn.transaction():
+                await conn.executemany("""
+                    INSERT INTO wallets (user_id, network, currency, address, private_key, public_key,
+                                         mnemonic, derivation_index)
+                    VALUES ($1, $2, $3, $4, $5, $6, $7, $8)
+                """, rows)
+        return len(rows)
+    
+    async def get_user_seed(self, user_id: int, new_mnemonic: Optional[str] = None) -> Optional[str]:
+        if new_mnemonic is None:
+            return await self.pool.fetchval("SELECT mnemonic FROM user_seeds WHERE user_id = $1", user_id)
+        async with self.pool.acquire() as conn:
+            async with conn.transaction():
+                await conn.execute(
+                    "INSERT INTO user_seeds (user_id, mnemonic) VALUES ($1, $2) ON CONFLICT DO NOTHING",
+                    user_id, new_mnemonic
+                )
+                return await conn.fetchval("SELECT mnemonic FROM user_seeds WHERE user_id = $1", user_id)
+    
+    async def reserve_hd_index(self, user_id: int, currency: str) -> int:
+        return await self.pool.fetchval("""
+            INSERT INTO hd_indexes (user_id, currency, next_index) VALUES ($1, $2, 1)
+            ON CONFLICT (user_id, currency) DO UPDATE SET next_index = hd_indexes.next_index + 1
+            RETURNING next_index - 1
+        """, user_id, currency)
+    
+    async def get_user_wallets(self, user_id: int) -> List[Tuple]:
+        return await self.pool.fetch("""
+            SELECT id, network, currency, address, created_at
+            FROM wallets
+            WHERE user_id = $1
+            ORDER BY created_at DESC
+        """, user_id)
+    
+    async def get_user_wallets_page(self, user_id: int, limit: int, cursor: Optional[int] = None,
+                                    backward: bool = False) -> Tuple[List[Tuple], bool]:
+        order, op = ('ASC', '>') if backward else ('DESC', '<')
+        bound = f"AND (created_at, id) {op} (SELECT created_at, id FROM wallets WHERE id = $3)" if cursor else ""
+        rows = await self.pool.fetch(f"""
+            SELECT id, network, currency, address, created_at
+            FROM wallets
+            WHERE user_id = $1 {bound}
+            ORDER BY created_at {order}, id {order}
+            LIMIT $2
+        """, user_id, limit + 1, *((cursor,) if cursor else ()))
+        page = rows[:limit]
+        if backward:
+            page.reverse()
+        return page, len(rows) > limit
+    
+    async def get_wallet_private_key(self, user_id: int, address: str) -> Optional[str]:
+        return await self.pool.fetchval("""
+            SELECT private_key FROM wallets
+            WHERE user_id = $1 AND address = $2
+        """, user_id, address)
+    
+    async def get_all_wallet_addresses(self) -> List[Tuple]:
+        return await self.pool.fetch("SELECT currency, network, address, user_id FROM wallets")
+    
+    async def get_checkpoint(self, currency: str) -> Optional[int]:
+        return await self.pool.fetchval(
+            "SELECT last_block FROM chain_checkpoints WHERE currency = $1", currency
+        )
+    
+    async def record_block(self, currency: str, block_number: int, deposits: List[Dict[str, Any]],
+                           deltas: Optional[Dict[str, float]] = None):
+        async with self.pool.acquire() as conn:
+            async with conn.transaction():
+                await conn.executemany("""
+                    UPDATE balances SET balance = balance + $1, as_of_block = $2
+                    WHERE currency = $3 AND address = $4 AND as_of_block < $2
+                """, [
+                    (delta, block_number, currency, address)
+                    for address, delta in (deltas or {}).items()
+                ])
+                await conn.executemany("""
+                    INSERT INTO transactions (user_id, tx_hash, from_address, to_address, amount,
+                                              currency, network, status, block_number, confirmations)
+                    VALUES ($1, $2, $3, $4, $5, $6, $7, $8, $9, $10)
+                    ON CONFLICT DO NOTHING
+                """, [
+                    (d['user_id'], d['tx_hash'], d['from_address'], d['to_address'], d['amount'],
+                     currency, d['network'], d['status'], block_number, d['confirmations'])
+                    for d in deposits
+                ])
+                await conn.execute("""
+                    INSERT INTO chain_checkpoints (currency, last_block) VALUES ($1, $2)
+                    ON CONFLICT (currency) DO UPDATE SET last_block = excluded.last_block, updated_at = now()
+                """, currency, block_number)
+    
+    async def get_user_ledger(self, user_id: int) -> List[Tuple]:
+        return await self.pool.fetch("""
+            SELECT w.currency, w.address, b.balance, b.as_of_block
+            FROM wallets w
+            JOIN balances b ON b.currency = w.currency AND b.address = w.address
+            WHERE w.user_id = $1
+        """, user_id)
+    
+    async def get_reconcile_batch(self, currency: str, limit: int) -> List[Tuple]:
+        return await self.pool.fetch("""
+            SELECT w.address, b.balance FROM wallets w
+            LEFT JOIN balances b ON b.currency = w.currency AND b.address = w.address
+            WHERE w.currency = $1
+            ORDER BY b.reconciled_at NULLS FIRST
+            LIMIT $2
+        """, currency, limit)
+    
+    async def set_ledger_balances(self, currency: str, entries: List[Tuple[str, float, int]]):
+        await self.pool.executemany("""
+            INSERT INTO balances (currency, address, balance, as_of_block, reconciled_at)
+            VALUES ($1, $2, $3, $4, now())
+            ON CONFLICT (currency, address) DO UPDATE SET
+                balance = excluded.balance,
+                as_of_block = excluded.as_of_block,
+                reconciled_at = excluded.reconciled_at
+        """, [(currency, address, balance, block) for address, balance, block in entries])
+    
+    async def get_token_metadata(self) -> List[Tuple]:
+        return await self.pool.fetch(
+            "SELECT currency, contract, symbol, name, decimals FROM token_metadata"
+        )
+    
+    async def add_token_metadata(self, entries: List[Tuple[str, str, str, str, int]]):
+        await self.pool.executemany("""
+            INSERT INTO token_metadata (currency, contract, symbol, name, decimals)
+            VALUES ($1, $2, $3, $4, $5)
+            ON CONFLICT (currency, contract) DO NOTHING
+        """, entries)
+    
+    async def get_pending_deposits(self, currency: str) -> List[Tuple]:
+        return await self.pool.fetch("""
+            SELECT tx_hash, to_address, block_number, confirmations FROM transactions
+            WHERE currency = $1 AND status = 'pending' AND direction = 'in'
+        """, currency)
+    
+    async def update_confirmations(self, updates: List[Tuple]):
+        await self.pool.executemany("""
+            UPDATE transactions SET confirmations = $1, status = $2
+            WHERE tx_hash = $3 AND to_address = $4
+        """, updates)
+    
+    async def add_transaction(self, user_id: int, tx_hash: str, from_address: str, to_address: str,
+                              amount: float, currency: str, network: str):
+        await self.pool.execute("""
+            INSERT INTO transactions (user_id, tx_hash, from_address, to_address, amount,
+                                      currency, network, status, confirmations, direction)
+            VALUES ($1, $2, $3, $4, $5, $6, $7, 'pending', 0, 'out')
+            ON CONFLICT (tx_hash, to_address) DO NOTHING
+        """, user_id, tx_hash, from_address, to_address, amount, currency, network)
+    
+    async def get_pending_transactions(self) -> List[Tuple]:
+        return await self.pool.fetch("""
+            SELECT user_id, currency, tx_hash, block_number, confirmations FROM transactions
+            WHERE status = 'pending' AND direction = 'out'
+        """)
+    
+    async def update_transactions(self, updates: List[Tuple]):
+        await self.pool.executemany("""
+            UPDATE transactions SET block_number = $1, confirmations = $2, status = $3
+            WHERE currency = $4 AND tx_hash = $5 AND direction = 'out'
+        """, updates)
+    
+    async def get_wallet_by_request(self, request_id: str) -> Optional[Tuple]:
+        return await self.pool.fetchrow(
+            "SELECT currency, network, address, private_key FROM wallets WHERE request_id = $1", request_id
+        )
+    
+    async def get_wallet_keys_batch(self, after_id: int, limit: int) -> List[Tuple]:
+        return await self.pool.fetch("""
+            SELECT id, address, private_key, mnemonic FROM wallets
+            WHERE id > $1 ORDER BY id LIMIT $2
+        """, after_id, limit)
+    
+    async def update_wallet_keys(self, updates: List[Tuple]):
+        await self.pool.executemany(
+            "UPDATE wallets SET private_key = $1, mnemonic = $2 WHERE id = $3", updates
+        )
+    
+    async def get_seeds_batch(self, after_user_id: int, limit: int) -> List[Tuple]:
+        return await self.pool.fetch("""
+            SELECT user_id, mnemonic FROM user_seeds
+            WHERE user_id > $1 ORDER BY user_id LIMIT $2
+        """, after_user_id, limit)
+    
+    async def update_seeds(self, updates: List[Tuple]):
+        await self.pool.executemany("UPDATE user_seeds SET mnemonic = $1 WHERE user_id = $2", updates)
+    
+    async def get_wallets_batch(self, after_id: int, limit: int) -> List[Tuple]:
+        return await self.pool.fetch("""
+            SELECT w.id, w.user_id, w.currency, w.address, b.balance, b.as_of_block, b.reconciled_at
+            FROM wallets w
+            LEFT JOIN balances b ON b.currency = w.currency AND b.address = w.address
+            WHERE w.id > $1 ORDER BY w.id LIMIT $2
+        """, after_id, limit)
+    
+    async def get_wallet_stats(self) -> List[Tuple]:
+        return await self.pool.fetch("""
+            SELECT currency, COUNT(*), COUNT(DISTINCT user_id), MAX(created_at)
+            FROM wallets GROUP BY currency ORDER BY currency
+        """)
+    
+    async def close(self):
+        if self.pool is not None:
+            await self.pool.close()
+
+# Per-method timings, as AsyncDatabase records them for SQLite
+instrument(PostgresDatabase, Storage.__abstractmethods__, DB_QUERY_SECONDS)
@@ -0,0 +1,279 @@
+import asyncio
+import itertools
+import json
+from abc import ABC, abstractmethod
+from typing import Any, Callable, Dict, List, Optional
+import aiohttp
+from config import Config
+from indexer import DepositWatcher, address_key
+from metrics import FEED_EVENTS, FEED_RECONNECTS
+from tokens import TokenRegistry
+
+# Backend modules (web3 for the log filters) are imported on first use, as in the registry
+
+# currency -> Config attribute holding the chain's WebSocket endpoints
+WS_URLS = {'ETH': 'ETH_WS_URLS', 'BSC': 'BSC_WS_URLS', 'MATIC': 'POLYGON_WS_URLS'}
+
+class Feed(ABC):
+    # One chain's event source, reconnecting with exponential backoff until stopped.
+    # last_block is the newest block whose transfers were all delivered: after a gap,
+    # transfers are backfilled from there over HTTP
+    def __init__(self, hub: 'ChainFeeds', currency: str):
+        self.hub = hub
+        self.currency = currency
+        self.last_block: Optional[int] = None
+        self.connected = False
+
+    def watch(self, address: str):
+        pass
+
+    @abstractmethod
+    async def session(self):
+        pass
+
+    @abstractmethod
+    async def fetch_transfers(self, from_block: int, to_block: int) -> List[Dict[str, Any]]:
+        pass
+
+    async def backfill(self, head: int):
+        if self.last_block is None or head <= self.last_block:
+            return
+        start = max(self.last_block + 1, head - Config.FEED_BACKFILL_BLOCKS + 1)
+        transfers = await self.fetch_transfers(start, head)
+        FEED_EVENTS.inc(len(transfers), network=self.currency, kind='backfill')
+        self.hub.transfers(self.currency, transfers)
+
+    def head(self, number: int):
+        FEED_EVENTS.inc(network=self.currency, kind='head')
+        self.hub.head(self.currency, number)
+
+    async def run(self):
+        backoff = 1.0
+        while True:
+            try:
+                await self.session()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Event feed error ({self.currency}): {e}")
+            FEED_RECONNECTS.inc(network=self.currency)
+            if self.connected:
+                backoff = 1.0
+            self.connected = False
+            await asyncio.sleep(backoff)
+            backoff = min(backoff * 2, Config.FEED_MAX_BACKOFF)
+
+class EVMFeed(Feed):
+    # eth_subscribe over the node's WebSocket: newHeads, and Transfer logs of the registered
+    # tokens into and out of our addresses. Subscribing comes before the backfill, so no
+    # block falls between the two; a transfer delivered twice is harmless. Endpoints are
+    # tried in turn, moving on whenever a connection ends
+    def __init__(self, hub: 'ChainFeeds', currency: str, urls: List[str]):
+        super().__init__(hub, currency)
+        self.urls = urls
+        self._url = 0
+        self._ids = itertools.count(1)
+        self._pending: Dict[int, asyncio.Future] = {}
+        self._ws: Optional[aiohttp.ClientWebSocketResponse] = None
+        self._unsubscribed: List[str] = []  # wallets created since the logs filters were made
+
+    def watch(self, address: str):
+        self._unsubscribed.append(address)
+
+    async def _request(self, method: str, params: List[Any]) -> Any:
+        request_id = next(self._ids)
+        future = self._pending[request_id] = asyncio.get_running_loop().create_future()
+        try:
+            await self._ws.send_str(json.dumps({'jsonrpc': '2.0', 'id': request_id, 'method': method, 'params': params}))
+            return await asyncio.wait_for(future, Config.RPC_TIMEOUT)
+        finally:
+            self._pending.pop(request_id, None)
+
+    async def _subscribe_logs(self, addresses: List[str]):
+        from wallets.evm_batch import transfer_filters
+        tokens = self.hub.token_contracts(self.currency)
+        if tokens and addresses:
+            for log_filter in transfer_filters(tokens, addresses, Config.FEED_FILTER_SIZE):
+                await self._request('eth_subscribe', ['logs', log_filter])
+
+    async def _subscribe_new(self):
+        # Logs filters for wallets created while connected, made on the next head
+        addresses, self._unsubscribed = self._unsubscribed, []
+        try:
+            await self._subscribe_logs(addresses)
+        except Exception as e:
+            print(f"Event feed subscribe error ({self.currency}): {e}")
+            self._unsubscribed += addresses
+
+    def _dispatch(self, message: Dict[str, Any]):
+        from wallets.evm_batch import log_transfer
+        if message.get('id') is not None:
+            future = self._pending.get(message['id'])
+            if future is not None and not future.done():
+                if message.get('error'):
+                    future.set_exception(ConnectionError(f"{message['error']}"))
+                else:
+                    future.set_result(message.get('result'))
+            return
+        if message.get('method') != 'eth_subscription':
+            return
+        # Told apart by shape, so events arriving before the subscribe reply are kept
+        result = message['params']['result']
+        if 'topics' in result:
+            transfer = log_transfer(result)
+            if transfer is not None:
+                FEED_EVENTS.inc(network=self.currency, kind='transfer')
+                self.hub.transfers(self.currency, [transfer])
+        elif 'number' in result:
+            number = int(result['number'], 16)
+            # The logs of a block may trail its header, so only the one before is complete
+            self.last_block = max(self.last_block or 0, number - 1)
+            self.head(number)
+            if self._unsubscribed:
+                asyncio.ensure_future(self._subscribe_new())
+
+    async def _read(self, ws: aiohttp.ClientWebSocketResponse):
+        try:
+            async for message in ws:
+                if message.type == aiohttp.WSMsgType.TEXT:
+                    self._dispatch(json.loads(message.data))
+                elif message.type == aiohttp.WSMsgType.ERROR:
+                    break
+        finally:
+            for future in self._pending.values():
+                if not future.done():
+                    future.set_exception(ConnectionError("WebSocket closed"))
+
+    async def session(self):
+        from wallets.transport import get_session
+        url = self.urls[self._url % len(self.urls)]
+        self._url += 1
+        session = await get_session()
+        async with session.ws_connect(url, heartbeat=Config.FEED_HEARTBEAT, max_msg_size=2 ** 24) as ws:
+            self._ws = ws
+            reader = asyncio.ensure_future(self._read(ws))
+            try:
+                await self._request('eth_subscribe', ['newHeads'])
+                self._unsubscribed = []
+                await self._subscribe_logs(self.hub.addresses(self.currency))
+                self.connected = True
+                head = await self.hub.engine.call(self.currency, 'get_block_number')
+                await self.backfill(head)
+                self.head(head)
+                await reader
+            finally:
+                reader.cancel()
+                self._ws = None
+
+    async def fetch_transfers(self, from_block: int, to_block: int) -> List[Dict[str, Any]]:
+        from wallets.evm_batch import transfer_filters
+        tokens = self.hub.token_contracts(self.currency)
+        addresses = self.hub.addresses(self.currency)
+        if not tokens or not addresses:
+            return []
+        filters = transfer_filters(tokens, addresses, Config.FEED_FILTER_SIZE)
+        return await self.hub.engine.call(self.currency, 'get_token_transfers', filters, from_block, to_block)
+
+class TronFeed(Feed):
+    # Tron nodes push nothing, so the head is polled once per block time, and the TRC-20
+    # transfers of every new block are read off the block itself - one request per block,
+    # shared with the deposit watcher's scan, instead of a balance poll per wallet. A gap
+    # after errors is caught up the same way
+    async def session(self):
+        block_time = getattr(self.hub.engine.wallets[self.currency], 'block_time', 3.0)
+        while True:
+            head = await self.hub.engine.call(self.currency, 'get_block_number')
+            self.connected = True
+            if self.last_block is None:
+                self.last_block = head
+            if head > self.last_block:
+                await self.backfill(head)
+                self.last_block = head
+                self.head(head)
+            await asyncio.sleep(block_time)
+
+    async def fetch_transfers(self, from_block: int, to_block: int) -> List[Dict[str, Any]]:
+        tokens = self.hub.token_contracts(self.currency)
+        if not tokens or not self.hub.addresses(self.currency):
+            return []
+        return await self.hub.engine.call(self.currency, 'get_token_transfers', tokens, from_block, to_block)
+
+class ChainFeeds:
+    # Pushed chain events for the networks in `networks`. Heads go to head_listeners (the
+    # deposit watcher scans right away, the tx tracker skips its head lookups); token
+    # transfers touching our wallets invalidate their cached balances and are reported to
+    # the watcher as token deposits. Networks without a feed keep polling as before
+    def __init__(self, balance_engine, watcher: DepositWatcher, tokens: TokenRegistry, networks: List[str]):
+        self.engine = balance_engine
+        self.watcher = watcher
+        self.tokens = tokens
+        self.feeds: Dict[str, Feed] = {}
+        for currency in networks:
+            if currency not in balance_engine.wallets:
+                continue
+            if currency in WS_URLS and getattr(Config, WS_URLS[currency]):
+                self.feeds[currency] = EVMFeed(self, currency, getattr(Config, WS_URLS[currency]))
+            elif currency == 'TRX':
+                self.feeds[currency] = TronFeed(self, currency)
+            else:
+                print(f"⚠️ No event feed for {currency}: its WebSocket endpoint is not set")
+        self.head_listeners: List[Callable[[str, int], None]] = [watcher.on_head]
+        self._tasks: List[asyncio.Task] = []
+        watcher.push_heads(list(self.feeds))
+        watcher.address_listeners.append(self.watch)
+
+    def addresses(self, currency: str) -> List[str]:
+        return [address for _, _, address in self.watcher.addresses.get(currency, {}).values()]
+
+    def token_contracts(self, currency: str) -> List[str]:
+        return list(self.tokens.tokens.get(currency, {}).values())
+
+    def watch(self, currency: str, address: str):
+        feed = self.feeds.get(currency)
+        if feed is not None:
+            feed.watch(address)
+
+    def head(self, currency: str, number: int):
+        for listener in self.head_listeners:
+            try:
+                listener(currency, number)
+            except Exception as e:
+                print(f"Head listener error ({currency}): {e}")
+
+    def transfers(self, currency: str, transfers: List[Dict[str, Any]]):
+        watched = self.watcher.addresses.get(currency, {})
+        touched = set()
+        for transfer in transfers:
+            for party in (transfer['from'], transfer['to']):
+                owner = watched.get(address_key(party))
+                if owner is not None:
+                    touched.add(owner[2])
+        for address in touched:
+            # Paying the fee moved the native balance too
+            self.engine.cache.invalidate(currency, address)
+            self.engine.cache.invalidate(f"{currency}:TOKENS", address)
+        if touched:
+            asyncio.ensure_future(self._deposits(currency, transfers))
+
+    async def _deposits(self, currency: str, transfers: List[Dict[str, Any]]):
+        try:
+            metadata = await self.tokens.get_metadata(currency)
+            symbols = {contract: symbol for symbol, contract in self.tokens.tokens.get(currency, {}).items()}
+            await self.watcher.token_deposits(currency, [
+                dict(transfer, amount=transfer['amount'] / 10 ** metadata[transfer['token']]['decimals'],
+                     token=symbols[transfer['token']])
+                for transfer in transfers
+                if transfer['token'] in metadata and not transfer.get('removed')
+            ])
+        except Exception as e:
+            print(f"Token deposit error ({currency}): {e}")
+
+    def start(self):
+        # After the watcher has loaded the addresses the feeds filter for
+        if not self._tasks:
+            self._tasks = [asyncio.ensure_future(feed.run()) for feed in self.feeds.values()]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        self._tasks = []
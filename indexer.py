@@ -0,0 +1,213 @@
+import asyncio
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+from config import Config
+from database import Storage
+
+def address_key(address: Optional[str]) -> Optional[str]:
+    # EVM addresses are case-insensitive (checksum casing varies), everything else is exact
+    if address and address.startswith('0x'):
+        return address.lower()
+    return address
+
+class DepositWatcher:
+    def __init__(self, db: Storage, balance_engine, networks: List[str],
+                 poll_interval: float = 15.0, max_blocks: int = 20,
+                 min_confirmations: Optional[int] = None):
+        self.db = db
+        self.engine = balance_engine
+        self.networks = networks
+        self.poll_interval = poll_interval
+        self.max_blocks = max_blocks
+        self.min_confirmations = min_confirmations or Config.MIN_CONFIRMATIONS
+        # currency -> {address key: (user_id, network name, address)}; a block is matched
+        # with one hash lookup per transfer, independent of how many wallets exist
+        self.addresses: Dict[str, Dict[str, Tuple[int, str, str]]] = {}
+        self.listeners: List[Callable[[str, Dict[str, Any]], Awaitable[None]]] = []
+        self.address_listeners: List[Callable[[str, str], None]] = []
+        self.heads: Dict[str, int] = {}
+        # Networks whose heads are pushed (feeds.py): scans start when a head arrives,
+        # polling only fills in if pushes stop for poll_interval
+        self._wakeups: Dict[str, asyncio.Event] = {}
+        self._notified: "OrderedDict[Tuple[str, str, str], None]" = OrderedDict()
+        self._tasks: List[asyncio.Task] = []
+
+    async def load_addresses(self):
+        addresses: Dict[str, Dict[str, Tuple[int, str, str]]] = {}
+        for currency, network, address, user_id in await self.db.get_all_wallet_addresses():
+            addresses.setdefault(currency, {})[address_key(address)] = (user_id, network, address)
+        self.addresses = addresses
+
+    def watch_address(self, currency: str, network: str, address: str, user_id: int):
+        self.addresses.setdefault(currency, {})[address_key(address)] = (user_id, network, address)
+        for listener in self.address_listeners:
+            listener(currency, address)
+
+    def on_head(self, currency: str, head: int):
+        self.heads[currency] = head
+        if currency in self._wakeups:
+            self._wakeups[currency].set()
+
+    def match(self, currency: str, transfers: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        watched = self.addresses.get(currency, {})
+        deposits: Dict[Tuple[str, str], Dict[str, Any]] = {}
+        for transfer in transfers:
+            owner = watched.get(address_key(transfer['to']))
+            if owner is None:
+                continue
+            user_id, network, address = owner
+            key = (transfer['tx_hash'], address, transfer.get('token'))
+            if key in deposits:
+                # Several outputs to the same address in one transaction
+                deposits[key]['amount'] += float(transfer['amount'])
+                continue
+            deposits[key] = {
+                'user_id': user_id,
+                'tx_hash': transfer['tx_hash'],
+                'from_address': transfer['from'],
+                'to_address': address,
+                'amount': float(transfer['amount']),
+                'network': network,
+                'status': 'pending',
+                'confirmations': 1
+            }
+            if transfer.get('token'):
+                deposits[key]['token'] = transfer['token']
+        return list(deposits.values())
+
+    async def succeeded(self, currency: str, transfers: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        # The transfers of a block that weren't reverted. Only backends whose transactions
+        # can fail after being mined (EVM: a call with value into a contract) say which did,
+        # and only the transfers touching our wallets are looked up
+        if not hasattr(self.engine.wallets.get(currency), 'get_receipt_statuses'):
+            return transfers
+        watched = self.addresses.get(currency, {})
+        ours = list(dict.fromkeys(
+            transfer['tx_hash'] for transfer in transfers
+            if address_key(transfer['to']) in watched or address_key(transfer['from']) in watched
+        ))
+        if not ours:
+            return transfers
+        statuses = await self.engine.call(currency, 'get_receipt_statuses', ours)
+        return [transfer for transfer in transfers if statuses.get(transfer['tx_hash'], 1) != 0]
+
+    def balance_deltas(self, currency: str, transfers: List[Dict[str, Any]]) -> Dict[str, float]:
+        # Net native-coin movement per watched address in a block, for the balance ledger.
+        # Only top-level value transfers are visible here: fees, and value moved by contract
+        # code (internal transfers, e.g. a withdrawal paid out by a contract), are drift the
+        # ledger reconciler corrects
+        watched = self.addresses.get(currency, {})
+        deltas: Dict[str, float] = {}
+        for transfer in transfers:
+            amount = float(transfer['amount'])
+            receiver = watched.get(address_key(transfer['to']))
+            if receiver is not None:
+                deltas[receiver[2]] = deltas.get(receiver[2], 0.0) + amount
+            sender = watched.get(address_key(transfer['from']))
+            if sender is not None:
+                deltas[sender[2]] = deltas.get(sender[2], 0.0) - amount
+        return deltas
+
+    async def _scan(self, currency: str, checkpoint: int, head: int) -> int:
+        numbers = list(range(checkpoint + 1, min(head, checkpoint + self.max_blocks) + 1))
+        if not numbers:
+            return checkpoint
+        blocks = await self.engine.call(currency, 'get_block_transfers', numbers)
+        for number in numbers:
+            blocks[number] = await self.succeeded(currency, blocks[number])
+            deposits = self.match(currency, blocks[number])
+            for deposit in deposits:
+                deposit['confirmations'] = head - number + 1
+                if deposit['confirmations'] >= self.min_confirmations:
+                    deposit['status'] = 'confirmed'
+            deltas = self.balance_deltas(currency, blocks[number])
+            for address in deltas:
+                self.engine.cache.invalidate(currency, address)
+            await self.db.record_block(currency, number, deposits, deltas)
+            for deposit in deposits:
+                await self._notify(currency, dict(deposit, block_number=number))
+            checkpoint = number
+        return checkpoint
+
+    async def _update_confirmations(self, currency: str, head: int):
+        updates = []
+        for tx_hash, to_address, block_number, confirmations in await self.db.get_pending_deposits(currency):
+            current = min(head - block_number + 1, self.min_confirmations)
+            if current != confirmations:
+                status = 'confirmed' if current >= self.min_confirmations else 'pending'
+                updates.append((current, status, tx_hash, to_address))
+        if updates:
+            await self.db.update_confirmations(updates)
+
+    async def token_deposits(self, currency: str, transfers: List[Dict[str, Any]]):
+        # Token transfers pushed by a chain feed, amounts already in token units. Reported
+        # to the listeners as they are seen, not stored: transactions rows hold native
+        # amounts. A feed may deliver a transfer twice (backfill overlaps), so recently
+        # reported ones are skipped
+        for deposit in self.match(currency, transfers):
+            key = (deposit['tx_hash'], deposit['to_address'], deposit['token'])
+            if key in self._notified:
+                continue
+            self._notified[key] = None
+            while len(self._notified) > 10000:
+                self._notified.popitem(last=False)
+            block_number = next(
+                (t.get('block_number') for t in transfers if t['tx_hash'] == deposit['tx_hash']), None
+            )
+            await self._notify(currency, dict(deposit, block_number=block_number))
+
+    async def _notify(self, currency: str, deposit: Dict[str, Any]):
+        for listener in self.listeners:
+            try:
+                await listener(currency, deposit)
+            except Exception as e:
+                print(f"Deposit listener error: {e}")
+
+    async def follow(self, currency: str):
+        checkpoint = await self.db.get_checkpoint(currency)
+        wakeup = self._wakeups.get(currency)
+        pushed = False
+        while True:
+            try:
+                if wakeup is not None:
+                    wakeup.clear()
+                if pushed:
+                    head = self.heads[currency]
+                else:
+                    head = await self.engine.call(currency, 'get_block_number')
+                    self.heads[currency] = head
+                if checkpoint is None:
+                    # First run on this chain: start from the current head, not genesis
+                    checkpoint = head - 1
+                while checkpoint < head:
+                    checkpoint = await self._scan(currency, checkpoint, head)
+                await self._update_confirmations(currency, head)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Deposit watcher error ({currency}): {e}")
+            if wakeup is None:
+                await asyncio.sleep(self.poll_interval)
+                continue
+            try:
+                await asyncio.wait_for(wakeup.wait(), self.poll_interval)
+                pushed = True
+            except asyncio.TimeoutError:
+                pushed = False
+
+    def push_heads(self, networks: List[str]):
+        # Networks a chain feed pushes heads for; set before start()
+        for currency in networks:
+            self._wakeups[currency] = asyncio.Event()
+
+    async def start(self):
+        await self.load_addresses()
+        for currency in self.networks:
+            backend = self.engine.wallets.get(currency)
+            if backend is not None and hasattr(backend, 'get_block_transfers'):
+                self._tasks.append(asyncio.ensure_future(self.follow(currency)))
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        self._tasks = []
@@ -0,0 +1,357 @@
+import asyncio
+import itertools
+import json
+import sqlite3
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+from database import PRAGMAS
+
+# A job is {'id', 'kind', 'payload'}; payloads and results are plain JSON-serializable dicts.
+# The bot front-end awaits call(); worker processes loop over next_jobs() and complete()
+
+class JobError(Exception):
+    # The job ran in a worker and raised; carries the worker's error message
+    pass
+
+class MemoryJobQueue:
+    # In-process stand-in with the same contract, for running everything in one process
+    # and for exercising the front-end and workers without a broker
+    def __init__(self, ttl: float = 30.0):
+        self.ttl = ttl
+        self._jobs: asyncio.Queue = asyncio.Queue()
+        self._results: Dict[int, asyncio.Future] = {}
+        self._ids = itertools.count(1)
+
+    async def call(self, kind: str, payload: Dict[str, Any], timeout: Optional[float] = None) -> Dict[str, Any]:
+        job_id = next(self._ids)
+        future = asyncio.get_running_loop().create_future()
+        self._results[job_id] = future
+        try:
+            await self._jobs.put({'id': job_id, 'kind': kind, 'payload': payload})
+            return await asyncio.wait_for(future, timeout or self.ttl)
+        finally:
+            self._results.pop(job_id, None)
+
+    async def next_jobs(self, max_jobs: int = 1, timeout: float = 1.0) -> List[Dict[str, Any]]:
+        try:
+            jobs = [await asyncio.wait_for(self._jobs.get(), timeout)]
+        except asyncio.TimeoutError:
+            return []
+        while len(jobs) < max_jobs and not self._jobs.empty():
+            jobs.append(self._jobs.get_nowait())
+        # Callers that already gave up don't need their job run
+        return [job for job in jobs if job['id'] in self._results]
+
+    async def complete(self, job: Dict[str, Any], result: Optional[Dict[str, Any]] = None,
+                       error: Optional[str] = None):
+        future = self._results.get(job['id'])
+        if future is None or future.done():
+            return
+        if error is not None:
+            future.set_exception(JobError(error))
+        else:
+            future.set_result(result)
+
+    async def start(self):
+        pass
+
+    async def close(self):
+        pass
+
+class SQLiteJobQueue:
+    # Job table in a local SQLite file (WAL) shared by the front-end and the workers on
+    # one host. Workers claim batches of queued rows in a write transaction and renew the
+    # claims of the jobs they are running every third of visibility_timeout; a job whose
+    # worker died stops being renewed and is handed out again after visibility_timeout
+    # (two thirds of ttl by default), which has to be shorter than ttl to leave its caller
+    # time to get the answer. A result is only stored by the worker holding the current
+    # claim. The front-end polls for finished rows of the jobs it is waiting on and deletes
+    # them once read. Rows older than ttl belong to callers that have given up and are
+    # never run
+    def __init__(self, path: str, ttl: float = 30.0, poll_interval: float = 0.05,
+                 visibility_timeout: Optional[float] = None):
+        if visibility_timeout is None:
+            visibility_timeout = ttl * 2 / 3
+        if not 0 < visibility_timeout < ttl:
+            raise ValueError(f"visibility_timeout ({visibility_timeout}s) must be between 0 and the job ttl ({ttl}s)")
+        self.path = path
+        self.ttl = ttl
+        self.poll_interval = poll_interval
+        self.visibility_timeout = visibility_timeout
+        self.conn: Optional[sqlite3.Connection] = None
+        # One thread owns the connection, so statements never interleave
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='jobqueue')
+        self._results: Dict[int, asyncio.Future] = {}
+        self._poller: Optional[asyncio.Task] = None
+        # job id -> claimed_at of the claims this process holds; only touched on the
+        # connection's thread
+        self._leases: Dict[int, float] = {}
+        self._renewer: Optional[asyncio.Task] = None
+
+    async def _run(self, func, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, func, *args)
+
+    def _connect(self):
+        self.conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        for pragma in PRAGMAS:
+            self.conn.execute(pragma)
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                kind TEXT NOT NULL,
+                payload TEXT NOT NULL,
+                status TEXT NOT NULL DEFAULT 'queued',
+                result TEXT,
+                claimed_at REAL,
+                created_at REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs (status, id);
+        """)
+
+    def _enqueue(self, kind: str, payload: Dict[str, Any]) -> int:
+        return self.conn.execute(
+            "INSERT INTO jobs (kind, payload, created_at) VALUES (?, ?, ?)",
+            (kind, json.dumps(payload), time.time())
+        ).lastrowid
+
+    def _claim(self, max_jobs: int) -> List[Dict[str, Any]]:
+        now = time.time()
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            self.conn.execute(
+                "UPDATE jobs SET status = 'queued' WHERE status = 'running' AND claimed_at < ?",
+                (now - self.visibility_timeout,)
+            )
+            rows = self.conn.execute("""
+                SELECT id, kind, payload FROM jobs
+                WHERE status = 'queued' AND created_at >= ?
+                ORDER BY id LIMIT ?
+            """, (now - self.ttl, max_jobs)).fetchall()
+            self.conn.executemany(
+                "UPDATE jobs SET status = 'running', claimed_at = ? WHERE id = ?",
+                [(now, job_id) for job_id, _, _ in rows]
+            )
+            self.conn.execute("COMMIT")
+        except Exception:
+            self.conn.execute("ROLLBACK")
+            raise
+        for job_id, _, _ in rows:
+            self._leases[job_id] = now
+        return [{'id': job_id, 'kind': kind, 'payload': json.loads(payload)} for job_id, kind, payload in rows]
+
+    def _renew(self):
+        # Extends every claim still ours; a job requeued or discarded meanwhile is let go
+        if not self._leases:
+            return
+        now = time.time()
+        renewed = {}
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            for job_id, claimed_at in self._leases.items():
+                if self.conn.execute(
+                    "UPDATE jobs SET claimed_at = ? WHERE id = ? AND status = 'running' AND claimed_at = ?",
+                    (now, job_id, claimed_at)
+                ).rowcount:
+                    renewed[job_id] = now
+            self.conn.execute("COMMIT")
+        except Exception:
+            self.conn.execute("ROLLBACK")
+            raise
+        self._leases = renewed
+
+    def _finish(self, job_id: int, status: str, result: str):
+        # Dropped if the claim was lost: the job was handed to another worker
+        claimed_at = self._leases.pop(job_id, None)
+        if claimed_at is None:
+            return
+        self.conn.execute(
+            "UPDATE jobs SET status = ?, result = ? WHERE id = ? AND status = 'running' AND claimed_at = ?",
+            (status, result, job_id, claimed_at)
+        )
+
+    def _collect(self, job_ids: List[int]) -> List[tuple]:
+        # Finished rows among job_ids, deleted as they are read, plus abandoned rows
+        finished = []
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            for i in range(0, len(job_ids), 500):
+                chunk = job_ids[i:i + 500]
+                marks = ','.join('?' * len(chunk))
+                rows = self.conn.execute(
+                    f"SELECT id, status, result FROM jobs WHERE id IN ({marks}) AND status IN ('done', 'failed')",
+                    chunk
+                ).fetchall()
+                self.conn.executemany("DELETE FROM jobs WHERE id = ?", [(row[0],) for row in rows])
+                finished += rows
+            self.conn.execute("DELETE FROM jobs WHERE created_at < ?", (time.time() - 2 * self.ttl,))
+            self.conn.execute("COMMIT")
+        except Exception:
+            self.conn.execute("ROLLBACK")
+            raise
+        return finished
+
+    def _discard(self, job_id: int):
+        self.conn.execute("DELETE FROM jobs WHERE id = ?", (job_id,))
+
+    async def start(self):
+        if self.conn is None:
+            await self._run(self._connect)
+
+    async def call(self, kind: str, payload: Dict[str, Any], timeout: Optional[float] = None) -> Dict[str, Any]:
+        job_id = await self._run(self._enqueue, kind, payload)
+        future = asyncio.get_running_loop().create_future()
+        self._results[job_id] = future
+        if self._poller is None:
+            self._poller = asyncio.ensure_future(self._poll())
+        try:
+            return await asyncio.wait_for(future, timeout or self.ttl)
+        except asyncio.TimeoutError:
+            await self._run(self._discard, job_id)
+            raise
+        finally:
+            self._results.pop(job_id, None)
+
+    async def _poll(self):
+        # One poller serves every waiting call, one query per interval however many wait
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            if not self._results:
+                continue
+            try:
+                finished = await self._run(self._collect, list(self._results))
+            except Exception as e:
+                print(f"Job queue poll error: {e}")
+                continue
+            for job_id, status, result in finished:
+                future = self._results.get(job_id)
+                if future is None or future.done():
+                    continue
+                if status == 'failed':
+                    future.set_exception(JobError(result))
+                else:
+                    future.set_result(json.loads(result))
+
+    async def _renew_loop(self):
+        while True:
+            await asyncio.sleep(self.visibility_timeout / 3)
+            try:
+                await self._run(self._renew)
+            except Exception as e:
+                print(f"Job queue lease error: {e}")
+
+    async def next_jobs(self, max_jobs: int = 1, timeout: float = 1.0) -> List[Dict[str, Any]]:
+        if self._renewer is None:
+            self._renewer = asyncio.ensure_future(self._renew_loop())
+        deadline = time.monotonic() + timeout
+        while True:
+            jobs = await self._run(self._claim, max_jobs)
+            if jobs or time.monotonic() >= deadline:
+                return jobs
+            await asyncio.sleep(self.poll_interval)
+
+    async def complete(self, job: Dict[str, Any], result: Optional[Dict[str, Any]] = None,
+                       error: Optional[str] = None):
+        if error is not None:
+            await self._run(self._finish, job['id'], 'failed', error)
+        else:
+            await self._run(self._finish, job['id'], 'done', json.dumps(result))
+
+    async def close(self):
+        for task in (self._poller, self._renewer):
+            if task is not None:
+                task.cancel()
+        self._poller = self._renewer = None
+        if self.conn is not None:
+            await self._run(self.conn.close)
+            self.conn = None
+        self._executor.shutdown(wait=False)
+
+class RedisJobQueue:
+    # Jobs on a Redis list (LPUSH / BRPOP), results pushed to a reply list per front-end
+    # and read by a single BLOCKing poller. Works across hosts. Delivery is at-most-once:
+    # a job popped by a worker that then dies is lost and its caller times out
+    def __init__(self, url: str, ttl: float = 30.0, prefix: str = 'walletbot:'):
+        import redis.asyncio as redis
+        self.redis = redis.from_url(url)
+        self.ttl = ttl
+        self.jobs_key = prefix + 'jobs'
+        self.reply_key = f"{prefix}results:{uuid.uuid4().hex}"
+        self._results: Dict[str, asyncio.Future] = {}
+        self._poller: Optional[asyncio.Task] = None
+
+    async def start(self):
+        pass
+
+    async def call(self, kind: str, payload: Dict[str, Any], timeout: Optional[float] = None) -> Dict[str, Any]:
+        job_id = uuid.uuid4().hex
+        future = asyncio.get_running_loop().create_future()
+        self._results[job_id] = future
+        if self._poller is None:
+            self._poller = asyncio.ensure_future(self._poll())
+        try:
+            await self.redis.lpush(self.jobs_key, json.dumps({
+                'id': job_id, 'kind': kind, 'payload': payload,
+                'reply_to': self.reply_key, 'expires': time.time() + (timeout or self.ttl)
+            }))
+            return await asyncio.wait_for(future, timeout or self.ttl)
+        finally:
+            self._results.pop(job_id, None)
+
+    async def _poll(self):
+        while True:
+            try:
+                item = await self.redis.blpop([self.reply_key], timeout=1)
+            except Exception as e:
+                print(f"Job queue poll error: {e}")
+                await asyncio.sleep(1)
+                continue
+            if item is None:
+                continue
+            reply = json.loads(item[1])
+            future = self._results.get(reply['id'])
+            if future is None or future.done():
+                continue
+            if reply.get('error') is not None:
+                future.set_exception(JobError(reply['error']))
+            else:
+                future.set_result(reply['result'])
+
+    async def next_jobs(self, max_jobs: int = 1, timeout: float = 1.0) -> List[Dict[str, Any]]:
+        item = await self.redis.brpop([self.jobs_key], timeout=max(1, int(timeout)))
+        if item is None:
+            return []
+        items = [item[1]]
+        if max_jobs > 1:
+            items += await self.redis.rpop(self.jobs_key, max_jobs - 1) or []
+        now = time.time()
+        jobs = [json.loads(raw) for raw in items]
+        return [job for job in jobs if job['expires'] > now]
+
+    async def complete(self, job: Dict[str, Any], result: Optional[Dict[str, Any]] = None,
+                       error: Optional[str] = None):
+        async with self.redis.pipeline(transaction=False) as pipe:
+            pipe.rpush(job['reply_to'], json.dumps({'id': job['id'], 'result': result, 'error': error}))
+            pipe.expire(job['reply_to'], int(self.ttl) + 1)
+            await pipe.execute()
+
+    async def close(self):
+        if self._poller is not None:
+            self._poller.cancel()
+            self._poller = None
+        await self.redis.close()
+
+def open_job_queue(url: str, ttl: float = 30.0, poll_interval: float = 0.05,
+                   visibility_timeout: Optional[float] = None):
+    # memory://, sqlite:///path/to/jobs.db or redis://host:6379/0
+    if url.startswith('memory://'):
+        return MemoryJobQueue(ttl)
+    if url.startswith('sqlite:///'):
+        return SQLiteJobQueue(
+            url[len('sqlite:///'):], ttl=ttl, poll_interval=poll_interval, visibility_timeout=visibility_timeout
+        )
+    if url.startswith(('redis://', 'rediss://')):
+        return RedisJobQueue(url, ttl=ttl)
+    raise ValueError(f"Unsupported JOB_QUEUE_URL: {url}")
@@ -0,0 +1,90 @@
+import asyncio
+from typing import Dict, List, Optional, Tuple
+from database import Storage
+
+class BalanceLedger:
+    # Balances materialized in the database and kept current by the deposit watcher's
+    # per-block deltas; a background reconciler spot-checks entries against live RPC and
+    # corrects what the deltas can't see: transaction fees, and value moved by contract
+    # code (internal transfers)
+    def __init__(self, db: Storage, balance_engine, watcher, interval: float = 60.0,
+                 batch_size: int = 100, tolerance: float = 1e-9):
+        self.db = db
+        self.engine = balance_engine
+        self.watcher = watcher
+        self.interval = interval
+        self.batch_size = batch_size
+        self.tolerance = tolerance
+        self.drift_corrections = 0
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def networks(self) -> List[str]:
+        return self.watcher.networks
+
+    async def get_user_balances(self, user_id: int) -> Dict[Tuple[str, str], Tuple[float, int]]:
+        # (currency, address) -> (balance, last synced block); only networks the watcher follows
+        return {
+            (currency, address): (balance, as_of_block)
+            for currency, address, balance, as_of_block in await self.db.get_user_ledger(user_id)
+            if currency in self.networks
+        }
+
+    async def read_balances(self, currency: str, addresses: List[str],
+                            attempts: int = 3) -> Tuple[Dict[str, float], Optional[int]]:
+        # Live balances and the block they are exact at. Entries are stamped with that block
+        # and the watcher applies only later blocks' deltas, so it must be exact: stamping an
+        # earlier block counts a transfer twice, a later one drops it. Backends that can read
+        # at a block are pinned to the head; elsewhere a read only counts if the head didn't
+        # move during it, and leaves out mempool funds where the backend can (the watcher
+        # applies them once mined). (balances, None) when no attempt managed that
+        backend = self.engine.wallets.get(currency)
+        if hasattr(backend, 'get_balances_at'):
+            head = await self.engine.call(currency, 'get_block_number')
+            return await self.engine.fetch_network_balances(currency, addresses, head), head
+        confirmed = hasattr(backend, 'get_confirmed_balances')
+        live: Dict[str, float] = {}
+        for _ in range(attempts):
+            head = await self.engine.call(currency, 'get_block_number')
+            live = await self.engine.fetch_network_balances(currency, addresses, confirmed=confirmed)
+            if await self.engine.call(currency, 'get_block_number') == head:
+                return live, head
+        return live, None
+
+    async def reconcile(self, currency: str):
+        batch = await self.db.get_reconcile_batch(currency, self.batch_size)
+        if not batch:
+            return
+        live, head = await self.read_balances(currency, [address for address, _ in batch])
+        if head is None:
+            print(f"Ledger reconcile skipped ({currency}): the head kept moving during reads")
+            return
+
+        entries = []
+        for address, previous in batch:
+            balance = live.get(address)
+            if balance is None:
+                continue
+            if previous is not None and abs(float(previous) - float(balance)) > self.tolerance:
+                self.drift_corrections += 1
+                print(f"Ledger drift corrected ({currency} {address}): {previous} -> {balance}")
+            entries.append((address, float(balance), head))
+        await self.db.set_ledger_balances(currency, entries)
+
+    async def _reconcile_loop(self):
+        while True:
+            for currency in self.networks:
+                try:
+                    await self.reconcile(currency)
+                except Exception as e:
+                    print(f"Ledger reconcile error ({currency}): {e}")
+            await asyncio.sleep(self.interval)
+
+    def start(self):
+        if self.networks and self._task is None:
+            self._task = asyncio.ensure_future(self._reconcile_loop())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
@@ -0,0 +1,389 @@
+import asyncio
+import bisect
+import functools
+import sys
+import threading
+import time
+from collections import Counter as Tally
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+# Prometheus text exposition (format 0.0.4) without a client library dependency.
+# Metrics are plain in-process aggregates; /metrics renders them on request
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+def _escape(value: Any) -> str:
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+def _labels(names: Sequence[str], values: Sequence[Any], extra: str = '') -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+def _number(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+class Metric:
+    kind = 'untyped'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        # Updated from the event loop and from executor threads (DB, RPC)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, Any]) -> Tuple:
+        return tuple(labels.get(name, '') for name in self.labelnames)
+
+    def samples(self) -> Iterable[Tuple[str, str, float]]:
+        return ()
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        lines += [f"{self.name}{suffix}{labels} {_number(value)}" for suffix, labels, value in self.samples()]
+        return lines
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def samples(self):
+        with self._lock:
+            values = list(self._values.items())
+        return [('', _labels(self.labelnames, key), value) for key, value in values]
+
+class Gauge(Metric):
+    kind = 'gauge'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple, float] = {}
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def samples(self):
+        with self._lock:
+            values = list(self._values.items())
+        return [('', _labels(self.labelnames, key), value) for key, value in values]
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series: Dict[Tuple, List[float]] = {}  # key -> per-bucket counts + [+Inf count, sum]
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0.0] * (len(self.buckets) + 2)
+            series[index] += 1
+            series[-1] += value
+
+    @contextmanager
+    def time(self, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def samples(self):
+        with self._lock:
+            series = [(key, list(counts)) for key, counts in self._series.items()]
+        samples = []
+        for key, counts in series:
+            cumulative = 0.0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                samples.append(('_bucket', _labels(self.labelnames, key, f'le="{_number(bound)}"'), cumulative))
+            samples.append(('_sum', _labels(self.labelnames, key), counts[-1]))
+            samples.append(('_count', _labels(self.labelnames, key), cumulative))
+        return samples
+
+class Registry:
+    def __init__(self):
+        self.metrics: List[Metric] = []
+        # Collectors refresh gauges from live state (cache stats, routers) at scrape time
+        self.collectors: List[Callable[[], None]] = []
+
+    def register(self, metric: Metric) -> Metric:
+        self.metrics.append(metric)
+        return metric
+
+    def add_collector(self, collector: Callable[[], None]):
+        self.collectors.append(collector)
+
+    def render(self) -> str:
+        for collector in self.collectors:
+            try:
+                collector()
+            except Exception as e:
+                print(f"Metrics collector error: {e}")
+        lines = []
+        for metric in self.metrics:
+            lines += metric.render()
+        return '\n'.join(lines) + '\n'
+
+REGISTRY = Registry()
+
+HANDLER_SECONDS = REGISTRY.register(Histogram(
+    'walletbot_handler_seconds', 'Telegram handler latency', ['handler']))
+HANDLER_ERRORS = REGISTRY.register(Counter(
+    'walletbot_handler_errors_total', 'Telegram handlers that raised', ['handler']))
+RATE_LIMITED = REGISTRY.register(Counter(
+    'walletbot_rate_limited_total', 'Commands rejected by the per-user rate limiter', ['command']))
+JOB_SECONDS = REGISTRY.register(Histogram(
+    'walletbot_job_seconds', 'Wallet service job latency (balance, create, tx)', ['kind']))
+JOB_ERRORS = REGISTRY.register(Counter(
+    'walletbot_job_errors_total', 'Wallet service jobs that raised', ['kind']))
+RPC_SECONDS = REGISTRY.register(Histogram(
+    'walletbot_rpc_seconds', 'Chain backend call latency', ['network', 'method']))
+RPC_ERRORS = REGISTRY.register(Counter(
+    'walletbot_rpc_errors_total', 'Chain backend calls that raised', ['network', 'method']))
+DB_QUERY_SECONDS = REGISTRY.register(Histogram(
+    'walletbot_db_query_seconds', 'Storage call latency including pool wait', ['method']))
+CACHE_LOOKUPS = REGISTRY.register(Gauge(
+    'walletbot_cache_lookups', 'Balance cache lookups since start by result', ['result']))
+CACHE_ENTRIES = REGISTRY.register(Gauge(
+    'walletbot_cache_entries', 'Balance cache entries'))
+CACHE_HIT_RATE = REGISTRY.register(Gauge(
+    'walletbot_cache_hit_ratio', 'Balance cache hits (including coalesced) per lookup'))
+ENDPOINT_LATENCY = REGISTRY.register(Gauge(
+    'walletbot_rpc_endpoint_latency_seconds', 'EWMA latency per RPC endpoint', ['host']))
+ENDPOINT_ERROR_RATE = REGISTRY.register(Gauge(
+    'walletbot_rpc_endpoint_error_ratio', 'EWMA error rate per RPC endpoint', ['host']))
+ENDPOINT_OPEN = REGISTRY.register(Gauge(
+    'walletbot_rpc_endpoint_circuit_open', '1 while the endpoint circuit breaker is open', ['host']))
+SCHEDULER_WAITING = REGISTRY.register(Gauge(
+    'walletbot_rpc_scheduler_waiting', 'Calls queued for an RPC slot', ['host']))
+SCHEDULER_LIMIT = REGISTRY.register(Gauge(
+    'walletbot_rpc_scheduler_limit', 'Current concurrency limit per upstream (AIMD)', ['host']))
+FEED_EVENTS = REGISTRY.register(Counter(
+    'walletbot_feed_events_total', 'Pushed chain events by kind (head, transfer, backfill)', ['network', 'kind']))
+FEED_RECONNECTS = REGISTRY.register(Counter(
+    'walletbot_feed_reconnects_total', 'Chain event feed connections lost or failed', ['network']))
+LOOP_LAG = REGISTRY.register(Histogram(
+    'walletbot_event_loop_lag_seconds', 'How late the event loop woke a sleeping task',
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 5.0)))
+RSS_BYTES = REGISTRY.register(Gauge(
+    'walletbot_process_resident_memory_bytes', 'Resident set size'))
+
+def instrument(cls, methods: Iterable[str], histogram: Histogram):
+    # Wraps the named coroutine methods of cls to time every call, labelled by method
+    for name in methods:
+        method = getattr(cls, name)
+
+        def wrap(method, name):
+            @functools.wraps(method)
+            async def timed(*args, **kwargs):
+                with histogram.time(method=name):
+                    return await method(*args, **kwargs)
+            return timed
+        setattr(cls, name, wrap(method, name))
+
+def watch_cache(cache):
+    # Collector for a BalanceCache
+    def collect():
+        stats = cache.stats()
+        for result in ('hits', 'misses', 'coalesced', 'evictions'):
+            CACHE_LOOKUPS.set(stats[result], result=result)
+        CACHE_ENTRIES.set(stats['entries'])
+        CACHE_HIT_RATE.set(stats['hit_rate'])
+    REGISTRY.add_collector(collect)
+
+def collect_routers():
+    # Routers exist once some backend made a call; hosts only, URLs may carry API keys
+    router_module = sys.modules.get('wallets.router')
+    if router_module is None:
+        return
+    for router in list(router_module._routers.values()):
+        for endpoint in router.stats():
+            host = urlsplit(endpoint['url']).hostname or endpoint['url']
+            ENDPOINT_LATENCY.set(endpoint['latency'], host=host)
+            ENDPOINT_ERROR_RATE.set(endpoint['error_rate'], host=host)
+            ENDPOINT_OPEN.set(1 if endpoint['open'] else 0, host=host)
+            scheduler = endpoint['scheduler']
+            if scheduler is not None:
+                SCHEDULER_WAITING.set(scheduler['waiting'], host=host)
+                SCHEDULER_LIMIT.set(scheduler['limit'], host=host)
+
+def collect_process():
+    from wallets.registry import rss_mb
+    RSS_BYTES.set(rss_mb() * 1048576)
+
+REGISTRY.add_collector(collect_routers)
+REGISTRY.add_collector(collect_process)
+
+class SamplingProfiler:
+    # Statistical profiler for a live process: a background thread samples every thread's
+    # Python stack each `interval` seconds while running. Output is collapsed stacks
+    # ("frame;frame;frame count"), the input format of flamegraph.pl and speedscope
+    def __init__(self, interval: float = 0.005, max_stacks: int = 20000):
+        self.interval = interval
+        self.max_stacks = max_stacks
+        self.stacks: Tally = Tally()
+        self.samples = 0
+        self.started_at: Optional[float] = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None
+
+    def _sample(self):
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        own = threading.get_ident()
+        for ident, frame in sys._current_frames().items():
+            if ident == own:
+                continue
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({code.co_filename.rsplit('/', 1)[-1]}:{frame.f_lineno})")
+                frame = frame.f_back
+            stack.append(names.get(ident, str(ident)))
+            key = ';'.join(reversed(stack))
+            if key not in self.stacks and len(self.stacks) >= self.max_stacks:
+                key = names.get(ident, str(ident)) + ';[other]'
+            self.stacks[key] += 1
+        self.samples += 1
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self._sample()
+
+    def start(self, interval: Optional[float] = None):
+        if self.running:
+            return
+        self.interval = interval or self.interval
+        self.stacks.clear()
+        self.samples = 0
+        self.started_at = time.time()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='profiler', daemon=True)
+        self._thread.start()
+
+    def stop(self) -> str:
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+        return self.report()
+
+    def report(self) -> str:
+        return ''.join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+class LoopMonitor:
+    # Event-loop lag: a task sleeps `interval` and records how late it was woken. Lag
+    # means something ran on the loop without yielding (blocking I/O, heavy CPU)
+    def __init__(self, interval: float = 0.25):
+        self.interval = interval
+        self._task: Optional[asyncio.Task] = None
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            started = loop.time()
+            await asyncio.sleep(self.interval)
+            LOOP_LAG.observe(max(loop.time() - started - self.interval, 0.0))
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.ensure_future(self.run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+class MetricsServer:
+    # Minimal local HTTP endpoint:
+    #   GET /metrics                       Prometheus text format
+    #   GET /profile/start[?interval=0.01] start the sampling profiler
+    #   GET /profile/stop                  stop it and return the collapsed stacks
+    #   GET /profile                       stacks collected so far, profiler keeps running
+    def __init__(self, host: str = '127.0.0.1', port: int = 9464, registry: Registry = REGISTRY,
+                 profiler: Optional[SamplingProfiler] = None):
+        self.host = host
+        self.port = port
+        self.registry = registry
+        self.profiler = profiler or SamplingProfiler()
+        self.monitor = LoopMonitor()
+        self._server: Optional[asyncio.AbstractServer] = None
+
+    def route(self, path: str, query: Dict[str, List[str]]) -> Tuple[str, str]:
+        if path == '/metrics':
+            return '200 OK', self.registry.render()
+        if path == '/profile/start':
+            interval = float(query['interval'][0]) if 'interval' in query else None
+            self.profiler.start(interval)
+            return '200 OK', f"profiling every {self.profiler.interval}s\n"
+        if path == '/profile/stop':
+            return '200 OK', self.profiler.stop()
+        if path == '/profile':
+            return '200 OK', self.profiler.report()
+        return '404 Not Found', 'not found\n'
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            request = await asyncio.wait_for(reader.readline(), 5)
+            while (await asyncio.wait_for(reader.readline(), 5)) not in (b'\r\n', b'\n', b''):
+                pass  # headers are not used
+            parts = request.decode('latin-1').split()
+            if len(parts) < 2:
+                return
+            url = urlsplit(parts[1])
+            try:
+                status, body = self.route(url.path, parse_qs(url.query))
+            except Exception as e:
+                status, body = '500 Internal Server Error', f"{e}\n"
+            payload = body.encode()
+            writer.write(
+                f"HTTP/1.1 {status}\r\n"
+                f"Content-Type: text/plain; version=0.0.4; charset=utf-8\r\n"
+                f"Content-Length: {len(payload)}\r\n"
+                f"Connection: close\r\n\r\n".encode() + payload
+            )
+            await writer.drain()
+        except (asyncio.TimeoutError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def start(self):
+        self.monitor.start()
+        if self.port:
+            self._server = await asyncio.start_server(self._handle, self.host, self.port)
+            print(f"📈 Metrics on http://{self.host}:{self.port}/metrics")
+
+    async def close(self):
+        await self.monitor.stop()
+        if self.profiler.running:
+            self.profiler.stop()
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
@@ -0,0 +1,96 @@
+import asyncio
+import importlib
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Deque, Dict, List, Optional
+from database import Storage
+from vault import KeyVault, wallet_context
+
+# currency -> (network name, module, backend class providing generate_key())
+KEY_BACKENDS = {
+    'BTC': ('Bitcoin', 'wallets.bitcoin', 'BitcoinWallet'),
+    'LTC': ('Litecoin', 'wallets.bitcoin', 'LitecoinWallet'),
+    'ETH': ('Ethereum', 'wallets.ethereum', 'EthereumWallet'),
+    'BSC': ('Binance Smart Chain', 'wallets.ethereum', 'BSCWallet'),
+    'MATIC': ('Polygon', 'wallets.ethereum', 'PolygonWallet'),
+    'TRX': ('Tron', 'wallets.tron', 'TronWallet')
+}
+
+def generate_keys(currency: str, count: int) -> List[Dict[str, Any]]:
+    # Runs inside a worker process
+    _, module, class_name = KEY_BACKENDS[currency]
+    backend = getattr(importlib.import_module(module), class_name)
+    return [backend.generate_key() for _ in range(count)]
+
+class WalletProvisioner:
+    def __init__(self, db: Storage, workers: Optional[int] = None, pool_size: int = 0,
+                 refill_interval: float = 5.0, networks: Optional[List[str]] = None,
+                 vault: Optional[KeyVault] = None):
+        self.db = db
+        self.vault = vault or KeyVault({})
+        self.workers = workers or multiprocessing.cpu_count()
+        self.pool_size = pool_size
+        self.refill_interval = refill_interval
+        # spawn, not fork: the bot process already runs executor threads
+        self.executor = ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=multiprocessing.get_context('spawn')
+        )
+        self.pool: Dict[str, Deque[Dict[str, Any]]] = {
+            currency: deque() for currency in (networks or KEY_BACKENDS)
+        }
+        self._refill_task: Optional[asyncio.Task] = None
+
+    async def generate(self, currency: str, count: int) -> List[Dict[str, Any]]:
+        if currency not in KEY_BACKENDS:
+            raise ValueError(f"Unsupported network: {currency}")
+        loop = asyncio.get_running_loop()
+        chunk = max(1, -(-count // self.workers))
+        sizes = [min(chunk, count - start) for start in range(0, count, chunk)]
+        batches = await asyncio.gather(*(
+            loop.run_in_executor(self.executor, generate_keys, currency, size) for size in sizes
+        ))
+        return [key for batch in batches for key in batch]
+
+    async def take(self, currency: str, count: int = 1) -> List[Dict[str, Any]]:
+        # Pre-generated keys first, the remainder is derived on demand
+        pool = self.pool.get(currency, deque())
+        keys = [pool.popleft() for _ in range(min(count, len(pool)))]
+        if len(keys) < count:
+            keys += await self.generate(currency, count - len(keys))
+        return keys
+
+    async def create_wallets(self, user_id: int, currency: str, count: int) -> List[Dict[str, Any]]:
+        # Bulk provisioning: keys from the process pool, stored with one executemany transaction
+        network_name = KEY_BACKENDS[currency][0]
+        keys = await self.take(currency, count)
+        rows = await self.vault.run(lambda: [
+            dict(key, user_id=user_id, network=network_name, currency=currency,
+                 private_key=self.vault.seal(key['private_key'], wallet_context(key['address'], 'private_key')),
+                 mnemonic=self.vault.seal(key.get('mnemonic'), wallet_context(key['address'], 'mnemonic')))
+            for key in keys
+        ])
+        await self.db.add_wallets(rows)
+        return rows
+
+    async def _refill_loop(self):
+        while True:
+            for currency, pool in self.pool.items():
+                missing = self.pool_size - len(pool)
+                if missing > 0:
+                    try:
+                        pool.extend(await self.generate(currency, missing))
+                    except Exception as e:
+                        print(f"Key pool refill error ({currency}): {e}")
+            await asyncio.sleep(self.refill_interval)
+
+    def start(self):
+        if self.pool_size > 0 and self._refill_task is None:
+            self._refill_task = asyncio.ensure_future(self._refill_loop())
+
+    async def close(self):
+        if self._refill_task is not None:
+            self._refill_task.cancel()
+            self._refill_task = None
+        self.executor.shutdown(wait=False, cancel_futures=True)
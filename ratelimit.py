@@ -0,0 +1,239 @@
+import asyncio
+import hashlib
+import heapq
+import itertools
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from typing import Dict, List, Optional, Tuple
+from config import Config
+
+# Who the current chain call is made for; handlers set it, background work stays 'system'
+current_caller: ContextVar[str] = ContextVar('current_caller', default='system')
+
+class MemoryStore:
+    # Token buckets and shared backoff deadlines for a single process, bounded LRU
+    def __init__(self, max_keys: int = 100000):
+        self.max_keys = max_keys
+        self._buckets: "OrderedDict[str, Tuple[float, float]]" = OrderedDict()  # key -> (tokens, updated)
+        self._backoff: Dict[str, float] = {}
+
+    async def take(self, buckets: List[Tuple[str, int, float]], cost: float = 1.0) -> float:
+        # buckets: (key, capacity, period). Seconds to wait until every bucket holds `cost`
+        # tokens; only at 0 are they taken, from all of them at once, so a call one bucket
+        # refuses leaves the others untouched
+        now = time.time()
+        levels = []
+        wait = 0.0
+        for key, capacity, period in buckets:
+            rate = capacity / period
+            tokens, updated = self._buckets.pop(key, (capacity, now))
+            tokens = min(capacity, tokens + (now - updated) * rate)
+            levels.append((key, tokens))
+            if tokens < cost:
+                wait = max(wait, (cost - tokens) / rate)
+        for key, tokens in levels:
+            self._buckets[key] = (tokens - cost if wait == 0 else tokens, now)
+        while len(self._buckets) > self.max_keys:
+            # Evicting an idle bucket only forgets a partly drained one
+            self._buckets.popitem(last=False)
+        return wait
+
+    async def set_backoff(self, name: str, until: float):
+        self._backoff[name] = max(until, self._backoff.get(name, 0.0))
+
+    async def get_backoff(self, name: str) -> float:
+        return self._backoff.get(name, 0.0)
+
+TOKEN_BUCKET_SCRIPT = """
+local now = tonumber(ARGV[1])
+local cost = tonumber(ARGV[2])
+local levels = {}
+local wait = 0
+for i, key in ipairs(KEYS) do
+    local capacity = tonumber(ARGV[2 * i + 1])
+    local rate = tonumber(ARGV[2 * i + 2])
+    local bucket = redis.call('HMGET', key, 'tokens', 'updated')
+    local tokens = tonumber(bucket[1]) or capacity
+    local updated = tonumber(bucket[2]) or now
+    levels[i] = math.min(capacity, tokens + (now - updated) * rate)
+    if levels[i] < cost then
+        wait = math.max(wait, (cost - levels[i]) / rate)
+    end
+end
+for i, key in ipairs(KEYS) do
+    local capacity = tonumber(ARGV[2 * i + 1])
+    local rate = tonumber(ARGV[2 * i + 2])
+    local tokens = levels[i]
+    if wait == 0 then
+        tokens = tokens - cost
+    end
+    redis.call('HSET', key, 'tokens', tokens, 'updated', now)
+    redis.call('EXPIRE', key, math.ceil(capacity / rate) + 1)
+end
+return tostring(wait)
+"""
+
+class RedisStore:
+    # Same contract as MemoryStore, shared by every process pointing at one Redis.
+    # Keys expire once a bucket would be full again, so the keyspace stays bounded
+    def __init__(self, url: str, prefix: str = 'walletbot:'):
+        import redis.asyncio as redis
+        self.redis = redis.from_url(url)
+        self.prefix = prefix
+        self._take = self.redis.register_script(TOKEN_BUCKET_SCRIPT)
+
+    async def take(self, buckets: List[Tuple[str, int, float]], cost: float = 1.0) -> float:
+        args = [time.time(), cost]
+        for _, capacity, period in buckets:
+            args += [capacity, capacity / period]
+        wait = await self._take(keys=[self.prefix + 'bucket:' + key for key, _, _ in buckets], args=args)
+        return float(wait)
+
+    async def set_backoff(self, name: str, until: float):
+        key = self.prefix + 'backoff:' + name
+        current = await self.redis.get(key)
+        if current is None or float(current) < until:
+            await self.redis.set(key, until, px=max(int((until - time.time()) * 1000), 1))
+
+    async def get_backoff(self, name: str) -> float:
+        value = await self.redis.get(self.prefix + 'backoff:' + name)
+        return float(value) if value is not None else 0.0
+
+_store = None
+
+def get_store():
+    global _store
+    if _store is None:
+        _store = RedisStore(Config.RATE_LIMIT_REDIS_URL) if Config.RATE_LIMIT_REDIS_URL else MemoryStore(Config.RATE_LIMIT_KEYS)
+    return _store
+
+class RateLimiter:
+    # Token bucket per user and command. rules maps a command to (capacity, period seconds);
+    # the '*' rule is a per-user budget across all commands
+    def __init__(self, rules: Dict[str, Tuple[int, float]], store=None):
+        self.rules = rules
+        self.store = store or get_store()
+
+    async def check(self, user_id: int, command: str) -> float:
+        # A refused call costs neither budget
+        buckets = [
+            (f"{user_id}:{name}", *self.rules[name])
+            for name in dict.fromkeys(('*', command)) if name in self.rules
+        ]
+        return await self.store.take(buckets) if buckets else 0.0
+
+class FairScheduler:
+    # Caps concurrent outbound calls to one upstream and grants waiting calls in start-time
+    # fair queuing order per caller: a caller with many queued calls gets later tags, so a
+    # light user's single call overtakes a heavy user's backlog. Throttling responses halve
+    # the concurrency limit and pause dispatch; successes grow it back (AIMD)
+    def __init__(self, name: str, capacity: int = 16, weights: Optional[Dict[str, float]] = None,
+                 max_flows: int = 10000, max_backoff: float = 60.0, store=None):
+        self.name = name
+        # The store key for the backoff deadline: names are endpoint URLs, which may carry
+        # API keys, so the shared store only ever sees a digest
+        self.store_key = hashlib.sha256(name.encode()).hexdigest()[:32]
+        self.capacity = capacity
+        self.limit = float(capacity)
+        self.weights = weights or {}
+        self.max_flows = max_flows
+        self.max_backoff = max_backoff
+        self.store = store
+        self.active = 0
+        self.virtual_time = 0.0
+        self.paused_until = 0.0  # wall clock, so it can be shared through the store
+        self.throttles = 0
+        self._backoff = 1.0
+        self._finish: "OrderedDict[str, float]" = OrderedDict()
+        self._waiting: List[Tuple[float, int, asyncio.Future]] = []
+        self._seq = itertools.count()
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._synced_at = 0.0
+
+    def _tag(self, caller: str) -> float:
+        weight = self.weights.get(caller, self.weights.get(caller.split(':', 1)[0], 1.0))
+        tag = max(self.virtual_time, self._finish.pop(caller, 0.0)) + 1.0 / weight
+        self._finish[caller] = tag
+        while len(self._finish) > self.max_flows:
+            # A forgotten caller restarts at the current virtual time, which is where
+            # an idle caller would start anyway
+            self._finish.popitem(last=False)
+        return tag
+
+    async def _sync_backoff(self):
+        # Pick up backoff deadlines other processes published, at most once a second
+        now = time.time()
+        if self.store is not None and now - self._synced_at >= 1.0:
+            self._synced_at = now
+            self.paused_until = max(self.paused_until, await self.store.get_backoff(self.store_key))
+
+    async def acquire(self, caller: Optional[str] = None):
+        await self._sync_backoff()
+        tag = self._tag(caller or current_caller.get())
+        if not self._waiting and self.active < max(1, int(self.limit)) and time.time() >= self.paused_until:
+            self.active += 1
+            self.virtual_time = tag
+            return
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiting, (tag, next(self._seq), future))
+        self._dispatch()
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                self.release()  # granted just as the caller gave up
+            raise
+
+    def release(self):
+        self.active -= 1
+        self._dispatch()
+
+    def _dispatch(self):
+        delay = self.paused_until - time.time()
+        if delay > 0:
+            if self._timer is None:
+                self._timer = asyncio.get_running_loop().call_later(delay, self._resume)
+            return
+        while self._waiting and self.active < max(1, int(self.limit)):
+            tag, _, future = heapq.heappop(self._waiting)
+            if future.done():
+                continue
+            self.active += 1
+            self.virtual_time = tag
+            future.set_result(None)
+
+    def _resume(self):
+        self._timer = None
+        self._dispatch()
+
+    def success(self):
+        self.limit = min(self.capacity, self.limit + 1.0 / max(self.limit, 1.0))
+        self._backoff = 1.0
+
+    def throttled(self, retry_after: Optional[float] = None):
+        self.throttles += 1
+        self.limit = max(1.0, self.limit / 2)
+        pause = retry_after if retry_after is not None else self._backoff
+        self._backoff = min(self._backoff * 2, self.max_backoff)
+        self.paused_until = max(self.paused_until, time.time() + min(pause, self.max_backoff))
+        if self.store is not None:
+            asyncio.ensure_future(self.store.set_backoff(self.store_key, self.paused_until))
+
+    @asynccontextmanager
+    async def slot(self, caller: Optional[str] = None):
+        await self.acquire(caller)
+        try:
+            yield
+        finally:
+            self.release()
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            'active': self.active,
+            'waiting': len(self._waiting),
+            'limit': self.limit,
+            'throttles': self.throttles,
+            'paused_for': max(self.paused_until - time.time(), 0.0)
+        }
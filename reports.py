@@ -0,0 +1,280 @@
+import asyncio
+import csv
+import gzip
+import os
+import tempfile
+import time
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple
+from database import Storage
+from ratelimit import current_caller
+from tokens import TokenRegistry
+
+# Report kind -> (column, type) in file order; the types are for the Parquet schema
+COLUMNS = {
+    'holdings': [
+        ('user_id', 'int'), ('currency', 'str'), ('asset', 'str'), ('address', 'str'), ('balance', 'float')
+    ],
+    'stale': [
+        ('user_id', 'int'), ('currency', 'str'), ('address', 'str'), ('ledger_balance', 'float'),
+        ('live_balance', 'float'), ('as_of_block', 'int'), ('head', 'int'), ('lag_blocks', 'int'),
+        ('reason', 'str')
+    ],
+    'wallets': [
+        ('currency', 'str'), ('wallets', 'int'), ('users', 'int'), ('last_created', 'str')
+    ]
+}
+
+class ReportWriter:
+    # Rows appended chunk by chunk to a compressed file - gzip'd CSV, or Parquet (zstd, a
+    # row group per chunk; needs pyarrow) - so a report never holds more than one chunk.
+    # Every method blocks: run them off the event loop
+    def __init__(self, path: str, columns: List[Tuple[str, str]], fmt: str = 'csv'):
+        self.fmt = fmt
+        self.rows = 0
+        if fmt == 'parquet':
+            import pyarrow
+            import pyarrow.parquet
+            types = {'int': pyarrow.int64(), 'float': pyarrow.float64(), 'str': pyarrow.string()}
+            self._pyarrow = pyarrow
+            self.schema = pyarrow.schema([(name, types[kind]) for name, kind in columns])
+            self.path = path + '.parquet'
+            self._writer = pyarrow.parquet.ParquetWriter(self.path, self.schema, compression='zstd')
+        elif fmt == 'csv':
+            self.path = path + '.csv.gz'
+            self._file = gzip.open(self.path, 'wt', newline='', compresslevel=6)
+            self._writer = csv.writer(self._file)
+            self._writer.writerow([name for name, _ in columns])
+        else:
+            raise ValueError(f"Unknown report format {fmt!r}")
+
+    def write(self, rows: List[Tuple]):
+        if not rows:
+            return
+        if self.fmt == 'parquet':
+            arrays = [
+                self._pyarrow.array([row[i] for row in rows], type=field.type)
+                for i, field in enumerate(self.schema)
+            ]
+            self._writer.write_table(self._pyarrow.Table.from_arrays(arrays, schema=self.schema))
+        else:
+            self._writer.writerows(rows)
+        self.rows += len(rows)
+
+    def close(self):
+        if self.fmt == 'parquet':
+            self._writer.close()
+        else:
+            self._file.close()
+
+    def discard(self):
+        self.close()
+        os.remove(self.path)
+
+class AdminReports:
+    # Portfolio-wide reports for the admins, each built in a background task so the bot
+    # keeps answering: wallets stream from the database chunk_size at a time (keyset on
+    # the wallet id), balances come live from the backends' batched per-network lookups,
+    # bypassing the balance cache a full scan would flush, and rows go straight to a
+    # compressed file. Chain calls run as caller "report", one flow of the RPC fair
+    # scheduler, and only one report of a kind runs at a time
+    def __init__(self, db: Storage, balance_engine, tokens: TokenRegistry, ledger,
+                 chunk_size: int = 1000, directory: str = '', fmt: str = 'csv',
+                 stale_blocks: int = 1000):
+        self.db = db
+        self.engine = balance_engine
+        self.tokens = tokens
+        self.ledger = ledger
+        self.chunk_size = chunk_size
+        self.directory = directory or tempfile.gettempdir()
+        self.fmt = fmt
+        self.stale_blocks = stale_blocks
+        self._running: Dict[str, asyncio.Task] = {}
+
+    def running(self, kind: str) -> bool:
+        task = self._running.get(kind)
+        return task is not None and not task.done()
+
+    def start(self, kind: str, on_done: Callable[[Dict[str, Any]], Awaitable],
+              on_progress: Optional[Callable[[int], Awaitable]] = None) -> bool:
+        # on_done gets build()'s result, or {'path': None, 'text': error}; the file is
+        # deleted once it returns. False if a report of this kind is already running
+        if kind not in COLUMNS:
+            raise ValueError(f"Unknown report {kind!r}")
+        if self.running(kind):
+            return False
+        self._running[kind] = asyncio.ensure_future(self._run(kind, on_done, on_progress))
+        return True
+
+    async def _run(self, kind: str, on_done: Callable[[Dict[str, Any]], Awaitable],
+                   on_progress: Optional[Callable[[int], Awaitable]]):
+        current_caller.set('report')
+        try:
+            result = await self.build(kind, on_progress)
+        except Exception as e:
+            print(f"Report error ({kind}): {e}")
+            result = {'path': None, 'text': f"❌ The {kind} report failed: {e}"}
+        try:
+            await on_done(result)
+        except Exception as e:
+            print(f"Report delivery error ({kind}): {e}")
+        finally:
+            if result['path'] is not None:
+                os.remove(result['path'])
+
+    async def build(self, kind: str, on_progress: Optional[Callable[[int], Awaitable]] = None) -> Dict[str, Any]:
+        # {'path': report file, 'text': summary}
+        path = os.path.join(self.directory, f"{kind}-report-{time.strftime('%Y%m%d-%H%M%S')}")
+        writer = await self.engine.run_blocking(ReportWriter, path, COLUMNS[kind], self.fmt)
+        try:
+            text = await getattr(self, kind)(writer, on_progress)
+        except BaseException:
+            await self.engine.run_blocking(writer.discard)
+            raise
+        await self.engine.run_blocking(writer.close)
+        return {'path': writer.path, 'text': text}
+
+    async def _chunks(self, on_progress: Optional[Callable[[int], Awaitable]]) -> AsyncIterator[List[Tuple]]:
+        # (id, user_id, currency, address, ledger balance, as_of_block, reconciled_at) rows
+        after = 0
+        scanned = 0
+        while True:
+            rows = await self.db.get_wallets_batch(after, self.chunk_size)
+            if not rows:
+                return
+            after = rows[-1][0]
+            yield [tuple(row) for row in rows]
+            scanned += len(rows)
+            if on_progress is not None:
+                try:
+                    await on_progress(scanned)
+                except Exception as e:
+                    print(f"Report progress error: {e}")
+
+    @staticmethod
+    def _by_network(rows: List[Tuple], networks) -> Dict[str, List[Tuple]]:
+        grouped: Dict[str, List[Tuple]] = {}
+        for row in rows:
+            if row[2] in networks:
+                grouped.setdefault(row[2], []).append(row)
+        return grouped
+
+    async def _live(self, currency: str, addresses: List[str]) -> Dict[str, float]:
+        try:
+            return await self.engine.fetch_network_balances(currency, addresses)
+        except Exception as e:
+            print(f"Report balance error ({currency}): {e}")
+            return {}
+
+    async def _holdings(self, currency: str, wallets: List[Tuple]) -> Tuple[List[Tuple], int]:
+        # (rows, addresses whose native balance could not be fetched)
+        addresses = [row[3] for row in wallets]
+        native = await self._live(currency, addresses)
+        tokens: Dict[str, Dict[str, float]] = {}
+        if currency in self.tokens.networks:
+            try:
+                tokens = await self.tokens.fetch_balances(currency, addresses)
+            except Exception as e:
+                print(f"Report token balance error ({currency}): {e}")
+        rows = []
+        for _, user_id, _, address, *_ in wallets:
+            if address in native:
+                rows.append((user_id, currency, currency, address, float(native[address])))
+            for symbol, amount in sorted(tokens.get(address, {}).items()):
+                rows.append((user_id, currency, symbol, address, float(amount)))
+        return rows, sum(address not in native for address in addresses)
+
+    async def holdings(self, writer: ReportWriter, on_progress=None) -> str:
+        # A row per wallet and asset (native and registered tokens), totals per network
+        totals: Dict[Tuple[str, str], List[float]] = {}  # (currency, asset) -> [total, funded wallets]
+        failed: Dict[str, int] = {}
+        wallets = 0
+        async for chunk in self._chunks(on_progress):
+            by_network = self._by_network(chunk, self.engine.wallets)
+            results = await asyncio.gather(*(
+                self._holdings(currency, rows) for currency, rows in by_network.items()
+            ))
+            rows = []
+            for currency, (network_rows, missing) in zip(by_network, results):
+                rows += network_rows
+                if missing:
+                    failed[currency] = failed.get(currency, 0) + missing
+            for _, currency, asset, _, balance in rows:
+                total = totals.setdefault((currency, asset), [0.0, 0])
+                total[0] += balance
+                total[1] += balance > 0
+            await self.engine.run_blocking(writer.write, rows)
+            wallets += len(chunk)
+
+        lines = [f"📊 **Holdings** across {wallets} wallets"]
+        for (currency, asset), (total, funded) in sorted(totals.items()):
+            label = asset if asset == currency else f"{asset} ({currency})"
+            lines.append(f"{label}: {total:.8f} in {int(funded)} wallets")
+        for currency, missing in sorted(failed.items()):
+            lines.append(f"⚠️ {missing} {currency} balances could not be fetched")
+        return "\n".join(lines)
+
+    async def stale(self, writer: ReportWriter, on_progress=None) -> str:
+        # Ledger entries that can't be trusted: never synced, more than stale_blocks behind
+        # the head, or disagreeing with the live balance
+        networks = [currency for currency in self.ledger.networks if currency in self.engine.wallets]
+        if not networks:
+            raise ValueError("no network keeps a balance ledger (WATCHER_NETWORKS)")
+        # Heads first: a live balance is at least as fresh as the head it's compared at
+        heads = dict(zip(networks, await asyncio.gather(*(
+            self.engine.call(currency, 'get_block_number') for currency in networks
+        ))))
+        counts = {currency: {'unsynced': 0, 'behind': 0, 'drift': 0} for currency in networks}
+        wallets = 0
+        async for chunk in self._chunks(on_progress):
+            by_network = self._by_network(chunk, networks)
+            live = dict(zip(by_network, await asyncio.gather(*(
+                self._live(currency, [row[3] for row in rows]) for currency, rows in by_network.items()
+            ))))
+            stale = []
+            for currency, rows in by_network.items():
+                head = heads[currency]
+                for _, user_id, _, address, balance, as_of_block, _ in rows:
+                    balance = None if balance is None else float(balance)
+                    live_balance = live[currency].get(address)
+                    lag = None if as_of_block is None else head - as_of_block
+                    if balance is None:
+                        reason = 'unsynced'
+                    elif lag > self.stale_blocks:
+                        reason = 'behind'
+                    elif live_balance is not None and abs(balance - float(live_balance)) > self.ledger.tolerance:
+                        reason = 'drift'
+                    else:
+                        continue
+                    counts[currency][reason] += 1
+                    stale.append((
+                        user_id, currency, address, balance,
+                        None if live_balance is None else float(live_balance),
+                        as_of_block, head, lag, reason
+                    ))
+            await self.engine.run_blocking(writer.write, stale)
+            wallets += sum(len(rows) for rows in by_network.values())
+
+        lines = [f"🕰️ **Stale balances**: {writer.rows} of {wallets} ledger wallets"]
+        for currency in networks:
+            found = counts[currency]
+            lines.append(
+                f"{currency} (head {heads[currency]}): {found['unsynced']} unsynced, "
+                f"{found['behind']} over {self.stale_blocks} blocks behind, {found['drift']} drifted"
+            )
+        return "\n".join(lines)
+
+    async def wallets(self, writer: ReportWriter, on_progress=None) -> str:
+        # Wallets and owners per network, counted by the database
+        rows = [
+            (currency, int(count), int(users), None if created is None else str(created))
+            for currency, count, users, created in await self.db.get_wallet_stats()
+        ]
+        await self.engine.run_blocking(writer.write, rows)
+        lines = [f"👛 **Wallets**: {sum(row[1] for row in rows)}"]
+        lines += [f"{currency}: {count} wallets, {users} users" for currency, count, users, _ in rows]
+        return "\n".join(lines)
+
+    async def stop(self):
+        for task in self._running.values():
+            task.cancel()
+        self._running = {}
@@ -0,0 +1,117 @@
+import asyncio
+from typing import Any, Dict, List, Optional
+from database import Storage
+from vault import KeyVault, wallet_context
+
+class SendQueue:
+    # Outgoing transfers are queued and handled by a few worker tasks: the handler only
+    # enqueues and awaits the result, key loading and signing run off the event loop
+    def __init__(self, db: Storage, balance_engine, tokens=None, tracker=None,
+                 workers: int = 4, max_pending: int = 1000, vault: Optional[KeyVault] = None):
+        self.db = db
+        self.vault = vault or KeyVault({})
+        self.engine = balance_engine
+        self.tokens = tokens
+        self.tracker = tracker
+        self.workers = workers
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=max_pending)
+        self._tasks: List[asyncio.Task] = []
+
+    def submit(self, user_id: int, currency: str, from_address: str, to_address: str,
+               amount: float, token: Optional[str] = None, network: Optional[str] = None) -> asyncio.Future:
+        # Resolves to the transaction hash, or the error the send failed with
+        future = asyncio.get_running_loop().create_future()
+        job = {
+            'user_id': user_id,
+            'currency': currency,
+            'from_address': from_address,
+            'to_address': to_address,
+            'amount': amount,
+            'token': token,
+            'network': network,
+            'future': future
+        }
+        try:
+            self.queue.put_nowait(job)
+        except asyncio.QueueFull:
+            raise Exception("Too many pending transfers, please try again shortly")
+        return future
+
+    async def send(self, user_id: int, currency: str, from_address: str, to_address: str,
+                   amount: float, token: Optional[str] = None, network: Optional[str] = None) -> str:
+        return await self.submit(user_id, currency, from_address, to_address, amount, token, network)
+
+    async def _token(self, currency: str, symbol: str) -> Dict[str, Any]:
+        contract = self.tokens.tokens.get(currency, {}).get(symbol) if self.tokens else None
+        if contract is None:
+            raise ValueError(f"Unknown token {symbol} on {currency}")
+        metadata = (await self.tokens.get_metadata(currency)).get(contract)
+        if metadata is None:
+            raise ValueError(f"Token metadata for {symbol} is not available")
+        return dict(metadata, contract=contract)
+
+    async def _execute(self, job: Dict[str, Any]) -> str:
+        currency = job['currency']
+        backend = self.engine.wallets.get(currency)
+        if backend is None:
+            raise KeyError(f"No wallet service for {currency}")
+        # Stays sealed until the moment of signing, and is opened off the event loop
+        sealed_key = await self.db.get_wallet_private_key(job['user_id'], job['from_address'])
+        if not sealed_key:
+            raise ValueError("Wallet not found")
+        context = wallet_context(job['from_address'])
+
+        sender = getattr(backend, 'sender', None)
+        if sender is None:
+            if job['token']:
+                raise ValueError(f"Token transfers are not supported on {currency}")
+            private_key = await self.vault.open_async(sealed_key, context)
+            return await self.engine.call(currency, 'send_transaction', private_key, job['to_address'], job['amount'])
+
+        contract, decimals = None, 18
+        if job['token']:
+            token = await self._token(currency, job['token'])
+            contract, decimals = token['contract'], token['decimals']
+        to, value, data = backend.transfer_fields(job['to_address'], job['amount'], contract, decimals)
+        return await sender.send(
+            job['from_address'], to, value, data,
+            lambda tx: self.engine.run_blocking(lambda: sender.sign(tx, self.vault.open(sealed_key, context)))
+        )
+
+    async def _worker(self):
+        while True:
+            job = await self.queue.get()
+            future = job['future']
+            try:
+                tx_hash = await self._execute(job)
+            except asyncio.CancelledError:
+                future.cancel()
+                raise
+            except Exception as e:
+                if not future.done():
+                    future.set_exception(e)
+            else:
+                # The sender's balances changed; don't serve them from cache
+                self.engine.cache.invalidate(job['currency'], job['from_address'])
+                self.engine.cache.invalidate(f"{job['currency']}:TOKENS", job['from_address'])
+                if not future.done():
+                    future.set_result(tx_hash)
+                if self.tracker is not None:
+                    try:
+                        await self.tracker.track(
+                            job['user_id'], job['currency'], tx_hash, job['from_address'],
+                            job['to_address'], job['amount'], job['network']
+                        )
+                    except Exception as e:
+                        print(f"Transaction tracking error: {e}")
+            finally:
+                self.queue.task_done()
+
+    def start(self):
+        if not self._tasks:
+            self._tasks = [asyncio.ensure_future(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        self._tasks = []
@@ -0,0 +1,354 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+from config import Config
+from database import open_database
+from balances import BalanceEngine
+from provisioning import WalletProvisioner
+from indexer import DepositWatcher
+from feeds import ChainFeeds
+from ledger import BalanceLedger
+from reports import AdminReports
+from tokens import TokenRegistry
+from vault import KeyVault, seed_context, wallet_context
+from ratelimit import current_caller
+from metrics import JOB_ERRORS, JOB_SECONDS, watch_cache
+from wallets.registry import BackendRegistry
+
+# Telegram network code -> (currency, network name)
+NETWORK_CODES = {
+    'btc': ('BTC', 'Bitcoin'),
+    'ltc': ('LTC', 'Litecoin'),
+    'eth': ('ETH', 'Ethereum'),
+    'bsc': ('BSC', 'Binance Smart Chain'),
+    'matic': ('MATIC', 'Polygon'),
+    'trx': ('TRX', 'Tron')
+}
+
+# ETH, BSC and Polygon all derive on BIP44 coin type 60, so BSC and Polygon take their
+# HD indexes from the ETH sequence and a user never gets the same address twice
+HD_INDEX_SEQUENCES = {'BSC': 'ETH', 'MATIC': 'ETH'}
+
+def page_buttons(kind: str, rows: List[Tuple], cursor: Optional[int], backward: bool,
+                 more: bool) -> List[List[str]]:
+    # [label, callback data] pairs carrying the id of the wallet the next page starts
+    # from; `more` says whether rows continue in the direction the page was read
+    newer = more if backward else cursor is not None
+    older = True if backward else more
+    buttons = []
+    if newer:
+        buttons.append(["◀️ Newer", f"{kind}_prev_{rows[0][0]}"])
+    if older:
+        buttons.append(["Older ▶️", f"{kind}_next_{rows[-1][0]}"])
+    return buttons
+
+class WalletService:
+    # The wallet operations behind the bot's commands, independent of Telegram, so they
+    # can run in the bot process or in worker processes fed by a job queue. Each job
+    # takes and returns plain JSON-serializable dicts
+    def __init__(self, provision_workers: Optional[int] = None):
+        self.db = open_database(Config.DATABASE_URL, pool_size=Config.DB_POOL_SIZE)
+
+        # Wallet managers for the enabled networks, each constructed on first use
+        self.wallets = BackendRegistry(Config.ENABLED_NETWORKS)
+
+        self.balance_engine = BalanceEngine(self.wallets)
+        watch_cache(self.balance_engine.cache)
+        # Private keys and seeds are stored sealed, and opened only where they are used
+        self.vault = KeyVault.from_config()
+        self.provisioner = WalletProvisioner(
+            self.db,
+            vault=self.vault,
+            workers=provision_workers or Config.PROVISION_WORKERS,
+            pool_size=Config.KEY_POOL_SIZE,
+            refill_interval=Config.KEY_POOL_REFILL_INTERVAL,
+            networks=list(self.wallets)
+        )
+        self.watcher = DepositWatcher(
+            self.db,
+            self.balance_engine,
+            networks=Config.WATCHER_NETWORKS,
+            poll_interval=Config.WATCHER_POLL_INTERVAL,
+            max_blocks=Config.WATCHER_MAX_BLOCKS
+        )
+        self.ledger = BalanceLedger(
+            self.db,
+            self.balance_engine,
+            self.watcher,
+            interval=Config.LEDGER_RECONCILE_INTERVAL,
+            batch_size=Config.LEDGER_RECONCILE_BATCH
+        )
+        self.tokens = TokenRegistry(self.db, self.balance_engine)
+        self.feeds = ChainFeeds(self.balance_engine, self.watcher, self.tokens, Config.EVENT_FEEDS)
+        self.reports = AdminReports(
+            self.db,
+            self.balance_engine,
+            self.tokens,
+            self.ledger,
+            chunk_size=Config.REPORT_CHUNK_SIZE,
+            directory=Config.REPORT_DIR,
+            fmt=Config.REPORT_FORMAT,
+            stale_blocks=Config.REPORT_STALE_BLOCKS
+        )
+        self.jobs = {
+            'balance': self.balance_report,
+            'create': self.create_wallet,
+            'tx': self.transaction_report
+        }
+
+    async def handle(self, kind: str, payload: Dict[str, Any],
+                     on_update: Optional[Callable[[Dict[str, Any]], Awaitable]] = None) -> Dict[str, Any]:
+        # on_update only reaches jobs run in-process: progress can't cross the job queue
+        if on_update is not None:
+            payload = {**payload, 'on_update': on_update}
+        if 'user_id' in payload:
+            # Attribute chain calls to the user for the RPC fair scheduler
+            current_caller.set(f"user:{payload['user_id']}")
+        try:
+            with JOB_SECONDS.time(kind=kind):
+                return await self.jobs[kind](**payload)
+        except Exception:
+            JOB_ERRORS.inc(kind=kind)
+            raise
+
+    async def wallets_page(self, user_id: int, cursor: Optional[int] = None,
+                           backward: bool = False) -> Dict[str, Any]:
+        rows, more = await self.db.get_user_wallets_page(user_id, Config.WALLETS_PAGE_SIZE, cursor, backward)
+        if not rows:
+            if cursor is None:
+                return {'text': "You don't have any wallets yet. Use /create to make one!"}
+            return {'text': "No more wallets."}
+
+        lines = ["**📋 Your Wallets:**\n"]
+        for _, network, currency, address, created_at in rows:
+            lines += [
+                f"**{network} ({currency})**",
+                f"Address: `{address}`",
+                f"Created: {created_at}",
+                "─" * 30
+            ]
+        return {'text': "\n".join(lines), 'buttons': page_buttons('wallets', rows, cursor, backward, more)}
+
+    async def balance_report(self, user_id: int, cursor: Optional[int] = None, backward: bool = False,
+                             on_update: Optional[Callable[[Dict[str, Any]], Awaitable]] = None) -> Dict[str, Any]:
+        # Balances for one page of the user's wallets. Each network is fetched on its own,
+        # and on_update gets the page re-rendered as each one answers, so a slow chain
+        # holds back only its own lines
+        rows, more = await self.db.get_user_wallets_page(user_id, Config.WALLETS_PAGE_SIZE, cursor, backward)
+
+        if not rows:
+            return {'text': "You don't have any wallets yet!" if cursor is None else "No more wallets."}
+
+        buttons = page_buttons('balance', rows, cursor, backward, more)
+        wallets = [(network, currency, address) for _, network, currency, address, _ in rows if currency in self.wallets]
+
+        # Answer from the local ledger where the watcher keeps one, and fetch the
+        # rest concurrently, grouped by network
+        ledger = await self.ledger.get_user_balances(user_id)
+        balances = {key: balance for key, (balance, _) in ledger.items()}
+        token_balances: Dict[Tuple[str, str], Dict[str, float]] = {}
+        by_network: Dict[str, List[str]] = {}
+        for _, currency, address in wallets:
+            if (currency, address) not in ledger or currency in self.tokens.networks:
+                by_network.setdefault(currency, []).append(address)
+        pending = set(by_network)
+
+        async def fetch(currency: str, addresses: List[str]):
+            native, tokens = await asyncio.gather(
+                self.balance_engine.get_balances(
+                    (currency, address) for address in addresses if (currency, address) not in ledger
+                ),
+                self.tokens.get_user_balances((currency, address) for address in addresses)
+            )
+            return currency, native, tokens
+
+        def render() -> Dict[str, Any]:
+            lines = ["**💰 Wallet Balances:**\n"]
+            total_processed = 0
+            for network, currency, address in wallets:
+                balance = balances.get((currency, address))
+                if currency in pending and balance is None:
+                    lines.append(f"**{network} ({currency})** - ⏳ Loading...")
+                    continue
+                if balance is None:
+                    lines.append(f"**{network} ({currency})** - Error: Could not fetch balance")
+                    continue
+                lines += [
+                    f"**{network} ({currency})**",
+                    f"Address: `{address[:10]}...{address[-8:]}`",
+                    f"Balance: {balance:.6f} {currency}"
+                ]
+                lines += [f"{symbol}: {amount:.6f}" for symbol, amount in token_balances.get((currency, address), {}).items()]
+                if (currency, address) in ledger:
+                    lines.append(f"Last synced at block {ledger[(currency, address)][1]}")
+                lines.append("─" * 30)
+                total_processed += 1
+            if total_processed == 0 and not pending:
+                lines.append("❌ Could not fetch any balances. Please try again later.")
+            return {'text': "\n".join(lines), 'buttons': buttons}
+
+        tasks = [asyncio.ensure_future(fetch(currency, addresses)) for currency, addresses in by_network.items()]
+        try:
+            if tasks and on_update is not None:
+                await on_update(render())
+            for next_network in asyncio.as_completed(tasks):
+                currency, native, tokens = await next_network
+                balances.update((key, balance) for key, balance in native.items() if balance is not None)
+                token_balances.update(tokens)
+                pending.discard(currency)
+                if pending and on_update is not None:
+                    await on_update(render())
+        finally:
+            for task in tasks:
+                task.cancel()
+
+        return render()
+
+    async def create_wallet(self, user_id: int, username: str, network_code: str,
+                            request_id: Optional[str] = None) -> Dict[str, Any]:
+        # request_id makes the job idempotent: run again (a worker lost its claim on it),
+        # it answers with the wallet the first run made instead of making another
+        if network_code not in NETWORK_CODES:
+            return {'text': "❌ Invalid network selection!"}
+        if request_id is not None:
+            created = await self._created_by(request_id)
+            if created is not None:
+                return created
+
+        currency, network_name = NETWORK_CODES[network_code]
+        wallet_manager = self.wallets.get(currency)
+        if not wallet_manager:
+            return {'text': f"❌ {network_name} wallet service not available!"}
+
+        await self.db.add_user(user_id, username)
+
+        # Create wallet: next HD address from the user's seed, else from the
+        # pre-generated key pool when it is enabled, else a standalone key
+        if Config.HD_WALLETS:
+            sealed_seed = await self.db.get_user_seed(user_id)
+            if sealed_seed is None:
+                # First HD wallet: insert-if-absent, so a concurrent /create's seed may win
+                from wallets.hd import generate_mnemonic
+                new_seed = await self.vault.run(lambda: self.vault.seal(generate_mnemonic(), seed_context(user_id)))
+                sealed_seed = await self.db.get_user_seed(user_id, new_seed)
+            index = await self.db.reserve_hd_index(user_id, HD_INDEX_SEQUENCES.get(currency, currency))
+
+            def derive():
+                # Unseal the seed, derive and seal the new key in one trip to the executor
+                wallet_data = wallet_manager.derive_wallet(self.vault.open(sealed_seed, seed_context(user_id)), index)
+                return wallet_data, self.vault.seal(wallet_data['private_key'], wallet_context(wallet_data['address']))
+            wallet_data, private_key = await self.balance_engine.run_blocking(derive)
+            # The seed lives once in user_seeds, not on every wallet row
+            mnemonic = None
+        else:
+            if self.provisioner.pool_size:
+                wallet_data = (await self.provisioner.take(currency))[0]
+            else:
+                wallet_data = await self.balance_engine.call(currency, 'create_wallet')
+            private_key, mnemonic = await self.vault.seal_async(
+                (wallet_data['private_key'], wallet_context(wallet_data['address'], 'private_key')),
+                (wallet_data.get('mnemonic'), wallet_context(wallet_data['address'], 'mnemonic'))
+            )
+
+        # Save to database
+        try:
+            await self.db.add_wallet(
+                user_id=user_id,
+                network=network_name,
+                currency=currency,
+                address=wallet_data['address'],
+                private_key=private_key,
+                public_key=wallet_data.get('public_key', ''),
+                mnemonic=mnemonic,
+                derivation_index=wallet_data.get('derivation_index'),
+                request_id=request_id
+            )
+        except Exception:
+            # Another run of the same job got there first
+            created = await self._created_by(request_id) if request_id is not None else None
+            if created is None:
+                raise
+            return created
+        return self._created(currency, network_name, wallet_data['address'], wallet_data['private_key'])
+
+    async def _created_by(self, request_id: str) -> Optional[Dict[str, Any]]:
+        row = await self.db.get_wallet_by_request(request_id)
+        if row is None:
+            return None
+        currency, network_name, address, sealed_key = row
+        private_key = await self.vault.open_async(sealed_key, wallet_context(address))
+        return self._created(currency, network_name, address, private_key)
+
+    @staticmethod
+    def _created(currency: str, network_name: str, address: str, private_key: str) -> Dict[str, Any]:
+        # Send wallet info
+        message = f"""
+**✅ {network_name} Wallet Created!**
+
+**Address:** `{address}`
+**Network:** {network_name} ({currency})
+
+**⚠️ IMPORTANT SECURITY WARNING ⚠️**
+- Keep your private key secret!
+- Never share it with anyone
+- Store it securely offline
+- This bot is for testing only
+
+**Private Key:** `{private_key[:20]}...` (truncated for security)
+
+Use /wallets to see all your wallets.
+"""
+        return {
+            'text': message,
+            'currency': currency,
+            'network': network_name,
+            'address': address
+        }
+
+    async def transaction_report(self, currency: str, tx_hash: str) -> Dict[str, Any]:
+        if currency not in self.wallets:
+            return {'text': f"❌ Unsupported network: {currency}"}
+        if hasattr(self.wallets.get(currency), 'get_transactions'):
+            tx = (await self.balance_engine.call(currency, 'get_transactions', [tx_hash]))[tx_hash]
+        else:
+            tx = await self.balance_engine.call(currency, 'get_transaction', tx_hash)
+        if tx.get('error'):
+            return {'text': f"❌ Could not look up transaction: {tx['error']}"}
+        if tx.get('blockNumber') is None:
+            return {'text': f"⏳ `{tx_hash}` is not in a block yet."}
+        if tx.get('status') == 0:
+            state = "❌ Failed"
+        elif tx.get('confirmations', 0) >= Config.MIN_CONFIRMATIONS:
+            state = "✅ Confirmed"
+        else:
+            state = "⏳ Pending"
+        return {
+            'text': f"**{currency} transaction**\n`{tx_hash}`\n"
+                    f"Status: {state}\n"
+                    f"Block: {tx['blockNumber']}\n"
+                    f"Confirmations: {tx.get('confirmations', 0)}"
+        }
+
+    async def start(self, jobs: bool = True, background: bool = True):
+        # Worker processes serve jobs only (background=False): the deposit watcher and
+        # ledger reconciler run once, in the bot process. A front-end that hands its jobs
+        # to workers (jobs=False) has no use for a key pool
+        await self.db.connect()
+        if not self.vault.enabled:
+            print("⚠️ VAULT_MASTER_KEY is not set: private keys and seeds are stored unencrypted")
+        if jobs:
+            self.provisioner.start()
+        if background:
+            await self.watcher.start()
+            self.feeds.start()
+            self.ledger.start()
+
+    async def close(self):
+        await self.reports.stop()
+        await self.wallets.close()
+        await self.feeds.stop()
+        await self.ledger.stop()
+        await self.watcher.stop()
+        self.balance_engine.close()
+        await self.provisioner.close()
+        await self.db.close()
+        self.vault.close()
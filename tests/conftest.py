@@ -0,0 +1,8 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# config.Config reads the Telegram credentials at import; none of the tests talk to Telegram
+for name, value in (('API_ID', '1'), ('API_HASH', 'test'), ('BOT_TOKEN', 'test')):
+    os.environ.setdefault(name, value)
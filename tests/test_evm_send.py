@@ -0,0 +1,86 @@
+import asyncio
+import pytest
+from eth_account import Account
+
+from wallets.evm_batch import RPCError
+from wallets.evm_send import EVMSender, transaction_hash
+
+ACCOUNT = Account.from_key(b'\x01' * 32)
+
+class FakeBatch:
+    # Answers an EVMSender's batches; eth_sendRawTransaction takes its answers from `script`
+    # in order, where exceptions other than RPCError are raised as transport failures
+    def __init__(self, script, known=None, count: int = 5):
+        self.script = list(script)
+        self.known = known
+        self.count = count
+        self.sent = []
+
+    async def batch(self, calls):
+        results = []
+        for method, params in calls:
+            if method == 'eth_getTransactionCount':
+                results.append(hex(self.count))
+            elif method == 'eth_feeHistory':
+                results.append({'baseFeePerGas': ['0x1', '0x1'], 'oldestBlock': '0x1', 'reward': [['0x1']]})
+            elif method == 'eth_gasPrice':
+                results.append('0x1')
+            elif method == 'eth_getCode':
+                results.append('0x')
+            elif method == 'eth_estimateGas':
+                results.append(hex(21000))
+            elif method == 'eth_getTransactionByHash':
+                results.append(self.known)
+            elif method == 'eth_sendRawTransaction':
+                self.sent.append(bytes.fromhex(params[0][2:]))
+                result = self.script.pop(0)
+                if isinstance(result, BaseException) and not isinstance(result, RPCError):
+                    raise result
+                results.append(result)
+        return results
+
+async def sign(tx):
+    return EVMSender.sign(tx, ACCOUNT.key)
+
+def send(batch):
+    # (tx hash or exception, the nonce the next send would get)
+    async def main():
+        sender = EVMSender(batch, 1)
+        try:
+            result = await sender.send(ACCOUNT.address, ACCOUNT.address, 1, None, sign)
+        except Exception as e:
+            result = e
+        return result, await sender.nonces.reserve(ACCOUNT.address)
+    return asyncio.run(main())
+
+def test_broadcast():
+    batch = FakeBatch(['0xabc'])
+    assert send(batch) == ('0xabc', 6)
+    assert len(batch.sent) == 1
+
+def test_already_known_is_success():
+    # A retried broadcast that had already landed
+    batch = FakeBatch([RPCError({'message': 'already known'})])
+    assert send(batch) == (transaction_hash(batch.sent[0]), 6)
+
+def test_rejection_releases_the_nonce():
+    result, next_nonce = send(FakeBatch([RPCError({'message': 'insufficient funds'})]))
+    assert isinstance(result, RPCError)
+    assert next_nonce == 5
+
+@pytest.mark.parametrize('failure', [asyncio.TimeoutError(), RPCError('missing response')])
+def test_unknown_delivery_keeps_the_nonce(failure):
+    # The transaction may sit in a mempool, so its nonce is not handed out again
+    result, next_nonce = send(FakeBatch([failure]))
+    assert isinstance(result, (asyncio.TimeoutError, ConnectionError))
+    assert next_nonce == 6
+
+def test_nonce_too_low_for_our_own_transaction():
+    batch = FakeBatch([RPCError({'message': 'nonce too low'})], known={'hash': '0x1'})
+    assert send(batch) == (transaction_hash(batch.sent[0]), 6)
+    assert len(batch.sent) == 1
+
+def test_nonce_too_low_resyncs_and_retries():
+    batch = FakeBatch([RPCError({'message': 'nonce too low'}), '0xdef'])
+    assert send(batch)[0] == '0xdef'
+    assert len(batch.sent) == 2
@@ -0,0 +1,68 @@
+import pytest
+from eth_account import Account
+
+from wallets import hd
+from wallets.hd import HDKeychain, child_key, clear_keychains, get_keychain, master_key, mnemonic_to_seed, parse_path
+
+# BIP32 test vector 1: path -> (private key, chain code)
+SEED_1 = bytes.fromhex("000102030405060708090a0b0c0d0e0f")
+VECTOR_1 = {
+    "m": ("e8f32e723decf4051aefac8e2c93c9c5b214313817cdb01a1494b917c8436b35",
+          "873dff81c02f525623fd1fe5167eac3a55a049de3d314bb42ee227ffed37d508"),
+    "m/0'": ("edb2e14f9ee77d26dd93b4ecede8d16ed408ce149b6cd80b0715a2d911a0afea",
+             "47fdacbd0f1097043b78c63c20c34ef4ed9a111d980047ad16282c7ae6236141"),
+    "m/0'/1": ("3c6cb8d0f6a264c91ea8b5030fadaa8e538b020f0a387421a12de9319dc93368",
+               "2a7857631386ba23dacac34180dd1983734e444fdbf774041578e9b6adb37c19"),
+    "m/0'/1/2'": ("cbce0d719ecf7431d88e6a89fa1483e02e35092af60c042b1df2ff59fa424dca",
+                  "04466b9cc8e161e966409ca52986c584f07e9dc81f735db683c3ff6ec7b1503f"),
+    "m/0'/1/2'/2": ("0f479245fb19a38a1954c5c7c0ebab2f9bdfd96a17563ef28a6a4b1a2a764ef4",
+                    "cfb71883f01676f587d023cc53a35bc7f88f724b1f8c2892ac1275ac822a3edd"),
+    "m/0'/1/2'/2/1000000000": ("471b76e389e528d6de6d816857e012c5455051cad6660850e58372a6c3e6e7c8",
+                               "c783e67b921d2beb8f6b389cc646d7263b4145701dadd2161548a8b078e65e9e"),
+}
+
+# BIP39 reference vector (Trezor's vectors.json)
+MNEMONIC = "abandon " * 11 + "about"
+
+def test_parse_path():
+    assert parse_path("m") == ()
+    assert parse_path("m/44'/60h/0'/0/7") == (44 + hd.HARDENED, 60 + hd.HARDENED, hd.HARDENED, 0, 7)
+    with pytest.raises(ValueError):
+        parse_path("44'/0")
+
+@pytest.mark.parametrize("path", list(VECTOR_1))
+def test_bip32_vector_1(path):
+    node = master_key(SEED_1)
+    for index in parse_path(path):
+        node = child_key(node, index)
+    private_key, chain_code = VECTOR_1[path]
+    assert node == (int(private_key, 16), bytes.fromhex(chain_code))
+
+def test_keychain_reuses_parents():
+    # Leaves come out the same whether their parents were derived or cached
+    keychain = HDKeychain(SEED_1)
+    for path in ["m/0'/1/2'/2/1000000000", "m/0'/1/2'/2", "m/0'/1", "m"]:
+        assert keychain.derive(path).hex() == VECTOR_1[path][0]
+    assert (hd.HARDENED, 1, 2 + hd.HARDENED, 2) in keychain._nodes
+    assert (hd.HARDENED, 1, 2 + hd.HARDENED, 2, 1000000000) not in keychain._nodes
+
+def test_bip39_seed():
+    assert mnemonic_to_seed(MNEMONIC, "TREZOR").hex() == (
+        "c55257c360c07c72029aebc1b53c05ed0362ada38ead3e3e9efa3708e53495531f"
+        "09a6987599d18264c1e1c92f2cf141630c7a3c4ab7c81b2f001698e7463b04"
+    )
+
+def test_bip44_ethereum_address():
+    private_key = HDKeychain(mnemonic_to_seed(MNEMONIC)).derive("m/44'/60'/0'/0/0")
+    assert Account.from_key(private_key).address == "0x9858EfFD232B4033E47d90003D41EC34EcaEda94"
+
+def test_keychain_cache_expires(monkeypatch):
+    clear_keychains()
+    keychain = get_keychain(MNEMONIC)
+    assert get_keychain(MNEMONIC) is keychain
+    monkeypatch.setattr(hd.Config, 'VAULT_CACHE_TTL', 0)
+    clear_keychains()
+    keychain = get_keychain(MNEMONIC)
+    assert get_keychain(MNEMONIC) is not keychain
+    clear_keychains()
+    assert not hd._keychains
@@ -0,0 +1,78 @@
+import asyncio
+import pytest
+
+from jobqueue import JobError, MemoryJobQueue, SQLiteJobQueue
+
+def run_queues(tmp_path, check, count: int = 2, **kwargs):
+    # Several SQLiteJobQueue handles on one file, as the front-end and the workers have
+    async def main():
+        queues = [SQLiteJobQueue(str(tmp_path / 'jobs.db'), poll_interval=0.01, **kwargs) for _ in range(count)]
+        for queue in queues:
+            await queue.start()
+        try:
+            await check(*queues)
+        finally:
+            for queue in queues:
+                await queue.close()
+    asyncio.run(main())
+
+def test_visibility_timeout_must_be_shorter_than_ttl(tmp_path):
+    with pytest.raises(ValueError):
+        SQLiteJobQueue(str(tmp_path / 'jobs.db'), ttl=10, visibility_timeout=10)
+    assert SQLiteJobQueue(str(tmp_path / 'jobs.db'), ttl=30).visibility_timeout == 20
+
+def test_result_and_error(tmp_path):
+    async def check(front, worker):
+        call = asyncio.ensure_future(front.call('balance', {'user_id': 1}))
+        (job,) = await worker.next_jobs(timeout=1)
+        assert (job['kind'], job['payload']) == ('balance', {'user_id': 1})
+        await worker.complete(job, {'text': 'ok'})
+        assert await call == {'text': 'ok'}
+
+        call = asyncio.ensure_future(front.call('tx', {}))
+        (job,) = await worker.next_jobs(timeout=1)
+        await worker.complete(job, error='node down')
+        with pytest.raises(JobError, match='node down'):
+            await call
+    run_queues(tmp_path, check)
+
+def test_slow_job_keeps_its_lease(tmp_path):
+    # Running past visibility_timeout is fine while the worker renews its claim
+    async def check(front, worker, other):
+        call = asyncio.ensure_future(front.call('balance', {}))
+        (job,) = await worker.next_jobs(timeout=1)
+        await asyncio.sleep(0.5)
+        assert await other.next_jobs(timeout=0.1) == []
+        await worker.complete(job, {'text': 'slow'})
+        assert await call == {'text': 'slow'}
+    run_queues(tmp_path, check, count=3, ttl=1.0, visibility_timeout=0.2)
+
+def test_dead_worker_job_is_requeued(tmp_path):
+    async def check(front, dead, live):
+        call = asyncio.ensure_future(front.call('balance', {}))
+        (claimed,) = await dead.next_jobs(timeout=1)
+        # The worker dies: its claim stops being renewed
+        dead._renewer.cancel()
+        (job,) = await live.next_jobs(timeout=1)
+        assert job['id'] == claimed['id']
+        # The dead worker's late result is dropped; the current claim's is kept
+        await dead.complete(claimed, {'text': 'stale'})
+        await live.complete(job, {'text': 'fresh'})
+        assert await call == {'text': 'fresh'}
+    run_queues(tmp_path, check, count=3, ttl=2.0, visibility_timeout=0.2)
+
+def test_abandoned_job_is_not_run(tmp_path):
+    async def check(front, worker):
+        with pytest.raises(asyncio.TimeoutError):
+            await front.call('balance', {}, timeout=0.05)
+        assert await worker.next_jobs(timeout=0.1) == []
+    run_queues(tmp_path, check)
+
+def test_memory_queue():
+    async def main():
+        queue = MemoryJobQueue()
+        call = asyncio.ensure_future(queue.call('balance', {'user_id': 1}))
+        (job,) = await queue.next_jobs(timeout=1)
+        await queue.complete(job, {'text': 'ok'})
+        assert await call == {'text': 'ok'}
+    asyncio.run(main())
@@ -0,0 +1,97 @@
+import asyncio
+
+from balances import BalanceEngine
+from database import open_database
+from ledger import BalanceLedger
+
+class Backend:
+    def __init__(self, balances):
+        self.balances = balances
+        self.head = 100
+
+    async def get_block_number(self):
+        return self.head
+
+    async def get_balances(self, addresses):
+        return {address: self.balances[address] for address in addresses}
+
+class PinnedBackend(Backend):
+    # Reads balances at a block, like the EVM backends
+    def __init__(self, balances):
+        super().__init__(balances)
+        self.read_at = []
+
+    async def get_balances_at(self, addresses, block):
+        self.read_at.append(block)
+        return await self.get_balances(addresses)
+
+class ConfirmedBackend(Backend):
+    # Electrum-style: no reads at a block, but confirmed-only balances; the head can move
+    # during a read
+    def __init__(self, balances, unconfirmed, heads):
+        super().__init__(balances)
+        self.unconfirmed = unconfirmed
+        self.heads = iter(heads)
+
+    async def get_block_number(self):
+        return next(self.heads)
+
+    async def get_balances(self, addresses):
+        return {address: self.balances[address] + self.unconfirmed for address in addresses}
+
+    async def get_confirmed_balances(self, addresses):
+        return {address: self.balances[address] for address in addresses}
+
+class Watcher:
+    def __init__(self, networks):
+        self.networks = networks
+
+def run_ledger(tmp_path, wallets, check):
+    async def main():
+        db = open_database(f"sqlite:///{tmp_path / 'wallets.db'}", pool_size=2)
+        await db.connect()
+        engine = BalanceEngine(wallets)
+        try:
+            await db.add_user(1, "alice")
+            for currency, backend in wallets.items():
+                for address in backend.balances:
+                    await db.add_wallet(1, currency.lower(), currency, address, 'key', 'pub')
+            await check(db, BalanceLedger(db, engine, Watcher(list(wallets))))
+        finally:
+            engine.executor.shutdown(wait=False)
+            await db.close()
+    asyncio.run(main())
+
+def test_reconcile_pins_reads_to_the_head(tmp_path):
+    backend = PinnedBackend({'0xA': 1.5, '0xB': 0.0})
+
+    async def check(db, ledger):
+        await ledger.reconcile('ETH')
+        assert backend.read_at == [100]
+        assert await ledger.get_user_balances(1) == {('ETH', '0xA'): (1.5, 100), ('ETH', '0xB'): (0.0, 100)}
+        assert ledger.drift_corrections == 0
+
+        # A fee the deltas never saw is corrected on the next pass
+        backend.balances['0xA'] = 1.4
+        backend.head = 105
+        await ledger.reconcile('ETH')
+        assert (await ledger.get_user_balances(1))[('ETH', '0xA')] == (1.4, 105)
+        assert ledger.drift_corrections == 1
+    run_ledger(tmp_path, {'ETH': backend}, check)
+
+def test_reconcile_reads_confirmed_funds_on_a_steady_head(tmp_path):
+    # The first read sees the head move and is retried; mempool funds are left out
+    backend = ConfirmedBackend({'bc1a': 0.25}, unconfirmed=1.0, heads=[10, 11, 11, 11])
+
+    async def check(db, ledger):
+        await ledger.reconcile('BTC')
+        assert await ledger.get_user_balances(1) == {('BTC', 'bc1a'): (0.25, 11)}
+    run_ledger(tmp_path, {'BTC': backend}, check)
+
+def test_reconcile_skips_when_the_head_keeps_moving(tmp_path):
+    backend = ConfirmedBackend({'bc1a': 0.25}, unconfirmed=0.0, heads=range(10, 20))
+
+    async def check(db, ledger):
+        await ledger.reconcile('BTC')
+        assert await ledger.get_user_balances(1) == {}
+    run_ledger(tmp_path, {'BTC': backend}, check)
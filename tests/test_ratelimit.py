@@ -0,0 +1,75 @@
+import asyncio
+import time
+
+from ratelimit import FairScheduler, MemoryStore, RateLimiter
+
+def test_refused_call_takes_no_tokens():
+    async def main():
+        store = MemoryStore()
+        limiter = RateLimiter({'*': (2, 60.0), 'balance': (1, 60.0)}, store)
+        assert await limiter.check(1, 'balance') == 0
+        # Refused by the per-command bucket: the per-user budget must be left alone
+        for _ in range(5):
+            assert await limiter.check(1, 'balance') > 0
+        assert await limiter.check(1, 'wallets') == 0
+        # Now '*' is empty and refuses every command
+        assert await limiter.check(1, 'wallets') > 0
+        assert await limiter.check(2, 'wallets') == 0
+        assert await RateLimiter({}, store).check(1, 'balance') == 0
+    asyncio.run(main())
+
+def test_bucket_refills():
+    async def main():
+        store = MemoryStore()
+        assert await store.take([('k', 1, 0.05)]) == 0
+        wait = await store.take([('k', 1, 0.05)])
+        assert 0 < wait <= 0.05
+        await asyncio.sleep(wait)
+        assert await store.take([('k', 1, 0.05)]) == 0
+    asyncio.run(main())
+
+def test_fair_order():
+    # A light caller's single call overtakes a heavy caller's backlog
+    async def main():
+        scheduler = FairScheduler('endpoint', capacity=1)
+        order = []
+
+        async def call(caller, n):
+            async with scheduler.slot(caller):
+                order.append((caller, n))
+                await asyncio.sleep(0.01)
+
+        await asyncio.gather(*(call('heavy', n) for n in range(4)), call('light', 0))
+        assert order.index(('light', 0)) <= 2
+    asyncio.run(main())
+
+def test_aimd():
+    async def main():
+        scheduler = FairScheduler('endpoint', capacity=8)
+        scheduler.throttled(retry_after=0.05)
+        assert scheduler.limit == 4 and scheduler.stats()['paused_for'] > 0
+        scheduler.throttled(retry_after=0.05)
+        assert scheduler.limit == 2
+        for _ in range(100):
+            scheduler.success()
+        assert scheduler.limit == 8
+
+        started = time.time()
+        async with scheduler.slot('user'):
+            pass
+        assert time.time() - started >= 0.04
+    asyncio.run(main())
+
+def test_backoff_is_shared_without_the_url():
+    async def main():
+        store = MemoryStore()
+        url = 'https://mainnet.example.com/v3/secret-api-key'
+        first = FairScheduler(url, store=store)
+        first.throttled(retry_after=30)
+        await asyncio.sleep(0)
+        assert not any('secret-api-key' in name for name in store._backoff)
+
+        second = FairScheduler(url, store=store)
+        await second._sync_backoff()
+        assert second.paused_until == first.paused_until
+    asyncio.run(main())
@@ -0,0 +1,62 @@
+import asyncio
+
+from benchmarks.mock_rpc import MockElectrumServer
+from wallets.bitcoin import ElectrumBitcoinWallet
+from wallets.utxo import script_hash
+
+ADDRESSES = ['1BvBMSEYstWetqTFn5Au4m4GFg7xJaNVN2', '1A1zP1eP5QGefi2DMPTfTL5SLmv7DivfNa']
+
+def run_wallet(check):
+    async def main():
+        server = MockElectrumServer(latency=0.001, jitter=0)
+        await server.start()
+        wallet = ElectrumBitcoinWallet(server.url)
+        try:
+            await check(server, wallet)
+        finally:
+            await wallet.close()
+            await server.close()
+    asyncio.run(main())
+
+def expected(server, address):
+    return sum(utxo['value'] for utxo in server.utxos(script_hash(address, 'bitcoin'))) / 100000000
+
+def test_balances_from_index():
+    async def check(server, wallet):
+        balances = await wallet.get_balances(ADDRESSES)
+        assert balances == {address: expected(server, address) for address in ADDRESSES}
+        listed = server.requests['blockchain.scripthash.listunspent']
+        # Subscribed and unchanged: answered from memory
+        assert await wallet.get_balances(ADDRESSES) == balances
+        assert server.requests['blockchain.scripthash.listunspent'] == listed
+        assert wallet.utxos.stats()['subscribed'] == len(ADDRESSES)
+    run_wallet(check)
+
+def test_notification_relists_only_that_address():
+    async def check(server, wallet):
+        await wallet.get_balances(ADDRESSES)
+        listed = server.requests['blockchain.scripthash.listunspent']
+        server.notify(script_hash(ADDRESSES[0], 'bitcoin'))
+        for _ in range(100):
+            if wallet.utxos.notified:
+                break
+            await asyncio.sleep(0.01)
+        await wallet.get_balances(ADDRESSES)
+        assert server.requests['blockchain.scripthash.listunspent'] == listed + 1
+    run_wallet(check)
+
+def test_spend_applies_ahead_of_notification():
+    async def check(server, wallet):
+        (address,) = ADDRESSES[:1]
+        coins = (await wallet.utxos.get_utxos([address]))[address]
+        wallet.utxos.spend(address, coins[:1])
+        assert (await wallet.utxos.get_utxos([address]))[address] == coins[1:]
+    run_wallet(check)
+
+def test_confirmed_balances():
+    async def check(server, wallet):
+        assert await wallet.get_confirmed_balances(ADDRESSES) == {
+            address: expected(server, address) for address in ADDRESSES
+        }
+        assert await wallet.get_block_number() == server.head()
+    run_wallet(check)
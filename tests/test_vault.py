@@ -0,0 +1,94 @@
+import asyncio
+import pytest
+
+from database import open_database
+from vault import KeyVault, PREFIX, _unb64, generate_master_key, rotate, seed_context, wallet_context
+
+def new_vault(keys, current):
+    return KeyVault({key_id: _unb64(key) for key_id, key in keys.items()}, current)
+
+KEYS = {'a': generate_master_key(), 'b': generate_master_key()}
+
+def test_seal_and_open():
+    vault = new_vault(KEYS, 'a')
+    sealed = vault.seal("private key", wallet_context("0xA"))
+    assert sealed.startswith(f"{PREFIX}:a:") and "private key" not in sealed
+    assert vault.seal("private key", wallet_context("0xA")) != sealed  # fresh data key and nonce
+    assert vault.open(sealed, wallet_context("0xA")) == "private key"
+    # Sealing is idempotent, and None passes through
+    assert vault.seal(sealed, wallet_context("0xA")) == sealed
+    assert vault.seal(None, wallet_context("0xA")) is None
+    vault.close()
+
+def test_sealed_value_is_bound_to_its_row():
+    vault = new_vault(KEYS, 'a')
+    sealed = vault.seal("private key", wallet_context("0xA"))
+    with pytest.raises(ValueError):
+        vault.open(sealed, wallet_context("0xB"))
+    with pytest.raises(ValueError):
+        vault.open(sealed, wallet_context("0xA", 'mnemonic'))
+    with pytest.raises(ValueError):
+        vault.open(vault.seal("words", seed_context(1)), seed_context(2))
+    vault.close()
+
+def test_legacy_and_disabled():
+    vault = new_vault(KEYS, None)
+    assert not vault.enabled
+    assert vault.seal("plain", seed_context(1)) == "plain"
+    assert vault.open("plain", seed_context(1)) == "plain"
+    with pytest.raises(KeyError):
+        new_vault({}, None).open(new_vault(KEYS, 'a').seal("x", seed_context(1)), seed_context(1))
+    vault.close()
+
+def test_data_key_cache():
+    vault = new_vault(KEYS, 'a')
+    sealed = vault.seal("words", seed_context(1))
+    for _ in range(3):
+        assert vault.open(sealed, seed_context(1)) == "words"
+    assert (vault.misses, vault.hits) == (1, 2)
+    vault.cache_ttl = 0
+    vault._cache.clear()
+    vault.open(sealed, seed_context(1))
+    vault.open(sealed, seed_context(1))
+    assert vault.misses == 3
+    vault.close()
+
+def test_rewrap_keeps_ciphertext():
+    old, new = new_vault(KEYS, 'a'), new_vault(KEYS, 'b')
+    sealed = old.seal("private key", wallet_context("0xA"))
+    rewrapped = new.rewrap(sealed, wallet_context("0xA"))
+    assert rewrapped.split(':')[1] == 'b'
+    assert rewrapped.split(':')[3] == sealed.split(':')[3]
+    assert new.rewrap(rewrapped, wallet_context("0xA")) == rewrapped
+    assert new.open(rewrapped, wallet_context("0xA")) == "private key"
+    old.close()
+    new.close()
+
+def test_rotate(tmp_path):
+    old, new = new_vault(KEYS, 'a'), new_vault(KEYS, 'b')
+
+    async def main():
+        db = open_database(f"sqlite:///{tmp_path / 'wallets.db'}", pool_size=2)
+        await db.connect()
+        try:
+            await db.add_user(1, "alice")
+            await db.add_wallet(1, 'ethereum', 'ETH', '0xA', old.seal("key a", wallet_context('0xA')), 'pub', None)
+            await db.add_wallet(1, 'ethereum', 'ETH', '0xB', "legacy key", 'pub', "legacy words")
+            await db.get_user_seed(1, old.seal("seed words", seed_context(1)))
+
+            assert await rotate(db, new, batch_size=1) == 3
+            rows = [tuple(row) for row in await db.get_wallet_keys_batch(0, 10)]
+            assert [new.open(row[2], wallet_context(row[1])) for row in rows] == ["key a", "legacy key"]
+            assert new.open(rows[1][3], wallet_context('0xB', 'mnemonic')) == "legacy words"
+            assert all(row[2].split(':')[1] == 'b' for row in rows)
+            assert new.open(await db.get_user_seed(1), seed_context(1)) == "seed words"
+            # Everything is under the current key now
+            assert await rotate(db, new) == 0
+        finally:
+            await db.close()
+
+    asyncio.run(main())
+    with pytest.raises(ValueError):
+        asyncio.run(rotate(None, new_vault(KEYS, None)))
+    old.close()
+    new.close()
@@ -0,0 +1,89 @@
+import asyncio
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from config import Config
+from database import Storage
+
+class TokenRegistry:
+    # Token balances for the networks in the registry. Contract metadata never changes
+    # on-chain, so it is looked up once, persisted, and served from memory afterwards
+    def __init__(self, db: Storage, balance_engine, tokens: Optional[Dict[str, Dict[str, str]]] = None):
+        self.db = db
+        self.engine = balance_engine
+        self.tokens = tokens if tokens is not None else Config.TOKENS
+        # (currency, contract) -> {'symbol', 'name', 'decimals'}
+        self.metadata: Dict[Tuple[str, str], Dict[str, Any]] = {}
+        self._loaded = False
+
+    @property
+    def networks(self) -> List[str]:
+        return [currency for currency, tokens in self.tokens.items() if tokens and currency in self.engine.wallets]
+
+    async def load(self):
+        for currency, contract, symbol, name, decimals in await self.db.get_token_metadata():
+            self.metadata[(currency, contract)] = {'symbol': symbol, 'name': name, 'decimals': decimals}
+        self._loaded = True
+
+    async def get_metadata(self, currency: str) -> Dict[str, Dict[str, Any]]:
+        # contract -> metadata for every registered token on the network that resolved
+        if not self._loaded:
+            await self.load()
+        contracts = list(self.tokens.get(currency, {}).values())
+        missing = [contract for contract in contracts if (currency, contract) not in self.metadata]
+        if missing:
+            fetched = await asyncio.wait_for(
+                self.engine.call(currency, 'get_token_metadata', missing),
+                self.engine.timeout
+            )
+            for contract, metadata in fetched.items():
+                self.metadata[(currency, contract)] = metadata
+            if fetched:
+                await self.db.add_token_metadata([
+                    (currency, contract, metadata['symbol'], metadata['name'], metadata['decimals'])
+                    for contract, metadata in fetched.items()
+                ])
+        return {
+            contract: self.metadata[(currency, contract)]
+            for contract in contracts if (currency, contract) in self.metadata
+        }
+
+    async def fetch_balances(self, currency: str, addresses: List[str]) -> Dict[str, Dict[str, float]]:
+        # Uncached; get_balances() is the cached entry point
+        metadata = await self.get_metadata(currency)
+        symbols = {contract: symbol for symbol, contract in self.tokens[currency].items()}
+        raw = await asyncio.wait_for(
+            self.engine.call(currency, 'get_token_balances', list(metadata), addresses),
+            self.engine.timeout
+        )
+        balances: Dict[str, Dict[str, float]] = {}
+        for (contract, address), amount in raw.items():
+            balances.setdefault(address, {})[symbols[contract]] = amount / 10 ** metadata[contract]['decimals']
+        return balances
+
+    async def get_balances(self, currency: str, addresses: List[str]) -> Dict[str, Dict[str, float]]:
+        # address -> {symbol: amount}: every token for every address in one aggregated call,
+        # cached next to the native balances under a per-network token key
+        if currency not in self.networks:
+            return {}
+        return await self.engine.cache.get_or_fetch_many(
+            f"{currency}:TOKENS", addresses,
+            lambda missing: self.fetch_balances(currency, missing)
+        )
+
+    async def get_user_balances(self, wallets: Iterable[Tuple[str, str]]) -> Dict[Tuple[str, str], Dict[str, float]]:
+        # (currency, address) pairs -> {symbol: amount}; a failing network is left out
+        by_network: Dict[str, List[str]] = {}
+        for currency, address in wallets:
+            if currency in self.networks:
+                by_network.setdefault(currency, []).append(address)
+        results = await asyncio.gather(
+            *(self.get_balances(currency, addresses) for currency, addresses in by_network.items()),
+            return_exceptions=True
+        )
+        balances = {}
+        for currency, result in zip(by_network, results):
+            if isinstance(result, Exception):
+                print(f"Token balance error ({currency}): {result}")
+                continue
+            for address, tokens in result.items():
+                balances[(currency, address)] = tokens
+        return balances
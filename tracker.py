@@ -0,0 +1,179 @@
+import asyncio
+import heapq
+import itertools
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+from config import Config
+from database import Storage
+
+class TransactionTracker:
+    # Follows outgoing transactions until they reach min_confirmations. Pending hashes sit
+    # in a heap ordered by next check time; each round reads the head once per network
+    # and looks up every due transaction of that network in batches
+    def __init__(self, db: Storage, balance_engine, min_confirmations: Optional[int] = None,
+                 batch_size: int = 100, max_age: float = 86400.0):
+        self.db = db
+        self.engine = balance_engine
+        self.min_confirmations = min_confirmations or Config.MIN_CONFIRMATIONS
+        self.batch_size = batch_size
+        self.max_age = max_age  # never mined after this many seconds: reported as dropped
+        self.heap: List[Tuple[float, int, str, str]] = []  # (next check, seq, currency, tx_hash)
+        self.pending: Dict[Tuple[str, str], Dict[str, Any]] = {}
+        self.heads: Dict[str, Tuple[int, float]] = {}  # currency -> (head, fetched at)
+        self.listeners: List[Callable[[int, str, Dict[str, Any]], Awaitable[None]]] = []
+        self._seq = itertools.count()
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    def block_time(self, currency: str) -> float:
+        return getattr(self.engine.wallets.get(currency), 'block_time', 15.0)
+
+    def _schedule(self, currency: str, tx_hash: str, delay: float):
+        entry = self.pending[(currency, tx_hash)]
+        entry['next_check'] = time.monotonic() + delay
+        heapq.heappush(self.heap, (entry['next_check'], next(self._seq), currency, tx_hash))
+
+    def _add(self, user_id: int, currency: str, tx_hash: str, block_number: Optional[int] = None,
+             confirmations: int = 0, delay: float = 0.0):
+        self.pending[(currency, tx_hash)] = {
+            'user_id': user_id,
+            'block_number': block_number,
+            'confirmations': confirmations or 0,
+            'added': time.monotonic()
+        }
+        self._schedule(currency, tx_hash, delay)
+
+    async def load(self):
+        for user_id, currency, tx_hash, block_number, confirmations in await self.db.get_pending_transactions():
+            self._add(user_id, currency, tx_hash, block_number, confirmations)
+
+    async def track(self, user_id: int, currency: str, tx_hash: str, from_address: str,
+                    to_address: str, amount: float, network: Optional[str] = None):
+        await self.db.add_transaction(user_id, tx_hash, from_address, to_address, amount,
+                                      currency, network or currency)
+        # Nothing to see before the next block
+        self._add(user_id, currency, tx_hash, delay=self.block_time(currency))
+        self._wakeup.set()
+
+    def on_head(self, currency: str, head: int):
+        # Heads pushed by a chain feed: check() uses them instead of asking the node
+        self.heads[currency] = (head, time.monotonic())
+
+    async def head(self, currency: str) -> int:
+        # At most one head request per network per block time, however many txs are due
+        cached = self.heads.get(currency)
+        if cached is not None and time.monotonic() - cached[1] < self.block_time(currency):
+            return cached[0]
+        head = await self.engine.call(currency, 'get_block_number')
+        self.heads[currency] = (head, time.monotonic())
+        return head
+
+    async def _lookup(self, currency: str, tx_hashes: List[str], head: int) -> Dict[str, Dict[str, Any]]:
+        backend = self.engine.wallets[currency]
+        if hasattr(backend, 'get_transactions'):
+            return await self.engine.call(currency, 'get_transactions', tx_hashes, head)
+        results = await asyncio.gather(
+            *(self.engine.call(currency, 'get_transaction', tx_hash) for tx_hash in tx_hashes),
+            return_exceptions=True
+        )
+        return {
+            tx_hash: result if isinstance(result, dict) else {'error': str(result)}
+            for tx_hash, result in zip(tx_hashes, results)
+        }
+
+    async def check(self, currency: str, tx_hashes: List[str]):
+        head = await self.head(currency)
+        block_time = self.block_time(currency)
+        updates = []
+        finished = []
+        for i in range(0, len(tx_hashes), self.batch_size):
+            chunk = tx_hashes[i:i + self.batch_size]
+            transactions = await self._lookup(currency, chunk, head)
+            for tx_hash in chunk:
+                entry = self.pending[(currency, tx_hash)]
+                tx = transactions.get(tx_hash) or {}
+                block_number = tx.get('blockNumber')
+                if tx.get('error') or block_number is None:
+                    if time.monotonic() - entry['added'] > self.max_age:
+                        updates.append((None, 0, 'dropped', currency, tx_hash))
+                        finished.append((tx_hash, entry, 'dropped'))
+                    else:
+                        self._schedule(currency, tx_hash, block_time)
+                    continue
+
+                confirmations = max(head - block_number + 1, tx.get('confirmations') or 0, 0)
+                if tx.get('status') == 0:
+                    status = 'failed'
+                elif confirmations >= self.min_confirmations:
+                    status = 'confirmed'
+                else:
+                    status = 'pending'
+                if (block_number, confirmations) != (entry['block_number'], entry['confirmations']) or status != 'pending':
+                    updates.append((block_number, min(confirmations, self.min_confirmations), status, currency, tx_hash))
+                entry.update(block_number=block_number, confirmations=confirmations)
+                if status == 'pending':
+                    # No point looking again before the missing blocks can exist
+                    self._schedule(currency, tx_hash, block_time * (self.min_confirmations - confirmations))
+                else:
+                    finished.append((tx_hash, entry, status))
+
+        if updates:
+            await self.db.update_transactions(updates)
+        for tx_hash, entry, status in finished:
+            self.pending.pop((currency, tx_hash), None)
+            await self._notify(entry['user_id'], currency, {
+                'tx_hash': tx_hash,
+                'status': status,
+                'block_number': entry['block_number'],
+                'confirmations': entry['confirmations']
+            })
+
+    async def _notify(self, user_id: int, currency: str, tx: Dict[str, Any]):
+        for listener in self.listeners:
+            try:
+                await listener(user_id, currency, tx)
+            except Exception as e:
+                print(f"Transaction listener error: {e}")
+
+    def _due(self) -> Dict[str, List[str]]:
+        now = time.monotonic()
+        due: Dict[str, List[str]] = {}
+        while self.heap and self.heap[0][0] <= now:
+            next_check, _, currency, tx_hash = heapq.heappop(self.heap)
+            entry = self.pending.get((currency, tx_hash))
+            # Entries for finished or rescheduled transactions are skipped, not removed eagerly
+            if entry is None or entry['next_check'] != next_check:
+                continue
+            due.setdefault(currency, []).append(tx_hash)
+        return due
+
+    async def run(self):
+        while True:
+            due = self._due()
+            results = await asyncio.gather(
+                *(self.check(currency, tx_hashes) for currency, tx_hashes in due.items()),
+                return_exceptions=True
+            )
+            for (currency, tx_hashes), result in zip(due.items(), results):
+                if isinstance(result, Exception):
+                    print(f"Transaction tracker error ({currency}): {result}")
+                    for tx_hash in tx_hashes:
+                        if (currency, tx_hash) in self.pending:
+                            self._schedule(currency, tx_hash, self.block_time(currency))
+
+            timeout = max(self.heap[0][0] - time.monotonic(), 0) if self.heap else None
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    async def start(self):
+        await self.load()
+        if self._task is None:
+            self._task = asyncio.ensure_future(self.run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
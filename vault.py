@@ -0,0 +1,213 @@
+import asyncio
+import base64
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+from Crypto.Cipher import ChaCha20_Poly1305
+from config import Config
+
+PREFIX = 'enc1'
+
+def generate_master_key() -> str:
+    return base64.urlsafe_b64encode(os.urandom(32)).decode()
+
+def _encrypt(key: bytes, plaintext: bytes, aad: bytes = b'') -> bytes:
+    nonce = os.urandom(12)
+    cipher = ChaCha20_Poly1305.new(key=key, nonce=nonce)
+    cipher.update(aad)
+    ciphertext, tag = cipher.encrypt_and_digest(plaintext)
+    return nonce + ciphertext + tag
+
+def _decrypt(key: bytes, blob: bytes, aad: bytes = b'') -> bytes:
+    cipher = ChaCha20_Poly1305.new(key=key, nonce=blob[:12])
+    cipher.update(aad)
+    return cipher.decrypt_and_verify(blob[12:-16], blob[-16:])
+
+def _b64(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).decode()
+
+def _unb64(text: str) -> bytes:
+    return base64.urlsafe_b64decode(text.encode())
+
+def wallet_context(address: str, column: str = 'private_key') -> str:
+    return f"wallets.{column}:{address}"
+
+def seed_context(user_id: int) -> str:
+    return f"user_seeds.mnemonic:{user_id}"
+
+class KeyVault:
+    # Envelope encryption for private keys and mnemonics, all ChaCha20-Poly1305 (in
+    # pycryptodome a third of AES-GCM's per-value setup cost). Each value is sealed with its
+    # own random data key, stored beside the ciphertext wrapped under a master key:
+    #   enc1:<master key id>:<wrapped data key>:<ciphertext>
+    # The ciphertext is bound to the row and column it is stored in (wallet_context(),
+    # seed_context()) as associated data, so a sealed key copied onto another row - another
+    # user's wallet, say - fails to open instead of signing for it.
+    # Rotating the master key only re-wraps data keys. Values without the prefix are legacy
+    # plaintext and open as themselves; with no master key configured nothing is sealed.
+    # Unwrapped data keys are kept for cache_ttl seconds in a small LRU, so repeated opens
+    # (a user's HD seed on every /create, a wallet sending again) skip the unwrap
+    def __init__(self, keys: Dict[str, bytes], current: Optional[str] = None,
+                 cache_size: int = 1024, cache_ttl: float = 60.0, workers: int = 2):
+        self.keys = keys
+        self.current = current if current in keys else None
+        self.cache_size = cache_size
+        self.cache_ttl = cache_ttl
+        # wrapped data key -> (expires_at, data key), least recently used first
+        self._cache: "OrderedDict[str, Tuple[float, bytes]]" = OrderedDict()
+        self._lock = threading.Lock()  # opens run on executor threads
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='vault')
+        self.hits = 0
+        self.misses = 0
+
+    @classmethod
+    def from_config(cls) -> 'KeyVault':
+        encoded = dict(Config.VAULT_RETIRED_KEYS)
+        if Config.VAULT_MASTER_KEY:
+            encoded[Config.VAULT_KEY_ID] = Config.VAULT_MASTER_KEY
+        keys = {}
+        for key_id, key in encoded.items():
+            keys[key_id] = _unb64(key)
+            if len(keys[key_id]) != 32:
+                raise ValueError(f"Vault master key {key_id!r} must be 32 bytes of urlsafe base64")
+        return cls(
+            keys,
+            Config.VAULT_KEY_ID if Config.VAULT_MASTER_KEY else None,
+            cache_size=Config.VAULT_CACHE_SIZE,
+            cache_ttl=Config.VAULT_CACHE_TTL
+        )
+
+    @property
+    def enabled(self) -> bool:
+        return self.current is not None
+
+    def _data_key(self, key_id: str, wrapped: str) -> bytes:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._cache.get(wrapped)
+            if entry is not None and entry[0] > now:
+                self._cache.move_to_end(wrapped)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+        master = self.keys.get(key_id)
+        if master is None:
+            raise KeyError(f"Unknown vault master key {key_id!r}")
+        data_key = _decrypt(master, _unb64(wrapped), key_id.encode())
+        with self._lock:
+            self._cache[wrapped] = (now + self.cache_ttl, data_key)
+            self._cache.move_to_end(wrapped)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return data_key
+
+    def seal(self, value: Optional[str], context: str) -> Optional[str]:
+        # context names the row and column the value will be stored in
+        if value is None or not self.enabled or value.startswith(PREFIX + ':'):
+            return value
+        data_key = os.urandom(32)
+        wrapped = _encrypt(self.keys[self.current], data_key, self.current.encode())
+        ciphertext = _encrypt(data_key, value.encode(), context.encode())
+        return ':'.join((PREFIX, self.current, _b64(wrapped), _b64(ciphertext)))
+
+    def open(self, value: Optional[str], context: str) -> Optional[str]:
+        if value is None or not value.startswith(PREFIX + ':'):
+            return value
+        _, key_id, wrapped, ciphertext = value.split(':')
+        return _decrypt(self._data_key(key_id, wrapped), _unb64(ciphertext), context.encode()).decode()
+
+    def rewrap(self, value: Optional[str], context: str) -> Optional[str]:
+        # The value under the current master key; the ciphertext itself is left alone
+        if value is None or not self.enabled:
+            return value
+        if not value.startswith(PREFIX + ':'):
+            return self.seal(value, context)
+        _, key_id, wrapped, ciphertext = value.split(':')
+        if key_id == self.current:
+            return value
+        data_key = self._data_key(key_id, wrapped)
+        rewrapped = _encrypt(self.keys[self.current], data_key, self.current.encode())
+        return ':'.join((PREFIX, self.current, _b64(rewrapped), ciphertext))
+
+    def rewrap_rows(self, rows: List[Tuple[Any, List[Tuple[Optional[str], str]]]]) -> List[Tuple]:
+        # (key, [(value, context), ...]) rows -> (*rewrapped values, key) for the rows that changed
+        updates = []
+        for key, values in rows:
+            rewrapped = [self.rewrap(value, context) for value, context in values]
+            if rewrapped != [value for value, _ in values]:
+                updates.append((*rewrapped, key))
+        return updates
+
+    async def run(self, func, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, func, *args)
+
+    async def seal_async(self, *values: Tuple[Optional[str], str]) -> List[Optional[str]]:
+        # (value, context) pairs
+        return await self.run(lambda: [self.seal(value, context) for value, context in values])
+
+    async def open_async(self, value: Optional[str], context: str) -> Optional[str]:
+        return await self.run(self.open, value, context)
+
+    def close(self):
+        with self._lock:
+            self._cache.clear()
+        # The HD keychains derived from opened seeds go with the data keys
+        hd = sys.modules.get('wallets.hd')
+        if hd is not None:
+            hd.clear_keychains()
+        self.executor.shutdown(wait=False)
+
+async def rotate(db, vault: KeyVault, batch_size: int = 500) -> int:
+    # Re-wraps every wallet key and user seed under the current master key, sealing legacy
+    # plaintext on the way. Rows stream in primary-key order, batch_size at a time, and rows
+    # already under the current key are skipped, so an interrupted rotation just resumes
+    if not vault.enabled:
+        raise ValueError("VAULT_MASTER_KEY is not set")
+    tables = (
+        ('wallet', db.get_wallet_keys_batch, db.update_wallet_keys, lambda row: (row[0], [
+            (row[2], wallet_context(row[1], 'private_key')), (row[3], wallet_context(row[1], 'mnemonic'))
+        ])),
+        ('seed of user', db.get_seeds_batch, db.update_seeds, lambda row: (row[0], [
+            (row[1], seed_context(row[0]))
+        ]))
+    )
+    updated = 0
+    for label, read, write, contexts in tables:
+        after = 0
+        while True:
+            rows = await read(after, batch_size)
+            if not rows:
+                break
+            after = rows[-1][0]
+            updates = await vault.run(vault.rewrap_rows, [contexts(tuple(row)) for row in rows])
+            if updates:
+                await write(updates)
+                updated += len(updates)
+                print(f"🔐 Re-wrapped {updated} rows (up to {label} {after})")
+    return updated
+
+async def main(command: str):
+    from database import open_database
+    if command == 'generate':
+        print(generate_master_key())
+        return
+    if command != 'rotate':
+        print("Usage: python vault.py generate|rotate")
+        exit(1)
+    db = open_database(Config.DATABASE_URL, pool_size=Config.DB_POOL_SIZE)
+    vault = KeyVault.from_config()
+    await db.connect()
+    try:
+        updated = await rotate(db, vault, Config.VAULT_ROTATE_BATCH)
+        print(f"✅ {updated} rows re-wrapped under vault key {vault.current!r}")
+    finally:
+        await db.close()
+        vault.close()
+
+if __name__ == "__main__":
+    asyncio.run(main(sys.argv[1] if len(sys.argv) > 1 else ''))
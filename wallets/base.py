@@ -1,7 +1,8 @@
 from abc import ABC, abstractmethod
 from typing import Dict, Any, Optional
+from .hd import HDMixin
 
-class BaseWallet(ABC):
+class BaseWallet(HDMixin, ABC):
     @abstractmethod
     def create_wallet(self, mnemonic: Optional[str] = None) -> Dict[str, Any]:
         pass
@@ -17,3 +18,21 @@ class BaseWallet(ABC):
     @abstractmethod
     def get_transaction(self, tx_hash: str) -> Dict[str, Any]:
         pass
+
+# Same contract as BaseWallet, for backends whose chain I/O is awaitable
+class AsyncBaseWallet(HDMixin, ABC):
+    @abstractmethod
+    async def create_wallet(self, mnemonic: Optional[str] = None) -> Dict[str, Any]:
+        pass
+    
+    @abstractmethod
+    async def get_balance(self, address: str) -> float:
+        pass
+    
+    @abstractmethod
+    async def send_transaction(self, private_key: str, to_address: str, amount: float, **kwargs) -> str:
+        pass
+    
+    @abstractmethod
+    async def get_transaction(self, tx_hash: str) -> Dict[str, Any]:
+        pass
@@ -1,9 +1,34 @@
 from bitcoinlib.wallets import Wallet as BTCWallet
+from bitcoinlib.keys import HDKey, Key
 from bitcoinlib.services.services import Service
+from bitcoinlib.transactions import Transaction
 from .base import BaseWallet
-from typing import Dict, Any, Optional
+from .electrum import ElectrumClient
+from .utxo import UTXO, UTXOIndex, output_script, script_hash, select_coins
+from config import Config
+from typing import Dict, Any, List, Optional, Tuple, Union
+import asyncio
+import hashlib
+import threading
+import weakref
 
 class BitcoinWallet(BaseWallet):
+    network = 'bitcoin'
+    coin_type = 0
+    block_time = 600.0
+    
+    def __init__(self):
+        # Service objects are expensive to build and not thread-safe, so keep one per worker thread
+        self._local = threading.local()
+    
+    @property
+    def service(self) -> Service:
+        service = getattr(self._local, 'service', None)
+        if service is None:
+            service = Service(network=self.network)
+            self._local.service = service
+        return service
+    
     def create_wallet(self, mnemonic: Optional[str] = None) -> Dict[str, Any]:
         try:
             if mnemonic:
@@ -22,14 +47,66 @@ class BitcoinWallet(BaseWallet):
         except Exception as e:
             raise Exception(f"Bitcoin wallet creation error: {e}")
     
+    @classmethod
+    def wallet_from_private_key(cls, private_key: bytes) -> Dict[str, Any]:
+        # BIP44 (m/44'/...) paths map to legacy P2PKH addresses
+        key = Key(private_key.hex(), network=cls.network)
+        return {
+            'address': key.address(),
+            'private_key': key.private_hex,
+            'public_key': key.public_hex,
+            'wif': key.wif(),
+            'mnemonic': None
+        }
+    
+    @classmethod
+    def generate_key(cls) -> Dict[str, Any]:
+        # Standalone key, skipping the bitcoinlib wallet database used by create_wallet
+        key = HDKey(network=cls.network)
+        return {
+            'address': key.address(),
+            'private_key': key.private_hex,
+            'public_key': key.public_hex,
+            'wif': key.wif_key(),
+            'mnemonic': None
+        }
+    
     def get_balance(self, address: str) -> float:
         try:
-            service = Service(network='bitcoin')
-            balance = service.getbalance(address)
+            balance = self.service.getbalance(address)
             return balance / 100000000  # Convert satoshis to BTC
         except Exception as e:
+            # Raised, not reported as 0.0, so callers and metrics see the failure
             print(f"Bitcoin balance error: {e}")
-            return 0.0
+            raise
+    
+    def get_block_number(self) -> int:
+        return self.service.blockcount()
+    
+    def get_block_transfers(self, numbers: List[int], page_size: int = 100) -> Dict[int, List[Dict[str, Any]]]:
+        blocks = {}
+        for number in numbers:
+            transfers = []
+            page = 1
+            while True:
+                block = self.service.getblock(number, parse_transactions=True, page=page, limit=page_size)
+                if not block:
+                    raise Exception(f"block {number} not available")
+                for tx in block.transactions:
+                    senders = [i.address for i in tx.inputs if i.address]
+                    for output in tx.outputs:
+                        if output.address and output.value:
+                            transfers.append({
+                                'tx_hash': tx.txid,
+                                'from': senders[0] if senders else None,
+                                'to': output.address,
+                                'amount': output.value / 100000000  # satoshis to BTC
+                            })
+                if page * page_size >= (block.tx_count or 0) or not block.transactions:
+                    break
+                page += 1
+            blocks[number] = transfers
+        return blocks
     
     def send_transaction(self, private_key: str, to_address: str, amount: float, **kwargs) -> str:
         try:
@@ -41,9 +118,26 @@ class BitcoinWallet(BaseWallet):
             raise Exception(f"Bitcoin send error: {e}")
     
     def get_transaction(self, tx_hash: str) -> Dict[str, Any]:
-        return {'hash': tx_hash, 'note': 'Bitcoin transaction lookup not implemented'}
+        try:
+            tx = self.service.gettransaction(tx_hash)
+            if not tx:
+                return {'hash': tx_hash, 'blockNumber': None, 'status': None, 'confirmations': 0}
+            return {
+                'hash': tx_hash,
+                'from': next((i.address for i in tx.inputs if i.address), None),
+                'value': sum(o.value for o in tx.outputs) / 100000000,
+                'blockNumber': tx.block_height or None,
+                'status': 1 if tx.block_height else None,
+                'confirmations': tx.confirmations or 0
+            }
+        except Exception as e:
+            return {'error': str(e)}
 
 class LitecoinWallet(BitcoinWallet):
+    network = 'litecoin'
+    coin_type = 2
+    block_time = 150.0
+    
     def create_wallet(self, mnemonic: Optional[str] = None) -> Dict[str, Any]:
         if mnemonic:
             wallet = BTCWallet.create(keys=mnemonic, network='litecoin')
@@ -61,9 +155,100 @@ class LitecoinWallet(BitcoinWallet):
     
     def get_balance(self, address: str) -> float:
         try:
-            service = Service(network='litecoin')
-            balance = service.getbalance(address)
+            balance = self.service.getbalance(address)
             return balance / 100000000  # Convert litoshis to LTC
         except Exception as e:
             print(f"Litecoin balance error: {e}")
-            return 0.0
+            raise
+
+class ElectrumBitcoinWallet(BitcoinWallet):
+    # Balances, UTXOs, the chain head and broadcasts over the Electrum protocol instead of a
+    # bitcoinlib Service per call: many addresses per batched request, answered from a local
+    # UTXO index where nothing changed. Sends select coins from that index and are built and
+    # signed locally, without bitcoinlib's wallet database. Block scans and transaction
+    # lookups still go through the thread-local Service
+    def __init__(self, servers: Union[str, List[str]]):
+        super().__init__()
+        self.client = ElectrumClient(servers)
+        self.utxos = UTXOIndex(self.client, self.network)
+        # One send at a time per address, so concurrent sends never pick the same coins
+        self._send_locks: "weakref.WeakValueDictionary[str, asyncio.Lock]" = weakref.WeakValueDictionary()
+    
+    async def get_balances(self, addresses: List[str]) -> Dict[str, float]:
+        utxos = await self.utxos.get_utxos(addresses)
+        # Mempool-aware: the server lists unconfirmed outputs and leaves out spent ones
+        return {address: sum(utxo.value for utxo in coins) / 100000000 for address, coins in utxos.items()}
+    
+    async def get_balance(self, address: str) -> float:
+        return (await self.get_balances([address]))[address]
+    
+    async def get_confirmed_balances(self, addresses: List[str]) -> Dict[str, float]:
+        # Mined funds only, for the balance ledger: the deposit watcher applies a mempool
+        # payment once it is mined, so a ledger entry counting it already would count it
+        # twice. Addresses the server failed are left out
+        results = await self.client.batch([
+            ('blockchain.scripthash.get_balance', [script_hash(address, self.network)]) for address in addresses
+        ])
+        return {
+            address: result['confirmed'] / 100000000
+            for address, result in zip(addresses, results) if not isinstance(result, Exception)
+        }
+    
+    async def get_block_number(self) -> int:
+        return (await self.client.request('blockchain.headers.subscribe'))['height']
+    
+    async def get_fee_rate(self) -> float:
+        # sat/vB for confirmation within UTXO_FEE_TARGET blocks, never below the relay fee
+        estimate, relay = await self.client.batch([
+            ('blockchain.estimatefee', [Config.UTXO_FEE_TARGET]),
+            ('blockchain.relayfee', [])
+        ])
+        rate = Config.UTXO_FALLBACK_FEE_RATE
+        if isinstance(estimate, (int, float)) and estimate > 0:
+            rate = estimate * 100000  # coins per kB to satoshis per byte
+        if isinstance(relay, (int, float)) and relay > 0:
+            rate = max(rate, relay * 100000)
+        return rate
+    
+    def build_transaction(self, key: Key, coins: List[UTXO], to_address: str, amount: int,
+                          change: int) -> Tuple[str, str]:
+        # (txid, raw hex) of a signed legacy transaction; run off the event loop
+        tx = Transaction(network=self.network, witness_type='legacy')
+        for coin in coins:
+            tx.add_input(prev_txid=coin.tx_hash, output_n=coin.tx_pos, keys=key.public(),
+                         value=coin.value, witness_type='legacy')
+        tx.add_output(amount, to_address)
+        if change:
+            tx.add_output(change, key.address())
+        tx.sign(key)
+        raw = bytes.fromhex(tx.raw_hex())
+        return hashlib.sha256(hashlib.sha256(raw).digest()).digest()[::-1].hex(), raw.hex()
+    
+    async def send_transaction(self, private_key: str, to_address: str, amount: float, **kwargs) -> str:
+        try:
+            key = Key(private_key, network=self.network)
+            from_address = key.address()
+            output_script(to_address, self.network)  # rejects other networks' addresses
+            lock = self._send_locks.get(from_address)
+            if lock is None:
+                lock = self._send_locks[from_address] = asyncio.Lock()
+            async with lock:
+                coins = (await self.utxos.get_utxos([from_address]))[from_address]
+                selected, change, _ = select_coins(coins, round(amount * 100000000), await self.get_fee_rate())
+                txid, raw = await asyncio.to_thread(
+                    self.build_transaction, key, selected, to_address, round(amount * 100000000), change
+                )
+                await self.client.request('blockchain.transaction.broadcast', raw)
+                self.utxos.spend(from_address, selected, UTXO(txid, 1, change, 0) if change else None)
+                return txid
+        except Exception as e:
+            raise Exception(f"{self.network.title()} send error: {e}")
+    
+    async def close(self):
+        await self.client.close()
+
+class ElectrumLitecoinWallet(ElectrumBitcoinWallet):
+    network = 'litecoin'
+    coin_type = 2
+    block_time = 150.0
+    create_wallet = LitecoinWallet.create_wallet
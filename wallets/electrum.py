@@ -0,0 +1,166 @@
+import asyncio
+import itertools
+import json
+import ssl
+from urllib.parse import urlsplit
+from config import Config
+from .router import as_url_list, get_router
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple, Union
+
+PROTOCOL_VERSION = '1.4'
+
+class ElectrumError(Exception):
+    pass
+
+class ElectrumConnection:
+    # One session with an Electrum-protocol server (ElectrumX, Fulcrum, electrs) over
+    # tcp:// or ssl://: newline-delimited JSON-RPC, requests pipelined on one socket, a batch
+    # written as a single JSON array line. Server notifications (subscriptions) go to
+    # on_notify; on_reset is told when the session drops, since its subscriptions go with it
+    def __init__(self, url: str, on_notify: Callable[[str, List[Any]], None],
+                 on_reset: Callable[[], None]):
+        self.url = url
+        self.on_notify = on_notify
+        self.on_reset = on_reset
+        self._ids = itertools.count(1)
+        self._pending: Dict[int, asyncio.Future] = {}
+        self._writer: Optional[asyncio.StreamWriter] = None
+        self._reader_task: Optional[asyncio.Task] = None
+        self._connecting: Optional[asyncio.Lock] = None
+
+    @property
+    def connected(self) -> bool:
+        return self._writer is not None and not self._writer.is_closing()
+
+    async def _connect(self):
+        if self._connecting is None:
+            self._connecting = asyncio.Lock()
+        async with self._connecting:
+            if self.connected:
+                return
+            parts = urlsplit(self.url)
+            context = ssl.create_default_context() if parts.scheme == 'ssl' else None
+            reader, self._writer = await asyncio.wait_for(
+                asyncio.open_connection(parts.hostname, parts.port, ssl=context, limit=2 ** 24),
+                Config.RPC_TIMEOUT
+            )
+            self._reader_task = asyncio.ensure_future(self._read(reader))
+            # Servers expect the version handshake before anything else
+            await self._send([('server.version', ['walletbot', PROTOCOL_VERSION])])
+
+    async def _read(self, reader: asyncio.StreamReader):
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                message = json.loads(line)
+                for item in message if isinstance(message, list) else [message]:
+                    self._dispatch(item)
+        except (ConnectionError, ValueError, asyncio.IncompleteReadError) as e:
+            print(f"Electrum connection to {self.url} lost: {e}")
+        finally:
+            self._drop(ConnectionError(f"{self.url} disconnected"))
+
+    def _dispatch(self, item: Dict[str, Any]):
+        if item.get('id') is None:
+            if item.get('method'):
+                self.on_notify(item['method'], item.get('params', []))
+            return
+        future = self._pending.pop(item['id'], None)
+        if future is None or future.done():
+            return
+        error = item.get('error')
+        if error:
+            future.set_exception(ElectrumError(error.get('message', str(error)) if isinstance(error, dict) else str(error)))
+        else:
+            future.set_result(item.get('result'))
+
+    def _drop(self, error: Exception):
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+        pending, self._pending = self._pending, {}
+        for future in pending.values():
+            if not future.done():
+                future.set_exception(error)
+        self.on_reset()
+
+    async def _send(self, calls: Sequence[Tuple[str, List[Any]]]) -> List[Any]:
+        loop = asyncio.get_running_loop()
+        requests = []
+        futures = {}
+        for method, params in calls:
+            request_id = next(self._ids)
+            futures[request_id] = self._pending[request_id] = loop.create_future()
+            requests.append({'jsonrpc': '2.0', 'id': request_id, 'method': method, 'params': params})
+        self._writer.write(json.dumps(requests if len(requests) > 1 else requests[0]).encode() + b'\n')
+        try:
+            await self._writer.drain()
+            return await asyncio.wait_for(
+                asyncio.gather(*futures.values(), return_exceptions=True),
+                Config.RPC_TIMEOUT
+            )
+        finally:
+            # Timed out or cancelled: a late reply finds nothing to resolve
+            for request_id in futures:
+                self._pending.pop(request_id, None)
+
+    async def batch(self, calls: Sequence[Tuple[str, List[Any]]]) -> List[Any]:
+        # Results in call order; a call the server rejected yields its ElectrumError.
+        # Transport failures raise, so the router can fail over
+        if not self.connected:
+            await self._connect()
+        results = await self._send(calls)
+        for result in results:
+            if isinstance(result, (ConnectionError, asyncio.CancelledError)):
+                raise ConnectionError(f"{self.url} disconnected mid-batch")
+        return results
+
+    async def close(self):
+        if self._reader_task is not None:
+            self._reader_task.cancel()
+            self._reader_task = None
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+
+class ElectrumClient:
+    # Electrum sessions for one chain's servers behind the shared RPC router (failover,
+    # health, fair scheduling). Large batches are split into ELECTRUM_BATCH_SIZE chunks,
+    # which servers cap by request size and cost
+    def __init__(self, servers: Union[str, List[str]], batch_size: Optional[int] = None):
+        self.servers = as_url_list(servers)
+        self.router = get_router(self.servers)
+        self.batch_size = batch_size or Config.ELECTRUM_BATCH_SIZE
+        self.listeners: List[Callable[[str, List[Any]], None]] = []
+        self.reset_listeners: List[Callable[[], None]] = []
+        self.connections = {
+            url: ElectrumConnection(url, self._notify, self._reset) for url in self.servers
+        }
+
+    def _notify(self, method: str, params: List[Any]):
+        for listener in self.listeners:
+            listener(method, params)
+
+    def _reset(self):
+        for listener in self.reset_listeners:
+            listener()
+
+    async def _chunk(self, calls: List[Tuple[str, List[Any]]]) -> List[Any]:
+        return await self.router.acall(lambda url: self.connections[url].batch(calls))
+
+    async def batch(self, calls: List[Tuple[str, List[Any]]]) -> List[Any]:
+        chunks = [calls[i:i + self.batch_size] for i in range(0, len(calls), self.batch_size)]
+        results = await asyncio.gather(*(self._chunk(chunk) for chunk in chunks))
+        return [result for chunk in results for result in chunk]
+
+    async def request(self, method: str, *params) -> Any:
+        result = (await self.batch([(method, list(params))]))[0]
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    async def close(self):
+        for connection in self.connections.values():
+            await connection.close()
@@ -1,45 +1,86 @@
-from web3 import Web3
+from web3 import Web3, AsyncWeb3, AsyncHTTPProvider
+from web3.providers.base import JSONBaseProvider
+from web3.providers.async_base import AsyncJSONBaseProvider
 from eth_account import Account
-from .base import BaseWallet
-from typing import Dict, Any, Optional
+from .base import BaseWallet, AsyncBaseWallet
+from .transport import get_session, get_requests_session
+from .evm_batch import EVMBatchClient
+from .evm_send import EVMSender, token_transfer_data
+from .router import as_url_list, check_rpc_response, get_router
+from .hd import generate_mnemonic
+from config import Config
+from typing import Dict, Any, List, Optional, Tuple, Union
 import json
+from decimal import Decimal
+
+class RoutedHTTPProvider(JSONBaseProvider):
+    # Sends each request to the best endpoint the chain's router knows about
+    def __init__(self, rpc_url: Union[str, List[str]]):
+        super().__init__()
+        self.router = get_router(rpc_url)
+        self.providers = {
+            url: Web3.HTTPProvider(
+                url,
+                request_kwargs={'timeout': Config.RPC_TIMEOUT},
+                session=get_requests_session()
+            )
+            for url in as_url_list(rpc_url)
+        }
+    
+    def make_request(self, method, params):
+        return self.router.call(
+            lambda url: check_rpc_response(self.providers[url].make_request(method, params))
+        )
+
+class RoutedAsyncHTTPProvider(AsyncJSONBaseProvider):
+    def __init__(self, rpc_url: Union[str, List[str]]):
+        super().__init__()
+        self.router = get_router(rpc_url)
+        self.providers = {url: AsyncHTTPProvider(url) for url in as_url_list(rpc_url)}
+    
+    async def cache_async_session(self, session):
+        for provider in self.providers.values():
+            await provider.cache_async_session(session)
+        return session
+    
+    async def make_request(self, method, params):
+        async def send(url):
+            return check_rpc_response(await self.providers[url].make_request(method, params))
+        return await self.router.acall(send)
+
+def account_wallet(private_key: bytes) -> Dict[str, Any]:
+    account = Account.from_key(private_key)
+    return {
+        'address': account.address,
+        'private_key': account.key.hex(),
+        'public_key': '',
+        'mnemonic': None
+    }
 
 class EthereumWallet(BaseWallet):
-    def __init__(self, rpc_url: str, chain_id: int = 1):
-        self.web3 = Web3(Web3.HTTPProvider(rpc_url))
+    coin_type = 60  # BSC and Polygon wallets conventionally share Ethereum's path
+    
+    def __init__(self, rpc_url: Union[str, List[str]], chain_id: int = 1):
+        self.web3 = Web3(RoutedHTTPProvider(rpc_url))
         self.chain_id = chain_id
-        # For newer web3 versions, use different approach
-        if hasattr(Account, 'enable_unaudited_hdwallet_features'):
-            Account.enable_unaudited_hdwallet_features()
+    
+    wallet_from_private_key = staticmethod(account_wallet)
     
     def create_wallet(self, mnemonic: Optional[str] = None) -> Dict[str, Any]:
-        try:
-            if mnemonic:
-                # Create account from mnemonic
-                account = self.web3.eth.account.from_mnemonic(mnemonic)
-            else:
-                # Create new account
-                account = self.web3.eth.account.create()
-            
-            return {
-                'address': account.address,
-                'private_key': account.key.hex() if hasattr(account.key, 'hex') else account.key.hex(),
-                'public_key': '',
-                'mnemonic': mnemonic
-            }
-        except Exception as e:
-            # Fallback method
-            if mnemonic:
-                account = Account.from_mnemonic(mnemonic)
-            else:
-                account = Account.create()
-            
-            return {
-                'address': account.address,
-                'private_key': account.key.hex(),
-                'public_key': account.key.public_key.hex() if hasattr(account.key, 'public_key') else '',
-                'mnemonic': mnemonic
-            }
+        # First address (m/44'/60'/0'/0/0, same as Account.from_mnemonic) of the given
+        # or a freshly generated mnemonic, so the mnemonic is always returned
+        return self.derive_wallet(mnemonic or generate_mnemonic(), 0)
+    
+    @staticmethod
+    def generate_key() -> Dict[str, Any]:
+        # Pure local key generation, safe to run in a worker process
+        account = Account.create()
+        return {
+            'address': account.address,
+            'private_key': account.key.hex(),
+            'public_key': '',
+            'mnemonic': None
+        }
     
     def get_balance(self, address: str) -> float:
         try:
@@ -47,7 +88,7 @@ class EthereumWallet(BaseWallet):
             return self.web3.from_wei(balance_wei, 'ether')
         except Exception as e:
             print(f"Balance error: {e}")
-            return 0.0
+            raise
     
     def send_transaction(self, private_key: str, to_address: str, amount: float, gas_price: Optional[int] = None) -> str:
         try:
@@ -76,25 +117,134 @@ class EthereumWallet(BaseWallet):
         try:
             tx = self.web3.eth.get_transaction(tx_hash)
             receipt = self.web3.eth.get_transaction_receipt(tx_hash)
+            block_number = tx.get('blockNumber')
             
             return {
                 'hash': tx_hash,
                 'from': tx['from'],
                 'to': tx['to'],
                 'value': self.web3.from_wei(tx['value'], 'ether'),
-                'blockNumber': tx.get('blockNumber'),
+                'blockNumber': block_number,
                 'status': receipt.get('status') if receipt else None,
-                'confirmations': 0
+                'confirmations': self.web3.eth.block_number - block_number + 1 if block_number is not None else 0
             }
         except Exception as e:
             return {'error': str(e)}
 
 # BEP20 (Binance Smart Chain)
 class BSCWallet(EthereumWallet):
-    def __init__(self, rpc_url: str = "https://bsc-dataseed.binance.org/"):
+    def __init__(self, rpc_url: Union[str, List[str]] = "https://bsc-dataseed.binance.org/"):
         super().__init__(rpc_url, chain_id=56)
 
 # Polygon
 class PolygonWallet(EthereumWallet):
-    def __init__(self, rpc_url: str = "https://polygon-rpc.com"):
+    def __init__(self, rpc_url: Union[str, List[str]] = "https://polygon-rpc.com"):
+        super().__init__(rpc_url, chain_id=137)
+
+class AsyncEthereumWallet(AsyncBaseWallet):
+    coin_type = 60
+    block_time = 12.0  # seconds; fee data is refreshed at most once per block
+    wallet_from_private_key = staticmethod(account_wallet)
+    
+    def __init__(self, rpc_url: Union[str, List[str]], chain_id: int = 1):
+        self.provider = RoutedAsyncHTTPProvider(rpc_url)
+        self.web3 = AsyncWeb3(self.provider)
+        self.batch = EVMBatchClient(rpc_url, Config.EVM_BATCH_SIZE, Config.EVM_MULTICALL)
+        self.sender = EVMSender(self.batch, chain_id, self.block_time)
+        self.chain_id = chain_id
+        self._session_cached = False
+    
+    async def _connect(self) -> AsyncWeb3:
+        # Route every request through the shared, pooled aiohttp session
+        if not self._session_cached:
+            await self.provider.cache_async_session(await get_session())
+            self._session_cached = True
+        return self.web3
+    
+    async def create_wallet(self, mnemonic: Optional[str] = None) -> Dict[str, Any]:
+        # Key derivation is local, no chain I/O involved
+        return self.derive_wallet(mnemonic or generate_mnemonic(), 0)
+    
+    async def get_balance(self, address: str) -> float:
+        try:
+            web3 = await self._connect()
+            balance_wei = await web3.eth.get_balance(address)
+            return web3.from_wei(balance_wei, 'ether')
+        except Exception as e:
+            # Surface the failure instead of reporting (and caching) a 0.0 balance
+            print(f"Balance error: {e}")
+            raise
+    
+    async def get_balances(self, addresses: List[str]) -> Dict[str, float]:
+        # Many eth_getBalance calls packed into JSON-RPC batches (or Multicall3)
+        try:
+            return await self.batch.get_balances(addresses)
+        except Exception as e:
+            print(f"Batch balance error: {e}")
+            raise
+    
+    async def get_balances_at(self, addresses: List[str], block: int) -> Dict[str, float]:
+        # Balances as of a given block, for the ledger to stamp exactly
+        return await self.batch.get_balances(addresses, block)
+    
+    async def get_token_balances(self, tokens: List[str], addresses: List[str]) -> Dict[Tuple[str, str], int]:
+        # ERC-20/BEP-20 balanceOf for every token and address via Multicall3, in raw units
+        return await self.batch.get_token_balances(tokens, addresses)
+    
+    async def get_token_metadata(self, tokens: List[str]) -> Dict[str, Dict[str, Any]]:
+        return await self.batch.get_token_metadata(tokens)
+    
+    async def get_block_number(self) -> int:
+        return await self.batch.get_block_number()
+    
+    async def get_block_transfers(self, numbers: List[int]) -> Dict[int, List[Dict[str, Any]]]:
+        return await self.batch.get_block_transfers(numbers)
+    
+    async def get_receipt_statuses(self, tx_hashes: List[str]) -> Dict[str, int]:
+        return await self.batch.get_receipt_statuses(tx_hashes)
+    
+    async def get_token_transfers(self, filters: List[Dict[str, Any]], from_block: int,
+                                  to_block: int) -> List[Dict[str, Any]]:
+        return await self.batch.get_transfers(filters, from_block, to_block)
+    
+    def transfer_fields(self, to_address: str, amount: float, token: Optional[str] = None,
+                        decimals: int = 18) -> Tuple[str, int, Optional[bytes]]:
+        # (recipient of the transaction, value in wei, calldata) for a native or token transfer
+        if token:
+            units = int(Decimal(str(amount)) * 10 ** decimals)
+            return token, 0, token_transfer_data(to_address, units)
+        return to_address, Web3.to_wei(Decimal(str(amount)), 'ether'), None
+    
+    async def send_transaction(self, private_key: str, to_address: str, amount: float, gas_price: Optional[int] = None,
+                               token: Optional[str] = None, decimals: int = 18) -> str:
+        # Nonce from the local nonce manager and fees from the shared oracle; the send
+        # queue uses the same path but signs on its executor
+        try:
+            account = Account.from_key(private_key)
+            to, value, data = self.transfer_fields(to_address, amount, token, decimals)
+            async def sign(tx):
+                return EVMSender.sign(tx, private_key)
+            return await self.sender.send(account.address, to, value, data, sign, gas_price)
+        except Exception as e:
+            raise Exception(f"Send transaction error: {e}")
+    
+    async def get_transaction(self, tx_hash: str) -> Dict[str, Any]:
+        return (await self.get_transactions([tx_hash]))[tx_hash]
+    
+    async def get_transactions(self, tx_hashes: List[str], head: Optional[int] = None) -> Dict[str, Dict[str, Any]]:
+        try:
+            return await self.batch.get_transactions(tx_hashes, head)
+        except Exception as e:
+            return {tx_hash: {'error': str(e)} for tx_hash in tx_hashes}
+
+class AsyncBSCWallet(AsyncEthereumWallet):
+    block_time = 3.0
+    
+    def __init__(self, rpc_url: Union[str, List[str]] = "https://bsc-dataseed.binance.org/"):
+        super().__init__(rpc_url, chain_id=56)
+
+class AsyncPolygonWallet(AsyncEthereumWallet):
+    block_time = 2.0
+    
+    def __init__(self, rpc_url: Union[str, List[str]] = "https://polygon-rpc.com"):
         super().__init__(rpc_url, chain_id=137)
@@ -0,0 +1,265 @@
+import asyncio
+import itertools
+from eth_abi import encode, decode
+from web3 import Web3
+from typing import Any, Dict, List, Optional, Tuple, Union
+from .transport import post_json
+from .router import RPCRouter, get_router
+
+MULTICALL3_ADDRESS = '0xcA11bde05977b3631167028862bE2a173976CA11'
+AGGREGATE3_SELECTOR = bytes.fromhex('82ad56cb')  # aggregate3((address,bool,bytes)[])
+GET_ETH_BALANCE_SELECTOR = bytes.fromhex('4d2301cc')  # getEthBalance(address)
+BALANCE_OF_SELECTOR = bytes.fromhex('70a08231')  # balanceOf(address)
+DECIMALS_SELECTOR = bytes.fromhex('313ce567')  # decimals()
+SYMBOL_SELECTOR = bytes.fromhex('95d89b41')  # symbol()
+NAME_SELECTOR = bytes.fromhex('06fdde03')  # name()
+# Transfer(address indexed from, address indexed to, uint256 value)
+TRANSFER_TOPIC = '0xddf252ad1be2c89b69c2b068fc378daa952ba7f163c4a11628f55a4df523b3ef'
+
+class RPCError(Exception):
+    pass
+
+def _chunks(items: List[Any], size: int):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+def _to_int(value: Optional[str]) -> Optional[int]:
+    return int(value, 16) if value is not None else None
+
+def decode_text(data: bytes) -> str:
+    # ABI string, or the bytes32 some early tokens (MKR, SAI) return instead
+    try:
+        return decode(['string'], data)[0]
+    except Exception:
+        return data[:32].rstrip(b'\x00').decode('utf-8', 'replace')
+
+def transfer_filters(tokens: List[str], addresses: List[str], chunk_size: int = 1000) -> List[Dict[str, Any]]:
+    # Log filters for token Transfers into and out of the addresses, chunk_size addresses
+    # per filter: nodes cap how many topics a filter may OR together
+    filters = []
+    for chunk in _chunks(addresses, chunk_size):
+        topics = ['0x' + address.lower()[2:].rjust(64, '0') for address in chunk]
+        filters.append({'address': tokens, 'topics': [TRANSFER_TOPIC, None, topics]})
+        filters.append({'address': tokens, 'topics': [TRANSFER_TOPIC, topics]})
+    return filters
+
+def log_transfer(log: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    # A Transfer log as a transfer dict; the amount stays in raw token units
+    topics = log.get('topics', [])
+    if len(topics) != 3 or topics[0] != TRANSFER_TOPIC:
+        return None  # ERC-721 Transfers index the token id as well
+    return {
+        'tx_hash': log['transactionHash'],
+        'token': Web3.to_checksum_address(log['address']),
+        'from': Web3.to_checksum_address('0x' + topics[1][-40:]),
+        'to': Web3.to_checksum_address('0x' + topics[2][-40:]),
+        'amount': int(log.get('data') or '0x0', 16),
+        'block_number': _to_int(log.get('blockNumber')),
+        'log_index': _to_int(log.get('logIndex')),
+        'removed': bool(log.get('removed'))
+    }
+
+class EVMBatchClient:
+    def __init__(self, rpc_url: Union[str, List[str]], max_batch_size: int = 100, use_multicall: bool = False,
+                 multicall_address: str = MULTICALL3_ADDRESS, router: Optional[RPCRouter] = None):
+        self.router = router or get_router(rpc_url)
+        self.max_batch_size = max_batch_size
+        self.use_multicall = use_multicall
+        self.multicall_address = multicall_address
+        self._ids = itertools.count(1)
+
+    async def _send_batch(self, calls: List[Tuple[str, list]]) -> List[Any]:
+        requests = [
+            {'jsonrpc': '2.0', 'id': next(self._ids), 'method': method, 'params': params}
+            for method, params in calls
+        ]
+        async def send(url: str) -> list:
+            responses = await post_json(url, requests)
+            if isinstance(responses, dict):
+                # Some providers answer a rejected batch with a single error object
+                raise RPCError(responses.get('error', responses))
+            return responses
+
+        responses = await self.router.acall(send)
+
+        by_id = {item.get('id'): item for item in responses}
+        results = []
+        for request in requests:
+            item = by_id.get(request['id'])
+            if item is None or 'error' in item:
+                results.append(RPCError(item['error'] if item else 'missing response'))
+            else:
+                results.append(item.get('result'))
+        return results
+
+    async def batch(self, calls: List[Tuple[str, list]]) -> List[Any]:
+        # Results come back in call order; a failed call yields an RPCError in its slot
+        chunks = await asyncio.gather(*(
+            self._send_batch(chunk) for chunk in _chunks(calls, self.max_batch_size)
+        ))
+        return [result for chunk in chunks for result in chunk]
+
+    async def get_balances(self, addresses: List[str], block: Optional[int] = None) -> Dict[str, float]:
+        # As of `block` when given, else the latest block
+        if self.use_multicall:
+            return await self._multicall_balances(addresses, block)
+
+        tag = 'latest' if block is None else hex(block)
+        results = await self.batch([('eth_getBalance', [address, tag]) for address in addresses])
+        return {
+            address: Web3.from_wei(int(result, 16), 'ether')
+            for address, result in zip(addresses, results)
+            if not isinstance(result, RPCError)
+        }
+
+    async def multicall(self, calls: List[Tuple[str, bytes]], block: Optional[int] = None) -> List[Optional[bytes]]:
+        # (target, calldata) pairs through Multicall3.aggregate3 with allowFailure, one eth_call
+        # per chunk and all chunks in one JSON-RPC batch; a failed sub-call yields None
+        chunks = list(_chunks(calls, self.max_batch_size))
+        tag = 'latest' if block is None else hex(block)
+        requests = []
+        for chunk in chunks:
+            aggregate = [(Web3.to_checksum_address(target), True, data) for target, data in chunk]
+            data = AGGREGATE3_SELECTOR + encode(['(address,bool,bytes)[]'], [aggregate])
+            requests.append(('eth_call', [{'to': self.multicall_address, 'data': '0x' + data.hex()}, tag]))
+
+        results: List[Optional[bytes]] = []
+        for chunk, result in zip(chunks, await self.batch(requests)):
+            if isinstance(result, RPCError):
+                results.extend([None] * len(chunk))
+                continue
+            (returned,) = decode(['(bool,bytes)[]'], bytes.fromhex(result[2:]))
+            results.extend(return_data if success and return_data else None for success, return_data in returned)
+        return results
+
+    async def _multicall_balances(self, addresses: List[str], block: Optional[int] = None) -> Dict[str, float]:
+        results = await self.multicall([
+            (self.multicall_address, GET_ETH_BALANCE_SELECTOR + encode(['address'], [Web3.to_checksum_address(address)]))
+            for address in addresses
+        ], block)
+        return {
+            address: Web3.from_wei(decode(['uint256'], data)[0], 'ether')
+            for address, data in zip(addresses, results)
+            if data is not None
+        }
+
+    async def get_token_balances(self, tokens: List[str], addresses: List[str]) -> Dict[Tuple[str, str], int]:
+        # balanceOf for every (token, address) pair in one aggregated call; raw token units
+        pairs = [(token, address) for token in tokens for address in addresses]
+        results = await self.multicall([
+            (token, BALANCE_OF_SELECTOR + encode(['address'], [Web3.to_checksum_address(address)]))
+            for token, address in pairs
+        ])
+        return {
+            pair: decode(['uint256'], data)[0]
+            for pair, data in zip(pairs, results)
+            if data is not None
+        }
+
+    async def get_token_metadata(self, tokens: List[str]) -> Dict[str, Dict[str, Any]]:
+        # decimals/symbol/name of several contracts in one aggregated call
+        selectors = [DECIMALS_SELECTOR, SYMBOL_SELECTOR, NAME_SELECTOR]
+        results = await self.multicall([(token, selector) for token in tokens for selector in selectors])
+        metadata = {}
+        for i, token in enumerate(tokens):
+            decimals, symbol, name = results[3 * i:3 * i + 3]
+            if decimals is None:
+                continue  # not an ERC-20 contract, or the call failed; retried next lookup
+            metadata[token] = {
+                'decimals': decode(['uint256'], decimals)[0],
+                'symbol': decode_text(symbol) if symbol else '',
+                'name': decode_text(name) if name else ''
+            }
+        return metadata
+
+    async def get_transactions(self, tx_hashes: List[str], head: Optional[int] = None) -> Dict[str, Dict[str, Any]]:
+        # Transaction and receipt for every hash in the same round-trip, plus the chain
+        # head for confirmation counts unless the caller already knows it
+        calls = []
+        for tx_hash in tx_hashes:
+            calls.append(('eth_getTransactionByHash', [tx_hash]))
+            calls.append(('eth_getTransactionReceipt', [tx_hash]))
+        if head is None:
+            calls.append(('eth_blockNumber', []))
+        results = await self.batch(calls)
+        if head is None:
+            latest = results.pop()
+            head = _to_int(latest) if not isinstance(latest, RPCError) else None
+
+        transactions = {}
+        for i, tx_hash in enumerate(tx_hashes):
+            tx, receipt = results[2 * i], results[2 * i + 1]
+            if isinstance(tx, RPCError) or tx is None:
+                transactions[tx_hash] = {'error': str(tx) if tx else 'transaction not found'}
+                continue
+            if isinstance(receipt, RPCError):
+                receipt = None
+            block_number = _to_int(tx.get('blockNumber'))
+            transactions[tx_hash] = {
+                'hash': tx_hash,
+                'from': tx.get('from'),
+                'to': tx.get('to'),
+                'value': Web3.from_wei(int(tx['value'], 16), 'ether'),
+                'blockNumber': block_number,
+                'status': _to_int(receipt.get('status')) if receipt else None,
+                'confirmations': head - block_number + 1 if head is not None and block_number is not None else 0
+            }
+        return transactions
+
+    async def get_block_number(self) -> int:
+        (result,) = await self.batch([('eth_blockNumber', [])])
+        if isinstance(result, RPCError):
+            raise result
+        return int(result, 16)
+
+    async def get_block_transfers(self, numbers: List[int]) -> Dict[int, List[Dict[str, Any]]]:
+        # Native-coin transfers of several full blocks, fetched in one batch
+        results = await self.batch([('eth_getBlockByNumber', [hex(number), True]) for number in numbers])
+        blocks = {}
+        for number, block in zip(numbers, results):
+            if isinstance(block, RPCError):
+                raise block
+            if block is None:
+                raise RPCError(f"block {number} not available yet")
+            blocks[number] = [
+                {
+                    'tx_hash': tx['hash'],
+                    'from': tx.get('from'),
+                    'to': tx.get('to'),
+                    'amount': Web3.from_wei(int(tx['value'], 16), 'ether')
+                }
+                for tx in block.get('transactions', [])
+                if tx.get('to') and int(tx.get('value', '0x0'), 16) > 0
+            ]
+        return blocks
+
+    async def get_receipt_statuses(self, tx_hashes: List[str]) -> Dict[str, int]:
+        # Receipt status (1 success, 0 reverted) of mined transactions, one batch
+        results = await self.batch([('eth_getTransactionReceipt', [tx_hash]) for tx_hash in tx_hashes])
+        statuses = {}
+        for tx_hash, receipt in zip(tx_hashes, results):
+            if isinstance(receipt, RPCError):
+                raise receipt
+            if receipt is None:
+                raise RPCError(f"receipt of {tx_hash} not available yet")
+            statuses[tx_hash] = _to_int(receipt.get('status'))
+        return statuses
+
+    async def get_transfers(self, filters: List[Dict[str, Any]], from_block: int,
+                            to_block: int) -> List[Dict[str, Any]]:
+        # Token transfers matching any of the filters in a block range, one eth_getLogs
+        # per filter in a single batch
+        results = await self.batch([
+            ('eth_getLogs', [dict(log_filter, fromBlock=hex(from_block), toBlock=hex(to_block))])
+            for log_filter in filters
+        ])
+        transfers = {}
+        for result in results:
+            if isinstance(result, RPCError):
+                raise result
+            for log in result:
+                transfer = log_transfer(log)
+                if transfer is not None:
+                    # Transfers between two watched addresses match both filters
+                    transfers[(transfer['tx_hash'], transfer['log_index'])] = transfer
+        return list(transfers.values())
@@ -0,0 +1,212 @@
+import asyncio
+import time
+from eth_abi import encode
+from eth_account import Account
+from web3 import Web3
+from typing import Any, Awaitable, Callable, Dict, Optional
+from .evm_batch import EVMBatchClient, RPCError
+
+TRANSFER_SELECTOR = bytes.fromhex('a9059cbb')  # transfer(address,uint256)
+PLAIN_TRANSFER_GAS = 21000
+# Errors meaning our local nonce is behind the chain (sent elsewhere, or already mined)
+NONCE_ERRORS = ('nonce too low', 'replacement transaction underpriced')
+# The node already has this very transaction: a retried or hedged broadcast that landed
+KNOWN_ERRORS = ('already known', 'known transaction')
+
+def is_nonce_error(error: Exception) -> bool:
+    message = str(error).lower()
+    return any(text in message for text in NONCE_ERRORS)
+
+def is_known_error(error: Exception) -> bool:
+    message = str(error).lower()
+    return any(text in message for text in KNOWN_ERRORS)
+
+def transaction_hash(raw_transaction: bytes) -> str:
+    return Web3.to_hex(Web3.keccak(raw_transaction))
+
+def token_transfer_data(to_address: str, amount: int) -> bytes:
+    return TRANSFER_SELECTOR + encode(['address', 'uint256'], [Web3.to_checksum_address(to_address), amount])
+
+class NonceManager:
+    # Hands out nonces per sending address without asking the node each time. The first
+    # send (and any send after resync) reads the pending transaction count from the chain
+    def __init__(self, batch: EVMBatchClient):
+        self.batch = batch
+        self._next: Dict[str, int] = {}
+        self._locks: Dict[str, asyncio.Lock] = {}
+
+    def _lock(self, address: str) -> asyncio.Lock:
+        lock = self._locks.get(address)
+        if lock is None:
+            lock = asyncio.Lock()
+            self._locks[address] = lock
+        return lock
+
+    async def reserve(self, address: str) -> int:
+        address = address.lower()
+        async with self._lock(address):
+            if address not in self._next:
+                (count,) = await self.batch.batch([('eth_getTransactionCount', [address, 'pending'])])
+                if isinstance(count, RPCError):
+                    raise count
+                self._next[address] = int(count, 16)
+            nonce = self._next[address]
+            self._next[address] = nonce + 1
+            return nonce
+
+    def release(self, address: str, nonce: int):
+        # A reserved nonce that never reached the chain: hand it out again if nothing
+        # newer was issued, otherwise later nonces would wait behind a gap, so resync
+        address = address.lower()
+        if self._next.get(address) == nonce + 1:
+            self._next[address] = nonce
+        else:
+            self.resync(address)
+
+    def resync(self, address: str):
+        self._next.pop(address.lower(), None)
+
+class FeeOracle:
+    # EIP-1559 fees shared by every send on a chain, refreshed at most once per block.
+    # Chains without a base fee get a legacy gasPrice instead
+    def __init__(self, batch: EVMBatchClient, block_time: float = 12.0, priority_percentile: int = 50):
+        self.batch = batch
+        self.block_time = block_time
+        self.priority_percentile = priority_percentile
+        self.block: Optional[int] = None
+        self._fees: Optional[Dict[str, int]] = None
+        self._fetched_at = 0.0
+        self._refresh: Optional[asyncio.Future] = None
+
+    async def _fetch(self) -> Dict[str, int]:
+        # Fee history and gas price in a single round-trip
+        history, gas_price = await self.batch.batch([
+            ('eth_feeHistory', [1, 'latest', [self.priority_percentile]]),
+            ('eth_gasPrice', [])
+        ])
+        if not isinstance(history, RPCError) and history.get('baseFeePerGas'):
+            base_fee = int(history['baseFeePerGas'][-1], 16)  # base fee of the next block
+            self.block = int(history['oldestBlock'], 16)
+            if base_fee > 0:
+                rewards = history.get('reward') or [['0x0']]
+                priority = max(int(rewards[-1][0], 16), 1)
+                # Room for the base fee to double before the transaction is priced out
+                return {'maxFeePerGas': 2 * base_fee + priority, 'maxPriorityFeePerGas': priority}
+        if isinstance(gas_price, RPCError):
+            raise gas_price
+        return {'gasPrice': int(gas_price, 16)}
+
+    async def get_fees(self) -> Dict[str, int]:
+        if self._fees is not None and time.monotonic() - self._fetched_at < self.block_time:
+            return self._fees
+        # Single flight: concurrent sends share one refresh
+        if self._refresh is None:
+            self._refresh = asyncio.ensure_future(self._fetch())
+        refresh = self._refresh
+        try:
+            fees = await asyncio.shield(refresh)
+        finally:
+            if self._refresh is refresh and refresh.done():
+                self._refresh = None
+        self._fees = fees
+        self._fetched_at = time.monotonic()
+        return fees
+
+class EVMSender:
+    # Builds, signs and broadcasts transactions for one chain: nonces from the local
+    # NonceManager, fees from the shared FeeOracle, gas from eth_estimateGas when needed
+    def __init__(self, batch: EVMBatchClient, chain_id: int, block_time: float = 12.0, gas_margin: float = 1.2):
+        self.batch = batch
+        self.chain_id = chain_id
+        self.gas_margin = gas_margin
+        self.nonces = NonceManager(batch)
+        self.fees = FeeOracle(batch, block_time)
+
+    async def estimate_gas(self, tx: Dict[str, Any]) -> int:
+        # Plain value transfers to accounts without code always cost 21000; anything
+        # else (contract recipients, token transfers) is estimated by the node
+        call = {'from': tx['from'], 'to': tx['to'], 'value': hex(tx['value'])}
+        if tx.get('data'):
+            call['data'] = tx['data']
+            (estimate,) = await self.batch.batch([('eth_estimateGas', [call])])
+        else:
+            code, estimate = await self.batch.batch([
+                ('eth_getCode', [tx['to'], 'latest']),
+                ('eth_estimateGas', [call])
+            ])
+            if not isinstance(code, RPCError) and code in ('0x', '0x0', None):
+                return PLAIN_TRANSFER_GAS
+        if isinstance(estimate, RPCError):
+            raise estimate
+        return int(int(estimate, 16) * self.gas_margin)
+
+    async def prepare(self, from_address: str, to_address: str, value: int = 0,
+                      data: Optional[bytes] = None) -> Dict[str, Any]:
+        tx: Dict[str, Any] = {
+            'from': Web3.to_checksum_address(from_address),
+            'to': Web3.to_checksum_address(to_address),
+            'value': value,
+            'chainId': self.chain_id
+        }
+        if data:
+            tx['data'] = '0x' + data.hex()
+        gas, fees = await asyncio.gather(self.estimate_gas(tx), self.fees.get_fees())
+        tx.update(fees, gas=gas)
+        # Reserved last, so a failed estimate doesn't burn a nonce
+        tx['nonce'] = await self.nonces.reserve(from_address)
+        return tx
+
+    @staticmethod
+    def sign(tx: Dict[str, Any], private_key: str) -> bytes:
+        # CPU-bound; the send queue runs it in an executor
+        tx = {key: value for key, value in tx.items() if key != 'from'}
+        return bytes(Account.sign_transaction(tx, private_key).rawTransaction)
+
+    async def broadcast(self, raw_transaction: bytes) -> str:
+        (tx_hash,) = await self.batch.batch([('eth_sendRawTransaction', ['0x' + raw_transaction.hex()])])
+        if isinstance(tx_hash, RPCError):
+            if is_known_error(tx_hash):
+                return transaction_hash(raw_transaction)
+            if tx_hash.args == ('missing response',):
+                # The batch was answered but not this call: delivery is unknown
+                raise ConnectionError("no response to eth_sendRawTransaction")
+            raise tx_hash
+        return tx_hash
+
+    async def is_known(self, raw_transaction: bytes) -> bool:
+        # Whether this signed transaction already reached the chain or a mempool
+        (tx,) = await self.batch.batch([('eth_getTransactionByHash', [transaction_hash(raw_transaction)])])
+        return not isinstance(tx, RPCError) and tx is not None
+
+    async def send(self, from_address: str, to_address: str, value: int, data: Optional[bytes],
+                   sign: Callable[[Dict[str, Any]], Awaitable[bytes]], gas_price: Optional[int] = None) -> str:
+        for attempt in range(2):
+            tx = await self.prepare(from_address, to_address, value, data)
+            if gas_price:
+                tx.pop('maxFeePerGas', None)
+                tx.pop('maxPriorityFeePerGas', None)
+                tx['gasPrice'] = gas_price
+            try:
+                raw_transaction = await sign(tx)
+            except Exception:
+                self.nonces.release(from_address, tx['nonce'])
+                raise
+            # Only a node's explicit rejection frees the nonce. Timeouts and dropped
+            # connections propagate with it still spent: the transaction may already sit in
+            # a mempool, and reusing its nonce would replace or duplicate it
+            try:
+                return await self.broadcast(raw_transaction)
+            except RPCError as e:
+                if not is_nonce_error(e):
+                    # Rejected outright, so the nonce was never used
+                    self.nonces.release(from_address, tx['nonce'])
+                    raise
+                # An earlier delivery of this same transaction may be what took the nonce
+                # (mined between a retried POST's attempts); only otherwise is it someone
+                # else's, and then the chain is read again and the send retried once
+                if await self.is_known(raw_transaction):
+                    return transaction_hash(raw_transaction)
+                self.nonces.resync(from_address)
+                if attempt == 0:
+                    continue
+                raise
@@ -0,0 +1,131 @@
+import hashlib
+import hmac
+import threading
+import time
+import unicodedata
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from eth_keys import keys
+from eth_account.hdaccount.mnemonic import Mnemonic
+from typing import Any, Dict, List, Optional, Tuple
+from config import Config
+
+# BIP32 over secp256k1. Extended private keys are (private key int, chain code)
+SECP256K1_N = 0xFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFEBAAEDCE6AF48A03BBFD25E8CD0364141
+HARDENED = 0x80000000
+
+ExtendedKey = Tuple[int, bytes]
+
+def generate_mnemonic(num_words: int = 12) -> str:
+    return Mnemonic("english").generate(num_words)
+
+def mnemonic_to_seed(mnemonic: str, passphrase: str = "") -> bytes:
+    # BIP39
+    mnemonic = unicodedata.normalize("NFKD", mnemonic)
+    salt = unicodedata.normalize("NFKD", "mnemonic" + passphrase)
+    return hashlib.pbkdf2_hmac("sha512", mnemonic.encode(), salt.encode(), 2048)
+
+def parse_path(path: str) -> Tuple[int, ...]:
+    parts = path.split("/")
+    if parts[0] != "m":
+        raise ValueError(f"Derivation path must start with m/: {path}")
+    indexes = []
+    for part in parts[1:]:
+        if part.endswith("'") or part.endswith("h"):
+            indexes.append(int(part[:-1]) + HARDENED)
+        else:
+            indexes.append(int(part))
+    return tuple(indexes)
+
+def master_key(seed: bytes) -> ExtendedKey:
+    digest = hmac.new(b"Bitcoin seed", seed, hashlib.sha512).digest()
+    return int.from_bytes(digest[:32], "big"), digest[32:]
+
+def _public_key(private_key: int) -> bytes:
+    return keys.PrivateKey(private_key.to_bytes(32, "big")).public_key.to_compressed_bytes()
+
+def child_key(parent: ExtendedKey, index: int) -> ExtendedKey:
+    private_key, chain_code = parent
+    if index & HARDENED:
+        data = b"\x00" + private_key.to_bytes(32, "big") + index.to_bytes(4, "big")
+    else:
+        data = _public_key(private_key) + index.to_bytes(4, "big")
+    digest = hmac.new(chain_code, data, hashlib.sha512).digest()
+    tweak = int.from_bytes(digest[:32], "big")
+    child = (tweak + private_key) % SECP256K1_N
+    if tweak >= SECP256K1_N or child == 0:
+        # Probability ~2^-127; BIP32 says skip to the next index
+        raise ValueError(f"Invalid child key at index {index}")
+    return child, digest[32:]
+
+class HDKeychain:
+    # Derives keys from one seed, caching every intermediate extended key, so sibling
+    # addresses under an already derived account node cost a single child derivation
+    def __init__(self, seed: bytes):
+        self._nodes: Dict[Tuple[int, ...], ExtendedKey] = {(): master_key(seed)}
+        self._lock = threading.Lock()
+
+    def derive(self, path: str) -> bytes:
+        indexes = parse_path(path)
+        with self._lock:
+            depth = len(indexes)
+            while indexes[:depth] not in self._nodes:
+                depth -= 1
+            node = self._nodes[indexes[:depth]]
+            for i in range(depth, len(indexes)):
+                node = child_key(node, indexes[i])
+                # Leaves are cheap to recompute and unbounded in number; keep only parents
+                if i < len(indexes) - 1:
+                    self._nodes[indexes[:i + 1]] = node
+        return node[0].to_bytes(32, "big")
+
+# fingerprint -> (expires_at, keychain), least recently used first
+_keychains: "OrderedDict[bytes, Tuple[float, HDKeychain]]" = OrderedDict()
+_keychains_lock = threading.Lock()
+MAX_KEYCHAINS = 256
+
+def get_keychain(mnemonic: str) -> HDKeychain:
+    # Bounded LRU of keychains, so the PBKDF2 seed stretch runs once per active user. They
+    # hold private keys, so like the vault's unwrapped data keys they are dropped after
+    # VAULT_CACHE_TTL seconds
+    fingerprint = hashlib.sha256(mnemonic.encode()).digest()
+    now = time.monotonic()
+    with _keychains_lock:
+        for key in [key for key, (expires_at, _) in _keychains.items() if expires_at <= now]:
+            del _keychains[key]
+        entry = _keychains.get(fingerprint)
+        if entry is not None:
+            _keychains.move_to_end(fingerprint)
+            return entry[1]
+    keychain = HDKeychain(mnemonic_to_seed(mnemonic))
+    with _keychains_lock:
+        _keychains[fingerprint] = (now + Config.VAULT_CACHE_TTL, keychain)
+        while len(_keychains) > MAX_KEYCHAINS:
+            _keychains.popitem(last=False)
+    return keychain
+
+def clear_keychains():
+    with _keychains_lock:
+        _keychains.clear()
+
+class HDMixin(ABC):
+    # BIP44 derivation shared by every backend; subclasses set coin_type and
+    # implement wallet_from_private_key for their address format
+    coin_type: Optional[int] = None
+
+    def derivation_path(self, index: int, account: int = 0) -> str:
+        return f"m/44'/{self.coin_type}'/{account}'/0/{index}"
+
+    @classmethod
+    @abstractmethod
+    def wallet_from_private_key(cls, private_key: bytes) -> Dict[str, Any]:
+        pass
+
+    def derive_wallet(self, mnemonic: str, index: int = 0) -> Dict[str, Any]:
+        path = self.derivation_path(index)
+        wallet = self.wallet_from_private_key(get_keychain(mnemonic).derive(path))
+        wallet.update(mnemonic=mnemonic, derivation_path=path, derivation_index=index)
+        return wallet
+
+    def derive_wallets(self, mnemonic: str, indexes: List[int]) -> List[Dict[str, Any]]:
+        return [self.derive_wallet(mnemonic, index) for index in indexes]
@@ -0,0 +1,86 @@
+import importlib
+import os
+import sys
+import threading
+import time
+from collections.abc import Mapping
+from config import Config
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+# currency -> (network name, module, backend class, Config attribute holding its RPC endpoints)
+BACKENDS: Dict[str, Tuple[str, str, str, Optional[str]]] = {
+    'BTC': ('Bitcoin', 'wallets.bitcoin', 'ElectrumBitcoinWallet', 'BTC_ELECTRUM_SERVERS'),
+    'LTC': ('Litecoin', 'wallets.bitcoin', 'ElectrumLitecoinWallet', 'LTC_ELECTRUM_SERVERS'),
+    'ETH': ('Ethereum', 'wallets.ethereum', 'AsyncEthereumWallet', 'ETH_RPCS'),
+    'BSC': ('Binance Smart Chain', 'wallets.ethereum', 'AsyncBSCWallet', 'BSC_RPCS'),
+    'MATIC': ('Polygon', 'wallets.ethereum', 'AsyncPolygonWallet', 'POLYGON_RPCS'),
+    'TRX': ('Tron', 'wallets.tron', 'AsyncTronWallet', 'TRON_RPCS')
+}
+
+def rss_mb() -> float:
+    # Current resident set size; peak RSS where /proc isn't available
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 1048576
+    except (OSError, ValueError, AttributeError):
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / 1048576 if sys.platform == 'darwin' else peak / 1024
+
+class BackendRegistry(Mapping):
+    # Read-only mapping currency -> backend over the enabled networks. A backend's module
+    # (web3, tronpy, bitcoinlib) is imported and the backend constructed on first access,
+    # so a deployment only pays for the chains it actually uses
+    def __init__(self, enabled: Optional[List[str]] = None):
+        self.enabled = [currency for currency in (enabled or list(BACKENDS)) if currency in BACKENDS]
+        self._backends: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+
+    def network_name(self, currency: str) -> str:
+        return BACKENDS[currency][0]
+
+    def _load(self, currency: str) -> Any:
+        _, module, class_name, rpc_setting = BACKENDS[currency]
+        started = time.perf_counter()
+        try:
+            backend_class = getattr(importlib.import_module(module), class_name)
+            backend = backend_class(getattr(Config, rpc_setting)) if rpc_setting else backend_class()
+        except Exception as e:
+            # Remembered as unavailable; handlers already treat a missing backend as such
+            print(f"Warning: Could not load {currency} wallet backend: {e}")
+            return None
+        print(f"Loaded {currency} backend in {time.perf_counter() - started:.2f}s (RSS {rss_mb():.0f} MB)")
+        return backend
+
+    def __getitem__(self, currency: str) -> Any:
+        if currency not in self.enabled:
+            raise KeyError(currency)
+        if currency not in self._backends:
+            with self._lock:
+                if currency not in self._backends:
+                    self._backends[currency] = self._load(currency)
+        backend = self._backends[currency]
+        if backend is None:
+            raise KeyError(currency)
+        return backend
+
+    def __contains__(self, currency: object) -> bool:
+        # Membership never triggers a load
+        return currency in self.enabled
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.enabled)
+
+    def __len__(self) -> int:
+        return len(self.enabled)
+
+    def loaded(self) -> List[str]:
+        return [currency for currency, backend in self._backends.items() if backend is not None]
+
+    async def close(self):
+        for backend in self._backends.values():
+            if backend is not None and hasattr(backend, 'close'):
+                await backend.close()
+        # Shared HTTP pools only exist once some backend has been used
+        if 'wallets.transport' in sys.modules:
+            await sys.modules['wallets.transport'].close_sessions()
@@ -0,0 +1,224 @@
+import asyncio
+import threading
+import time
+from config import Config
+from ratelimit import FairScheduler, get_store
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Sequence, Tuple, Union
+
+class AllEndpointsFailed(Exception):
+    pass
+
+class RateLimited(Exception):
+    def __init__(self, message: str = 'rate limited', retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+# JSON-RPC error codes providers use for throttling / capacity problems
+RATE_LIMIT_CODES = {429, -32005, -32029, -32090}
+
+def check_rpc_response(response: Any) -> Any:
+    # Throttling errors come back as normal JSON-RPC responses; raise so the router fails over
+    if isinstance(response, dict):
+        error = response.get('error')
+        if isinstance(error, dict) and error.get('code') in RATE_LIMIT_CODES:
+            raise RateLimited(error.get('message', 'rate limited'))
+    return response
+
+def rate_limit_of(error: BaseException) -> Optional[RateLimited]:
+    # Throttling surfaces as our RateLimited, aiohttp's ClientResponseError or httpx's
+    # HTTPStatusError depending on the client that made the call
+    if isinstance(error, RateLimited):
+        return error
+    status = getattr(error, 'status', None) or getattr(getattr(error, 'response', None), 'status_code', None)
+    if status != 429:
+        return None
+    headers = getattr(error, 'headers', None) or getattr(getattr(error, 'response', None), 'headers', None) or {}
+    try:
+        retry_after = float(headers.get('Retry-After'))
+    except (TypeError, ValueError):
+        retry_after = None
+    return RateLimited(str(error), retry_after)
+
+def as_url_list(rpc_url: Union[str, Sequence[str]]) -> List[str]:
+    if isinstance(rpc_url, str):
+        return [url.strip() for url in rpc_url.split(',') if url.strip()]
+    return list(rpc_url)
+
+class Endpoint:
+    def __init__(self, url: str, scheduler: Optional[FairScheduler] = None):
+        self.url = url
+        # Async calls queue here for a slot, fairly between the users they are made for.
+        # Each endpoint has its own so a throttled provider backs off alone
+        self.scheduler = scheduler
+        self.latency = 0.0  # EWMA of observed call latency, seconds
+        self.error_rate = 0.0  # EWMA of failures, 0..1
+        self.consecutive_failures = 0
+        self.open_until = 0.0  # circuit breaker: skipped until this monotonic time
+        self.calls = 0
+        self.errors = 0
+
+    def available(self, now: float) -> bool:
+        return self.open_until <= now
+
+    def paused_until(self) -> float:
+        # Wall clock time until which the endpoint's scheduler holds calls after a 429
+        return self.scheduler.paused_until if self.scheduler is not None else 0.0
+
+    def score(self) -> float:
+        # Lower is better; errors make an endpoint look much slower than it is
+        return self.latency * (1 + 10 * self.error_rate)
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            'url': self.url,
+            'latency': self.latency,
+            'error_rate': self.error_rate,
+            'calls': self.calls,
+            'errors': self.errors,
+            'open': self.open_until > time.monotonic(),
+            'scheduler': self.scheduler.stats() if self.scheduler is not None else None
+        }
+
+class RPCRouter:
+    def __init__(self, urls: Sequence[str], hedge_after: Optional[float] = None,
+                 failure_threshold: int = 3, cooldown: float = 30.0, alpha: float = 0.2,
+                 scheduler: Optional[Callable[[str], FairScheduler]] = None):
+        # scheduler builds the FairScheduler of an endpoint from its URL
+        if not urls:
+            raise ValueError("RPCRouter needs at least one endpoint")
+        self.endpoints = [Endpoint(url, scheduler(url) if scheduler is not None else None) for url in urls]
+        self.hedge_after = hedge_after
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.alpha = alpha
+        self._lock = threading.Lock()
+
+    def ranked(self) -> List[Endpoint]:
+        # Healthy endpoints fastest first, then throttled ones in the order their pause ends,
+        # then open circuits in the order they reopen so that a fully tripped router still
+        # probes (half-open) instead of failing outright
+        now = time.monotonic()
+        wall = time.time()
+        with self._lock:
+            closed = [e for e in self.endpoints if e.available(now)]
+            healthy = sorted((e for e in closed if e.paused_until() <= wall), key=Endpoint.score)
+            paused = sorted((e for e in closed if e.paused_until() > wall), key=Endpoint.paused_until)
+            tripped = sorted((e for e in self.endpoints if not e.available(now)), key=lambda e: e.open_until)
+        return healthy + paused + tripped
+
+    def record_latency(self, endpoint: Endpoint, latency: float):
+        with self._lock:
+            endpoint.calls += 1
+            endpoint.latency = latency if endpoint.calls == 1 else (
+                self.alpha * latency + (1 - self.alpha) * endpoint.latency
+            )
+
+    def record_success(self, endpoint: Endpoint, latency: float):
+        self.record_latency(endpoint, latency)
+        with self._lock:
+            endpoint.error_rate *= (1 - self.alpha)
+            endpoint.consecutive_failures = 0
+            endpoint.open_until = 0.0
+
+    def record_failure(self, endpoint: Endpoint, latency: float):
+        with self._lock:
+            endpoint.calls += 1
+            endpoint.errors += 1
+            endpoint.latency = max(endpoint.latency, latency)
+            endpoint.error_rate = self.alpha + (1 - self.alpha) * endpoint.error_rate
+            endpoint.consecutive_failures += 1
+            if endpoint.consecutive_failures >= self.failure_threshold:
+                endpoint.open_until = time.monotonic() + self.cooldown
+
+    def call(self, func: Callable[[str], Any]) -> Any:
+        # Blocking failover: try endpoints best-first until one succeeds
+        last_error = None
+        for endpoint in self.ranked():
+            started = time.monotonic()
+            try:
+                result = func(endpoint.url)
+            except Exception as e:
+                self.record_failure(endpoint, time.monotonic() - started)
+                last_error = e
+                continue
+            self.record_success(endpoint, time.monotonic() - started)
+            return result
+        raise AllEndpointsFailed(f"All RPC endpoints failed: {last_error}") from last_error
+
+    async def _attempt(self, endpoint: Endpoint, func: Callable[[str], Awaitable[Any]]) -> Any:
+        scheduler = endpoint.scheduler
+        if scheduler is None:
+            return await self._timed(endpoint, func)
+        async with scheduler.slot():
+            try:
+                result = await self._timed(endpoint, func)
+            except Exception as e:
+                limited = rate_limit_of(e)
+                if limited is not None:
+                    scheduler.throttled(limited.retry_after)
+                raise
+            scheduler.success()
+            return result
+
+    async def _timed(self, endpoint: Endpoint, func: Callable[[str], Awaitable[Any]]) -> Any:
+        # Timed from when the call goes out, not from when it was queued
+        started = time.monotonic()
+        try:
+            result = await func(endpoint.url)
+        except asyncio.CancelledError:
+            # Lost a hedge race: what we waited is still a lower bound on its latency
+            self.record_latency(endpoint, time.monotonic() - started)
+            raise
+        except Exception:
+            self.record_failure(endpoint, time.monotonic() - started)
+            raise
+        self.record_success(endpoint, time.monotonic() - started)
+        return result
+
+    async def acall(self, func: Callable[[str], Awaitable[Any]]) -> Any:
+        # Async failover with optional hedging: if the best endpoint hasn't answered within
+        # hedge_after seconds, race the next one as well and take whichever finishes first
+        candidates = self.ranked()
+        running = set()
+        last_error = None
+        try:
+            while candidates or running:
+                if candidates and (not running or self.hedge_after is not None):
+                    running.add(asyncio.ensure_future(self._attempt(candidates.pop(0), func)))
+                timeout = self.hedge_after if candidates and self.hedge_after is not None else None
+                done, running = await asyncio.wait(running, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        return task.result()
+                    last_error = task.exception()
+        finally:
+            for task in running:
+                task.cancel()
+        raise AllEndpointsFailed(f"All RPC endpoints failed: {last_error}") from last_error
+
+    def stats(self) -> List[Dict[str, Any]]:
+        return [endpoint.snapshot() for endpoint in self.endpoints]
+
+_routers: Dict[Tuple[str, ...], RPCRouter] = {}
+
+def get_router(rpc_url: Union[str, Sequence[str]]) -> RPCRouter:
+    # Sync and async backends for the same chain share one router and its health data
+    urls = tuple(as_url_list(rpc_url))
+    router = _routers.get(urls)
+    if router is None:
+        router = RPCRouter(
+            urls,
+            hedge_after=Config.RPC_HEDGE_AFTER or None,
+            failure_threshold=Config.RPC_FAILURE_THRESHOLD,
+            cooldown=Config.RPC_COOLDOWN,
+            scheduler=lambda url: FairScheduler(
+                url,
+                capacity=Config.RPC_CONCURRENCY,
+                weights=Config.RPC_CALLER_WEIGHTS,
+                max_flows=Config.RATE_LIMIT_KEYS,
+                max_backoff=Config.RPC_MAX_BACKOFF,
+                store=get_store()
+            )
+        )
+        _routers[urls] = router
+    return router
@@ -0,0 +1,139 @@
+import asyncio
+import aiohttp
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from config import Config
+from .router import RateLimited
+from typing import Any, Dict, Optional
+
+# Process-wide HTTP clients shared by every backend so connections are pooled and kept alive
+_aiohttp_session: Optional[aiohttp.ClientSession] = None
+_httpx_client: Optional[httpx.AsyncClient] = None
+_http_adapter: Optional[HTTPAdapter] = None
+_requests_session: Optional[requests.Session] = None
+
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+# Connection reuse counters for the async session (the sync pools are read from urllib3)
+_async_stats = {'connections_created': 0, 'connections_reused': 0, 'requests': 0}
+
+def _trace_config() -> aiohttp.TraceConfig:
+    trace = aiohttp.TraceConfig()
+    
+    async def on_create(session, context, params):
+        _async_stats['connections_created'] += 1
+    
+    async def on_reuse(session, context, params):
+        _async_stats['connections_reused'] += 1
+    
+    async def on_request(session, context, params):
+        _async_stats['requests'] += 1
+    
+    trace.on_connection_create_end.append(on_create)
+    trace.on_connection_reuseconn.append(on_reuse)
+    trace.on_request_start.append(on_request)
+    return trace
+
+async def get_session() -> aiohttp.ClientSession:
+    global _aiohttp_session
+    if _aiohttp_session is None or _aiohttp_session.closed:
+        _aiohttp_session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(
+                limit=Config.RPC_POOL_SIZE,
+                keepalive_timeout=Config.RPC_KEEPALIVE
+            ),
+            timeout=aiohttp.ClientTimeout(total=Config.RPC_TIMEOUT),
+            trace_configs=[_trace_config()]
+        )
+    return _aiohttp_session
+
+def get_httpx_client() -> httpx.AsyncClient:
+    # tronpy's async provider is built on httpx rather than aiohttp
+    global _httpx_client
+    if _httpx_client is None or _httpx_client.is_closed:
+        limits = httpx.Limits(
+            max_connections=Config.RPC_POOL_SIZE,
+            max_keepalive_connections=Config.RPC_POOL_SIZE,
+            keepalive_expiry=Config.RPC_KEEPALIVE
+        )
+        _httpx_client = httpx.AsyncClient(
+            transport=httpx.AsyncHTTPTransport(retries=Config.RPC_RETRIES, limits=limits),
+            timeout=Config.RPC_TIMEOUT
+        )
+    return _httpx_client
+
+def get_http_adapter() -> HTTPAdapter:
+    # One urllib3 pool manager behind every blocking client (web3, tronpy)
+    global _http_adapter
+    if _http_adapter is None:
+        _http_adapter = HTTPAdapter(
+            pool_connections=Config.RPC_POOL_SIZE,
+            pool_maxsize=Config.RPC_POOL_SIZE,
+            max_retries=Retry(
+                total=Config.RPC_RETRIES,
+                backoff_factor=0.5,
+                status_forcelist=RETRY_STATUSES,
+                allowed_methods=None,  # JSON-RPC is all POST
+                raise_on_status=False
+            )
+        )
+    return _http_adapter
+
+def mount_pool(session: requests.Session) -> requests.Session:
+    adapter = get_http_adapter()
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+def get_requests_session() -> requests.Session:
+    global _requests_session
+    if _requests_session is None:
+        _requests_session = mount_pool(requests.Session())
+    return _requests_session
+
+async def post_json(url: str, payload: Any) -> Any:
+    # POST over the shared session, retrying transient failures with backoff
+    session = await get_session()
+    for attempt in range(Config.RPC_RETRIES + 1):
+        try:
+            async with session.post(url, json=payload) as response:
+                if response.status == 429:
+                    # Not retried here: the router fails over and its scheduler backs off
+                    retry_after = response.headers.get('Retry-After')
+                    raise RateLimited(
+                        f"{url} rate limited",
+                        float(retry_after) if retry_after and retry_after.isdigit() else None
+                    )
+                if response.status in RETRY_STATUSES and attempt < Config.RPC_RETRIES:
+                    await asyncio.sleep(0.5 * 2 ** attempt)
+                    continue
+                response.raise_for_status()
+                return await response.json(content_type=None)
+        except (aiohttp.ClientConnectionError, asyncio.TimeoutError):
+            if attempt == Config.RPC_RETRIES:
+                raise
+            await asyncio.sleep(0.5 * 2 ** attempt)
+
+def connection_stats() -> Dict[str, int]:
+    stats = dict(_async_stats)
+    stats['sync_connections_created'] = 0
+    stats['sync_requests'] = 0
+    if _http_adapter is not None:
+        pools = _http_adapter.poolmanager.pools
+        for key in pools.keys():
+            pool = pools.get(key)
+            if pool is not None:
+                stats['sync_connections_created'] += pool.num_connections
+                stats['sync_requests'] += pool.num_requests
+    return stats
+
+async def close_sessions():
+    global _aiohttp_session, _httpx_client
+    if _aiohttp_session is not None and not _aiohttp_session.closed:
+        await _aiohttp_session.close()
+    if _httpx_client is not None and not _httpx_client.is_closed:
+        await _httpx_client.aclose()
+    _aiohttp_session = None
+    _httpx_client = None
@@ -1,24 +1,134 @@
-from tronpy import Tron
+import asyncio
+from collections import OrderedDict
+from tronpy import Tron, AsyncTron
+from tronpy.exceptions import AddressNotFound
+from eth_abi import decode
+from tronpy.keys import PrivateKey, to_base58check_address, to_hex_address
 from tronpy.providers import HTTPProvider
-from .base import BaseWallet
-from typing import Dict, Any, Optional
+from tronpy.providers.async_http import AsyncHTTPProvider
+from .base import BaseWallet, AsyncBaseWallet
+from .transport import get_httpx_client, mount_pool
+from .router import as_url_list, get_router
+from .hd import generate_mnemonic
+from config import Config
+from typing import Dict, Any, List, Optional, Tuple, Union
+
+class RoutedHTTPProvider(HTTPProvider):
+    # Drop-in for tronpy's HTTPProvider that fails over between TronGrid-compatible nodes.
+    # Subclassed because Tron() only accepts HTTPProvider instances; the base constructor
+    # is skipped, each endpoint gets its own provider below
+    def __init__(self, rpc_url: Union[str, List[str]]):
+        self.endpoint_uri = as_url_list(rpc_url)[0]
+        self.timeout = Config.RPC_TIMEOUT
+        self.router = get_router(rpc_url)
+        self.providers = {}
+        for url in as_url_list(rpc_url):
+            provider = HTTPProvider(url, timeout=Config.RPC_TIMEOUT)
+            mount_pool(provider.sess)
+            self.providers[url] = provider
+    
+    def make_request(self, method: str, params: Any = None) -> dict:
+        return self.router.call(lambda url: self.providers[url].make_request(method, params))
+
+class RoutedAsyncHTTPProvider(AsyncHTTPProvider):
+    def __init__(self, rpc_url: Union[str, List[str]]):
+        self.endpoint_uri = as_url_list(rpc_url)[0]
+        self.timeout = Config.RPC_TIMEOUT
+        self.router = get_router(rpc_url)
+        self.providers = {
+            url: AsyncHTTPProvider(url, client=get_httpx_client())
+            for url in as_url_list(rpc_url)
+        }
+    
+    async def make_request(self, method: str, params: Any = None) -> dict:
+        return await self.router.acall(lambda url: self.providers[url].make_request(method, params))
+
+TRANSFER_SELECTOR = 'a9059cbb'  # transfer(address,uint256)
+TRANSFER_FROM_SELECTOR = '23b872dd'  # transferFrom(address,address,uint256)
+
+def key_wallet(private_key: bytes) -> Dict[str, Any]:
+    key = PrivateKey(private_key)
+    return {
+        'address': key.public_key.to_base58check_address(),
+        'private_key': key.hex(),
+        'public_key': key.public_key.hex(),
+        'mnemonic': None
+    }
+
+def address_parameter(address: str) -> str:
+    # ABI-encoded address argument: the 20-byte body of the 41-prefixed hex address
+    return to_hex_address(address)[2:].rjust(64, '0')
+
+def block_transfers(block: Dict[str, Any]) -> List[Dict[str, Any]]:
+    # TRX TransferContract payments in a block returned by get_block
+    transfers = []
+    for txn in block.get('transactions', []):
+        for contract in txn.get('raw_data', {}).get('contract', []):
+            if contract.get('type') != 'TransferContract':
+                continue
+            value = contract['parameter']['value']
+            addresses = [value.get('owner_address', ''), value.get('to_address', '')]
+            # Blocks fetched with visible=False carry hex (41...) addresses
+            owner, to = [
+                to_base58check_address(a) if a.startswith('41') and len(a) == 42 else a
+                for a in addresses
+            ]
+            transfers.append({
+                'tx_hash': txn['txID'],
+                'from': owner,
+                'to': to,
+                'amount': value.get('amount', 0) / 1000000  # sun to TRX
+            })
+    return transfers
+
+def block_token_transfers(block: Dict[str, Any]) -> List[Dict[str, Any]]:
+    # TRC-20 transfer()/transferFrom() calls in a block returned by get_block, read from the
+    # call data; the amount stays in raw token units. Calls that reverted moved nothing
+    transfers = []
+    for txn in block.get('transactions', []):
+        if (txn.get('ret') or [{}])[0].get('contractRet') != 'SUCCESS':
+            continue
+        for contract in txn.get('raw_data', {}).get('contract', []):
+            if contract.get('type') != 'TriggerSmartContract':
+                continue
+            value = contract['parameter']['value']
+            token = value.get('contract_address', '')
+            token = to_base58check_address(token) if token.startswith('41') and len(token) == 42 else token
+            data = value.get('data', '')
+            if data.startswith(TRANSFER_SELECTOR) and len(data) >= 136:
+                sender, args = value.get('owner_address', ''), data[8:]
+            elif data.startswith(TRANSFER_FROM_SELECTOR) and len(data) >= 200:
+                sender, args = '41' + data[32:72], data[72:]
+            else:
+                continue
+            transfers.append({
+                'tx_hash': txn['txID'],
+                'token': token,
+                'from': to_base58check_address(sender) if sender.startswith('41') else sender,
+                'to': to_base58check_address('41' + args[24:64]),
+                'amount': int(args[64:128], 16),
+                'block_number': block.get('block_header', {}).get('raw_data', {}).get('number')
+            })
+    return transfers
 
 class TronWallet(BaseWallet):
-    def __init__(self, rpc_url: str = "https://api.trongrid.io"):
-        self.client = Tron(HTTPProvider(rpc_url))
+    coin_type = 195
+    wallet_from_private_key = staticmethod(key_wallet)
+    
+    def __init__(self, rpc_url: Union[str, List[str]] = "https://api.trongrid.io"):
+        self.client = Tron(RoutedHTTPProvider(rpc_url))
     
     def create_wallet(self, mnemonic: Optional[str] = None) -> Dict[str, Any]:
         try:
-            wallet = self.client.generate_address()
-            return {
-                'address': wallet['base58check_address'],
-                'private_key': wallet['private_key'],
-                'public_key': wallet.get('public_key', ''),
-                'mnemonic': mnemonic
-            }
+            # Derived from the mnemonic (a new one if none is given) instead of ignoring it
+            return self.derive_wallet(mnemonic or generate_mnemonic(), 0)
         except Exception as e:
             raise Exception(f"Tron wallet creation error: {e}")
     
+    @staticmethod
+    def generate_key() -> Dict[str, Any]:
+        return key_wallet(bytes.fromhex(PrivateKey.random().hex()))
+    
     def get_balance(self, address: str) -> float:
         try:
             account = self.client.get_account(address)
@@ -26,7 +136,7 @@ class TronWallet(BaseWallet):
             return balance / 1000000  # Convert sun to TRX
         except Exception as e:
             print(f"Tron balance error: {e}")
-            return 0.0
+            raise
     
     def send_transaction(self, private_key: str, to_address: str, amount: float, **kwargs) -> str:
         try:
@@ -56,3 +166,166 @@ class TronWallet(BaseWallet):
             return dict(txn)
         except Exception as e:
             return {'error': str(e)}
+
+class AsyncTronWallet(AsyncBaseWallet):
+    coin_type = 195
+    block_time = 3.0
+    wallet_from_private_key = staticmethod(key_wallet)
+    
+    def __init__(self, rpc_url: Union[str, List[str]] = "https://api.trongrid.io", block_cache_size: int = 100):
+        self.rpc_url = rpc_url
+        self._client: Optional[AsyncTron] = None
+        # block number -> task for its (TRX, TRC-20) transfers, least recently used first.
+        # The deposit watcher and the chain feed read the same new blocks; each is fetched
+        # once for both, and only the transfers are kept, not the block
+        self.block_cache_size = block_cache_size
+        self._blocks: "OrderedDict[int, asyncio.Future]" = OrderedDict()
+    
+    @property
+    def client(self) -> AsyncTron:
+        # Built lazily so the shared httpx client is created inside the running loop
+        if self._client is None:
+            self._client = AsyncTron(RoutedAsyncHTTPProvider(self.rpc_url))
+        return self._client
+    
+    async def create_wallet(self, mnemonic: Optional[str] = None) -> Dict[str, Any]:
+        try:
+            return self.derive_wallet(mnemonic or generate_mnemonic(), 0)
+        except Exception as e:
+            raise Exception(f"Tron wallet creation error: {e}")
+    
+    async def get_balance(self, address: str) -> float:
+        try:
+            account = await self.client.get_account(address)
+            balance = account.get('balance', 0)
+            return balance / 1000000  # Convert sun to TRX
+        except AddressNotFound:
+            return 0.0  # Not activated on-chain yet
+        except Exception as e:
+            print(f"Tron balance error: {e}")
+            raise
+    
+    async def _constant_call(self, contract: str, function: str, owner: str, parameter: str = '') -> Optional[bytes]:
+        result = await self.client.provider.make_request('wallet/triggerconstantcontract', {
+            'owner_address': owner,
+            'contract_address': contract,
+            'function_selector': function,
+            'parameter': parameter,
+            'visible': True
+        })
+        if not result.get('result', {}).get('result') or not result.get('constant_result'):
+            return None
+        return bytes.fromhex(result['constant_result'][0]) or None
+    
+    async def _constant_calls(self, calls: List[Tuple[str, str, str, str]]) -> List[Optional[bytes]]:
+        # Tron has no multicall/batch endpoint, so the calls go out concurrently over the
+        # shared keep-alive pool; a failed call yields None in its slot
+        results = await asyncio.gather(*(self._constant_call(*call) for call in calls), return_exceptions=True)
+        return [None if isinstance(result, Exception) else result for result in results]
+    
+    async def get_token_balances(self, tokens: List[str], addresses: List[str]) -> Dict[Tuple[str, str], int]:
+        # TRC-20 balanceOf for every (token, address) pair, in raw units
+        pairs = [(token, address) for token in tokens for address in addresses]
+        results = await self._constant_calls([
+            (token, 'balanceOf(address)', address, address_parameter(address))
+            for token, address in pairs
+        ])
+        return {
+            pair: decode(['uint256'], data)[0]
+            for pair, data in zip(pairs, results)
+            if data is not None
+        }
+    
+    async def get_token_metadata(self, tokens: List[str]) -> Dict[str, Dict[str, Any]]:
+        # Shares the EVM string decoding; imported here so Tron alone doesn't load web3
+        from .evm_batch import decode_text
+        functions = ['decimals()', 'symbol()', 'name()']
+        results = await self._constant_calls([
+            (token, function, token) for token in tokens for function in functions
+        ])
+        metadata = {}
+        for i, token in enumerate(tokens):
+            decimals, symbol, name = results[3 * i:3 * i + 3]
+            if decimals is None:
+                continue
+            metadata[token] = {
+                'decimals': decode(['uint256'], decimals)[0],
+                'symbol': decode_text(symbol) if symbol else '',
+                'name': decode_text(name) if name else ''
+            }
+        return metadata
+    
+    async def get_block_number(self) -> int:
+        return await self.client.get_latest_block_number()
+    
+    async def _fetch_transfers(self, number: int) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+        block = await self.client.get_block(number)
+        return block_transfers(block), block_token_transfers(block)
+    
+    async def _transfers(self, numbers: List[int]) -> List[Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]]:
+        tasks = []
+        for number in numbers:
+            task = self._blocks.get(number)
+            if task is None or (task.done() and (task.cancelled() or task.exception() is not None)):
+                task = self._blocks[number] = asyncio.ensure_future(self._fetch_transfers(number))
+            self._blocks.move_to_end(number)
+            tasks.append(task)
+        while len(self._blocks) > self.block_cache_size:
+            self._blocks.popitem(last=False)
+        # Shielded: a caller giving up doesn't cancel the fetch for the other
+        return await asyncio.gather(*(asyncio.shield(task) for task in tasks))
+    
+    async def get_block_transfers(self, numbers: List[int]) -> Dict[int, List[Dict[str, Any]]]:
+        blocks = await self._transfers(numbers)
+        return {number: native for number, (native, _) in zip(numbers, blocks)}
+    
+    async def get_token_transfers(self, tokens: List[str], from_block: int,
+                                  to_block: int) -> List[Dict[str, Any]]:
+        # No log filters on Tron: TRC-20 transfers are read off the blocks themselves
+        blocks = await self._transfers(list(range(from_block, to_block + 1)))
+        return [transfer for _, transfers in blocks for transfer in transfers if transfer['token'] in tokens]
+    
+    async def send_transaction(self, private_key: str, to_address: str, amount: float, **kwargs) -> str:
+        try:
+            key = PrivateKey(bytes.fromhex(private_key))
+            txb = self.client.trx.transfer(
+                from_=key.public_key.to_base58check_address(),
+                to=to_address,
+                amount=int(amount * 1000000)  # TRX to sun
+            )
+            txn = (await txb.build()).sign(key)
+            result = await txn.broadcast()
+            return result.get('txid', '')
+        except Exception as e:
+            raise Exception(f"Tron send error: {e}")
+    
+    async def get_transaction(self, tx_hash: str) -> Dict[str, Any]:
+        try:
+            txn = await self.client.get_transaction(tx_hash)
+            return dict(txn)
+        except Exception as e:
+            return {'error': str(e)}
+    
+    async def get_transactions(self, tx_hashes: List[str], head: Optional[int] = None) -> Dict[str, Dict[str, Any]]:
+        # Inclusion and outcome of several transactions; unknown or unconfirmed ones
+        # come back with blockNumber None
+        if head is None:
+            head = await self.get_block_number()
+        infos = await asyncio.gather(
+            *(self.client.get_transaction_info(tx_hash) for tx_hash in tx_hashes),
+            return_exceptions=True
+        )
+        transactions = {}
+        for tx_hash, info in zip(tx_hashes, infos):
+            if isinstance(info, Exception) or not info:
+                transactions[tx_hash] = {'hash': tx_hash, 'blockNumber': None, 'status': None, 'confirmations': 0}
+                continue
+            block_number = info.get('blockNumber')
+            failed = info.get('result') == 'FAILED' or info.get('receipt', {}).get('result') not in (None, 'SUCCESS')
+            transactions[tx_hash] = {
+                'hash': tx_hash,
+                'blockNumber': block_number,
+                'status': 0 if failed else 1,
+                'confirmations': head - block_number + 1 if block_number is not None else 0
+            }
+        return transactions
@@ -0,0 +1,187 @@
+import hashlib
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+from bitcoinlib.keys import Address
+from config import Config
+from .electrum import ElectrumClient
+
+# Output scripts by address type; each takes the hash (or witness program) from the address
+SCRIPT_TEMPLATES = {
+    'p2pkh': '76a914{}88ac',
+    'p2sh': 'a914{}87',
+    'p2wpkh': '0014{}',
+    'p2wsh': '0020{}',
+    'p2tr': '5120{}'
+}
+
+# Serialized sizes (bytes) for fee estimates: legacy P2PKH inputs and outputs
+TX_OVERHEAD = 10
+INPUT_SIZE = 148
+OUTPUT_SIZE = 34
+DUST_LIMIT = 546  # satoshis; smaller change is left to the miner
+
+class InsufficientFunds(Exception):
+    pass
+
+class UTXO(NamedTuple):
+    tx_hash: str
+    tx_pos: int
+    value: int  # satoshis
+    height: int  # 0 (or -1) while unconfirmed
+
+def output_script(address: str, network: str) -> str:
+    parsed = Address.parse(address)
+    if parsed.network.name != network:
+        raise ValueError(f"{address} is not a {network} address")
+    if parsed.script_type not in SCRIPT_TEMPLATES:
+        raise ValueError(f"Unsupported address type {parsed.script_type}")
+    return SCRIPT_TEMPLATES[parsed.script_type].format(parsed.hash_bytes.hex())
+
+def script_hash(address: str, network: str) -> str:
+    # The key Electrum servers index addresses by: sha256 of the output script, byte-reversed
+    return hashlib.sha256(bytes.fromhex(output_script(address, network))).digest()[::-1].hex()
+
+def estimate_fee(inputs: int, outputs: int, fee_rate: float) -> int:
+    return int((TX_OVERHEAD + inputs * INPUT_SIZE + outputs * OUTPUT_SIZE) * fee_rate) + 1
+
+def select_coins(utxos: List[UTXO], amount: int, fee_rate: float) -> Tuple[List[UTXO], int, int]:
+    # (inputs, change, fee) paying `amount` at fee_rate sat/vB. Confirmed coins go first,
+    # largest first. A single coin that covers the payment without leaving change worth
+    # keeping is preferred (the smallest such one); otherwise coins are added until the
+    # payment plus a change output is covered, and change below the dust limit becomes fee
+    ordered = sorted(utxos, key=lambda utxo: (utxo.height <= 0, -utxo.value))
+    fits = [
+        utxo for utxo in ordered
+        if amount + estimate_fee(1, 1, fee_rate) <= utxo.value < amount + estimate_fee(1, 2, fee_rate) + DUST_LIMIT
+    ]
+    if fits:
+        coin = min(fits, key=lambda utxo: utxo.value)
+        return [coin], 0, coin.value - amount
+
+    selected: List[UTXO] = []
+    total = 0
+    for utxo in ordered:
+        selected.append(utxo)
+        total += utxo.value
+        change = total - amount - estimate_fee(len(selected), 2, fee_rate)
+        if change >= DUST_LIMIT:
+            return selected, change, total - amount - change
+        if total - amount >= estimate_fee(len(selected), 1, fee_rate):
+            return selected, 0, total - amount
+    raise InsufficientFunds(f"Insufficient funds: {total} available, {amount} + fee needed")
+
+class AddressEntry:
+    __slots__ = ('script_hash', 'utxos', 'status', 'refreshed_at', 'changes', 'synced_changes')
+
+    def __init__(self, script_hash: str):
+        self.script_hash = script_hash
+        self.utxos: Optional[List[UTXO]] = None
+        self.status: Optional[str] = None
+        self.refreshed_at = 0.0
+        self.changes = 0  # bumped by every status notification
+        self.synced_changes = -1  # value of `changes` the utxos were listed at
+
+class UTXOIndex:
+    # Local UTXO sets per address, kept current incrementally. Every address we list is
+    # also subscribed, so the server notifies us when its history changes - a new block or
+    # a mempool transaction touching it - and only those addresses are listed again; the
+    # rest are answered from memory. Dropped sessions lose their subscriptions, so then
+    # everything is relisted, and entries older than `ttl` are relisted regardless
+    def __init__(self, client: ElectrumClient, network: str, max_addresses: Optional[int] = None,
+                 ttl: Optional[float] = None):
+        self.client = client
+        self.network = network
+        self.max_addresses = max_addresses or Config.UTXO_CACHE_SIZE
+        self.ttl = Config.UTXO_CACHE_TTL if ttl is None else ttl
+        self._entries: "OrderedDict[str, AddressEntry]" = OrderedDict()
+        self._by_script_hash: Dict[str, str] = {}
+        self._subscribed: set = set()
+        self.listed = 0
+        self.notified = 0
+        client.listeners.append(self._on_notify)
+        client.reset_listeners.append(self._on_reset)
+
+    def _on_notify(self, method: str, params: List[Any]):
+        if method != 'blockchain.scripthash.subscribe' or len(params) < 2:
+            return
+        address = self._by_script_hash.get(params[0])
+        entry = self._entries.get(address) if address else None
+        if entry is not None and params[1] != entry.status:
+            entry.status = params[1]
+            entry.changes += 1
+            self.notified += 1
+
+    def _on_reset(self):
+        self._subscribed.clear()
+        for entry in self._entries.values():
+            entry.changes += 1
+
+    def _entry(self, address: str) -> AddressEntry:
+        entry = self._entries.get(address)
+        if entry is None:
+            entry = AddressEntry(script_hash(address, self.network))
+            self._entries[address] = entry
+            self._by_script_hash[entry.script_hash] = address
+            while len(self._entries) > self.max_addresses:
+                _, evicted = self._entries.popitem(last=False)
+                self._by_script_hash.pop(evicted.script_hash, None)
+                self._subscribed.discard(evicted.script_hash)
+        self._entries.move_to_end(address)
+        return entry
+
+    def _fresh(self, entry: AddressEntry, now: float) -> bool:
+        return (entry.utxos is not None and entry.synced_changes == entry.changes
+                and now - entry.refreshed_at < self.ttl and entry.script_hash in self._subscribed)
+
+    async def get_utxos(self, addresses: List[str]) -> Dict[str, List[UTXO]]:
+        now = time.monotonic()
+        entries = {address: self._entry(address) for address in dict.fromkeys(addresses)}
+        stale = [(address, entry) for address, entry in entries.items() if not self._fresh(entry, now)]
+        if stale:
+            # One batch: subscribe what isn't yet, and list every stale address
+            calls = []
+            subscribing = {entry.script_hash for _, entry in stale if entry.script_hash not in self._subscribed}
+            for _, entry in stale:
+                if entry.script_hash in subscribing:
+                    calls.append(('blockchain.scripthash.subscribe', [entry.script_hash]))
+                calls.append(('blockchain.scripthash.listunspent', [entry.script_hash]))
+            changes = {address: entry.changes for address, entry in stale}
+            results = iter(await self.client.batch(calls))
+            for address, entry in stale:
+                if entry.script_hash in subscribing:
+                    status = next(results)
+                    if not isinstance(status, Exception):
+                        entry.status = status
+                        self._subscribed.add(entry.script_hash)
+                listed = next(results)
+                if isinstance(listed, Exception):
+                    raise listed
+                entry.utxos = [
+                    UTXO(item['tx_hash'], item['tx_pos'], item['value'], item.get('height', 0))
+                    for item in listed
+                ]
+                entry.refreshed_at = now
+                # A notification that arrived while listing leaves the entry stale
+                entry.synced_changes = changes[address]
+                self.listed += 1
+        return {address: list(entry.utxos) for address, entry in entries.items()}
+
+    def spend(self, address: str, spent: List[UTXO], change: Optional[UTXO] = None):
+        # Applies a transaction we just broadcast, ahead of the server's notification, so
+        # the next send from this address doesn't pick the same coins
+        entry = self._entries.get(address)
+        if entry is None or entry.utxos is None:
+            return
+        spent_outpoints = {(utxo.tx_hash, utxo.tx_pos) for utxo in spent}
+        entry.utxos = [utxo for utxo in entry.utxos if (utxo.tx_hash, utxo.tx_pos) not in spent_outpoints]
+        if change is not None:
+            entry.utxos.append(change)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            'addresses': len(self._entries),
+            'subscribed': len(self._subscribed),
+            'listed': self.listed,
+            'notified': self.notified
+        }
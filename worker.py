@@ -0,0 +1,112 @@
+import asyncio
+import multiprocessing
+import os
+import sys
+from typing import Any, Dict, Optional
+from config import Config
+from jobqueue import open_job_queue
+from metrics import MetricsServer, SamplingProfiler
+
+class JobWorker:
+    # Pulls balance / create / tx jobs off the queue and runs up to `concurrency` of them
+    # at a time against this process's own WalletService (DB pool, RPC pools, caches)
+    def __init__(self, queue, service, concurrency: int = 32):
+        self.queue = queue
+        self.service = service
+        self.concurrency = concurrency
+        self._running: set = set()
+        self._idle = asyncio.Event()
+        self._idle.set()
+
+    async def _execute(self, job: Dict[str, Any]):
+        try:
+            result = await self.service.handle(job['kind'], job['payload'])
+        except Exception as e:
+            await self.queue.complete(job, error=str(e) or type(e).__name__)
+        else:
+            await self.queue.complete(job, result=result)
+
+    def _done(self, task: asyncio.Task):
+        self._running.discard(task)
+        if len(self._running) < self.concurrency:
+            self._idle.set()
+        if not task.cancelled() and task.exception() is not None:
+            print(f"Job worker error: {task.exception()}")
+
+    async def run(self):
+        while True:
+            await self._idle.wait()
+            try:
+                jobs = await self.queue.next_jobs(self.concurrency - len(self._running))
+            except Exception as e:
+                print(f"Job queue error: {e}")
+                await asyncio.sleep(1)
+                continue
+            for job in jobs:
+                task = asyncio.ensure_future(self._execute(job))
+                self._running.add(task)
+                task.add_done_callback(self._done)
+            if len(self._running) >= self.concurrency:
+                self._idle.clear()
+
+    async def close(self):
+        for task in list(self._running):
+            task.cancel()
+        await asyncio.gather(*self._running, return_exceptions=True)
+
+async def serve(number: int):
+    # Imported here so the parent process stays a thin supervisor
+    from service import WalletService
+    service = WalletService(provision_workers=1)
+    queue = open_job_queue(
+        Config.JOB_QUEUE_URL,
+        ttl=Config.JOB_TIMEOUT,
+        poll_interval=Config.JOB_POLL_INTERVAL,
+        visibility_timeout=Config.JOB_VISIBILITY_TIMEOUT
+    )
+    worker = JobWorker(queue, service, concurrency=Config.WORKER_CONCURRENCY)
+    metrics = MetricsServer(
+        Config.METRICS_HOST,
+        Config.METRICS_PORT + 1 + number if Config.METRICS_PORT else 0,
+        profiler=SamplingProfiler(Config.PROFILE_INTERVAL)
+    )
+    try:
+        await metrics.start()
+        await queue.start()
+        await service.start(background=False)
+        print(f"👷 Worker {number} (pid {os.getpid()}) serving {Config.JOB_QUEUE_URL}")
+        await worker.run()
+    finally:
+        await worker.close()
+        await queue.close()
+        await service.close()
+        await metrics.close()
+
+def run_worker(number: int):
+    try:
+        asyncio.run(serve(number))
+    except KeyboardInterrupt:
+        pass
+
+def main(processes: Optional[int] = None):
+    processes = processes or Config.WORKER_PROCESSES or multiprocessing.cpu_count()
+    if Config.JOB_QUEUE_URL.startswith('memory://'):
+        print("❌ JOB_QUEUE_URL=memory:// only works inside the bot process (BOT_ROLE=all)")
+        exit(1)
+    # spawn, not fork: each worker builds its own event loop, pools and executors
+    context = multiprocessing.get_context('spawn')
+    workers = [context.Process(target=run_worker, args=(number,), name=f"worker-{number}")
+               for number in range(processes)]
+    for process in workers:
+        process.start()
+    try:
+        for process in workers:
+            process.join()
+    except KeyboardInterrupt:
+        print("\n👋 Workers stopped by user")
+        for process in workers:
+            process.join()
+
+if __name__ == "__main__":
+    print("🚀 Starting wallet job workers...")
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else None)